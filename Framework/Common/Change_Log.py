@@ -270,6 +270,64 @@ Change Log:
  * 1.24.12
    - Added some support for weapon macros using refs, as occurs in the
      timelines dlc.
+ * 1.24.13
+   - Catalog dat files are kept open and memory mapped across reads,
+     controlled by the new "use_dat_file_pool" setting.
+   - Parsed catalog indexes are cached between runs, controlled by the
+     new "use_catalog_index_cache" setting.
+   - Cat_Unpack extracts files in parallel, and keeps a manifest of
+     extracted files to skip unchanged ones without rehashing.
+   - Catalog writing streams files to the dat instead of building it
+     in memory, and generates xml diff patches in parallel processes.
+   - Generated xml diff patches are cached between runs, controlled by
+     the new "use_diff_patch_cache" setting.
+   - Reduced xml memory use by sharing unmodified trees between the
+     vanilla, patched, and current file versions.
+   - Load_Files reads files in bulk, applying extension patches in
+     parallel processes unless "disable_threading" is set.
+   - Faster wildcard matching of virtual paths and macro names, using
+     a folder index that skips straight to literal pattern prefixes.
+   - Text, index, and wares file lookup caches are rebuilt with a single
+     pass after edits instead of falling back to xpath searches; jobs,
+     factions, and god stations gain similar keyed lookups.
+   - Scale_Sector_Size uses a spatial grid to find nearby objects when
+     merging groups, instead of checking every pair.
+   - Scale_Sector_Size runs its scaling steps on numpy arrays when numpy
+     is available, and Position math is faster without it.
+   - Scale_Sector_Size runs the scaling steps of separate sectors in
+     parallel processes unless "disable_threading" is set.
+   - Live Editor ware building sends workers just the xml of each ware,
+     instead of the whole wares file.
+   - Parallel file loading, catalog writing, sector scaling, and Live
+     Editor object building share one pool of worker processes, started
+     on first use and kept until the file system is reset.
+   - Live Editor item values are read from the xml when first displayed,
+     a table at a time, and refreshes after a script run skip items
+     whose file was unchanged.
+   - Live Editor items find their xml nodes through a per-file node id
+     index instead of positional xpaths, when the node id is known.
+   - Live Editor tables update only the rows whose references changed,
+     and the gui table view only redraws changed cells.
+   - Transform macro databases reuse parsed macros and components of
+     unchanged files from earlier transforms, and look up exact macro
+     names directly.
+   - Making macro database files writable matches nodes by node id
+     instead of pairing up whole trees, and reports the amount of xml
+     copied when profiling.
+   - Fixed a bug when making a macro database file writable that holds
+     more than one macro or component.
+   - The gui VFS tab indexes file paths by suffix and folder in a thread,
+     and only builds tree items for folders as they are expanded.
+   - Generated diff patch verification only copies and patches the
+     parts of the original xml that patch ops reach into, and compares
+     other parts directly.
+   - Diff patch application looks up simple id, name, and index xpaths
+     through child indexes kept up to date across ops, and reuses
+     compiled forms of other xpaths.
+   - Diff patch generation picks unique xpath attributes using the same
+     child indexes, instead of xpath searches of all similar siblings.
+   - Printing xml with node ids backs up their tails in a list instead
+     of a dict keyed by node, lowering time and memory for large files.
 '''
 # Note: changes moved here for organization, and to make them easier to
 # break out during documentation generation.
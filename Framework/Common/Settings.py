@@ -94,6 +94,19 @@ class Settings_class:
         to verify their md5 hash, no exception will be thrown.
       - Defaults to False; consider setting True if needing to
         unpack incorrectly assembled catalogs.
+    * use_dat_file_pool
+      - Bool, if True then catalog dat files are kept open and memory
+        mapped across reads, up to a limited number of files, instead of
+        being reopened for every packed file.
+      - Open files are closed when the file system is reset.
+      - Defaults to True; set False if open handles cause trouble,
+        eg. with external tools rewriting the dat files.
+    * use_catalog_index_cache
+      - Bool, if True then parsed catalog indexes and the full set of
+        virtual paths are saved to a cache file in the output extension
+        folder, and reused on later runs for any catalogs that have not
+        changed (by path, size, and modification time).
+      - Defaults to True.
     * ignore_output_extension
       - Bool, if True, the target extension being generated will have
         its prior content ignored (this run works on the original files,
@@ -166,6 +179,13 @@ class Settings_class:
       - Only attempts to use // for the xpath prefix currently.
       - May result in measurably longer x4 loading times if used often
         in large files.
+    * use_diff_patch_cache
+      - Bool, if True then generated xml diff patches are saved to a cache
+        file in the output extension folder, keyed by a hash of the
+        original and modified xml and the diff settings, and reused on
+        later runs that produce the same changes, skipping patch
+        generation and verification.
+      - Defaults to True.
     * root_file_tag
       - String, extra tag added to names of modified files in the root folder
         and not placed in an extension, eg. X4.exe, to avoid overwriting the 
@@ -190,6 +210,16 @@ class Settings_class:
         on the next run to guide the file handling logic.
       - File is located in the output extension folder.
       - Defaults to 'customizer_log.json'
+    * catalog_index_cache_file_name
+      - String, name of a binary file which holds the catalog index
+        cache, when use_catalog_index_cache is enabled.
+      - File is located in the output extension folder.
+      - Defaults to 'catalog_index_cache.bin'
+    * diff_patch_cache_file_name
+      - String, name of a binary file which holds the diff patch
+        cache, when use_diff_patch_cache is enabled.
+      - File is located in the output extension folder.
+      - Defaults to 'diff_patch_cache.bin'
     * log_source_paths
       - Bool, if True then the path for any source files read will be
         printed in the plugin log.
@@ -224,6 +254,8 @@ class Settings_class:
         call scripts and plugins. Will cause the gui to lock up
         during processing.
       - Intended for development use, to enable breakpoints during calls.
+      - Also disables worker processes used to speed up bulk file loads,
+        catalog writing, sector scaling, and live editor object building.
       - Defaults to False
     * use_scipy_for_scaling_equations
       - Bool, if True then scipy will be used to optimize scaling
@@ -389,15 +421,20 @@ class Settings_class:
         defaults['extension_whitelist'] = ''
         defaults['extension_blacklist'] = ''
         defaults['allow_cat_md5_errors'] = False
+        defaults['use_dat_file_pool'] = True
+        defaults['use_catalog_index_cache'] = True
         defaults['ignore_output_extension'] = True
         defaults['X4_exe_name'] = 'X4.exe'
         defaults['root_file_tag'] = '.mod'
         defaults['make_maximal_diffs'] = False
         defaults['forced_xpath_attributes'] = ''
         defaults['shorten_xpaths'] = False
+        defaults['use_diff_patch_cache'] = True
         defaults['plugin_log_file_name'] = 'plugin_log.txt'
         defaults['live_editor_log_file_name'] = 'live_editor_log.json'        
         defaults['customizer_log_file_name'] = 'customizer_log.json'        
+        defaults['catalog_index_cache_file_name'] = 'catalog_index_cache.bin'
+        defaults['diff_patch_cache_file_name'] = 'diff_patch_cache.bin'
         defaults['show_tab_close_button'] = True
         defaults['disable_cleanup_and_writeback'] = False
         defaults['log_source_paths'] = False
@@ -675,6 +712,16 @@ class Settings_class:
         'Returns the path to the customizer log file.'
         return self.Get_Output_Folder() / self.customizer_log_file_name
     
+    @_Verify_Init
+    def Get_Catalog_Index_Cache_Path(self):
+        'Returns the path to the catalog index cache file.'
+        return self.Get_Output_Folder() / self.catalog_index_cache_file_name
+    
+    @_Verify_Init
+    def Get_Diff_Patch_Cache_Path(self):
+        'Returns the path to the diff patch cache file.'
+        return self.Get_Output_Folder() / self.diff_patch_cache_file_name
+    
     @_Verify_Init
     def Get_User_Content_XML_Path(self):
         'Returns the path to the user content.xml file.'
@@ -0,0 +1,104 @@
+'''
+Shared pool of worker processes, used for parallel file loading,
+catalog writing, object building, and similar bulk work.
+
+The pool is started on first use and kept for later calls, since
+process startup is a large part of the cost for typical job sizes.
+It is closed when the File_System is reset and when the program exits.
+'''
+from ..Documentation import Doc_Category_Default
+_doc_category = Doc_Category_Default('Common')
+
+import atexit
+import multiprocessing
+import threading
+from .Settings import Settings
+
+
+class Worker_Pool_class:
+    '''
+    Holder for the shared multiprocessing Pool.
+
+    Attributes:
+    * pool
+      - multiprocessing Pool, or None if not started.
+    * num_workers
+      - Int, number of processes in the pool, or 0 if not started.
+    * settings_dict
+      - Dict of the Settings values sent to the workers when the pool
+        was started. If settings change, the pool is restarted so
+        workers see the new values.
+    * lock
+      - Lock guarding pool startup and shutdown, since the gui may
+        request the pool from a script thread.
+    '''
+    def __init__(self):
+        self.pool = None
+        self.num_workers = 0
+        self.settings_dict = None
+        self.lock = threading.Lock()
+        return
+
+
+    def Get_Pool(self):
+        '''
+        Returns the multiprocessing Pool, starting it on first use, or
+        None if threading is disabled or there is only one cpu.
+        '''
+        if Settings.disable_threading:
+            self.Close()
+            return None
+        # Workers may be spawned fresh (eg. on windows), so send over
+        # the current settings.
+        settings_dict = {x : getattr(Settings, x) for x in Settings.Get_Defaults()}
+        with self.lock:
+            if self.pool != None and settings_dict != self.settings_dict:
+                self._Close()
+            if self.pool == None:
+                num_workers = multiprocessing.cpu_count()
+                if num_workers < 2:
+                    return None
+                self.pool = multiprocessing.Pool(
+                    num_workers,
+                    initializer = _Init_Worker,
+                    initargs = (settings_dict,))
+                self.num_workers = num_workers
+                self.settings_dict = settings_dict
+            return self.pool
+
+
+    def Close(self):
+        '''
+        Shuts down the pool, if running. It will restart on the next
+        Get_Pool call.
+        '''
+        with self.lock:
+            self._Close()
+        return
+
+
+    def _Close(self):
+        '''
+        Shuts down the pool, assuming the lock is held.
+        '''
+        if self.pool != None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.num_workers = 0
+            self.settings_dict = None
+        return
+
+
+def _Init_Worker(settings_dict):
+    '''
+    Worker process initializer, copying over settings.
+    '''
+    for name, value in settings_dict.items():
+        setattr(Settings, name, value)
+    return
+
+
+# Static copy of the pool, closed on exit.
+Worker_Pool = Worker_Pool_class()
+atexit.register(Worker_Pool.Close)
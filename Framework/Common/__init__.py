@@ -11,6 +11,7 @@ from .Settings import Settings
 from .Print import Print
 from .Logs import Plugin_Log
 from .Logs import Customizer_Log_class
+from .Worker_Pool import Worker_Pool
 
 from .Plugin_Manager import Analysis_Wrapper
 from .Plugin_Manager import Transform_Wrapper
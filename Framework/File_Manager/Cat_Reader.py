@@ -35,9 +35,12 @@ _doc_category = Doc_Category_Default('File_Manager')
 
 from pathlib import Path
 import hashlib
-from collections import namedtuple
+import mmap
+import threading
+from collections import namedtuple, OrderedDict
 
 from ..Common import Cat_Hash_Exception, Settings, Print
+from .Catalog_Index_Cache import Catalog_Index_Cache
 
 # Use a named tuple to track cat entries.
 # Values are integers unless suffixed otherwise.
@@ -64,6 +67,155 @@ def Get_Hash_String(binary):
     return hash_str
 
 
+class Dat_File_Pool_class:
+    '''
+    Bounded pool of memory mapped dat files, shared by all Cat_Readers.
+    Reading through the pool avoids reopening a dat file on every
+    packed file lookup; a full file system load otherwise does tens
+    of thousands of open/close pairs across the base dat files.
+
+    The least recently used mapping is closed when the pool is full.
+    Only used when Settings.use_dat_file_pool is True.
+
+    Attributes:
+    * max_open_files
+      - Int, the most dat files that will be kept mapped at once.
+    * dat_mmap_dict
+      - OrderedDict, keyed by dat file path, holding the mmap object
+        for the file, or None for empty dat files (which cannot be
+        mapped). Ordered from least to most recently used.
+    * lock
+      - Lock guarding the dict, since gui threads may read catalogs
+        alongside scripts.
+    * num_opens
+      - Int, number of dat files opened and mapped since the last reset.
+    * num_reads
+      - Int, number of packed file reads served by the pool.
+    * num_bytes_read
+      - Int, total size of the packed files served.
+    * num_evictions
+      - Int, number of mappings closed to make room for others.
+    '''
+    # Note: the base game currently has 9 dat files, plus a sig dat,
+    # and extensions tend to have 1-2 each. This is enough to keep
+    # the base game mapped with some room for the active extensions.
+    max_open_files = 16
+
+    def __init__(self):
+        self.dat_mmap_dict = OrderedDict()
+        self.lock = threading.Lock()
+        self.Reset_Stats()
+        return
+
+
+    def Reset_Stats(self):
+        '''
+        Zero out the open/read counters.
+        '''
+        self.num_opens = 0
+        self.num_reads = 0
+        self.num_bytes_read = 0
+        self.num_evictions = 0
+        return
+
+
+    def _Get_Mmap(self, dat_path):
+        '''
+        Returns the mmap for the given dat_path, opening it if needed
+        and marking it as most recently used. Returns None for
+        an empty dat file. Call only while holding the lock.
+        '''
+        if dat_path in self.dat_mmap_dict:
+            self.dat_mmap_dict.move_to_end(dat_path)
+            return self.dat_mmap_dict[dat_path]
+
+        # Make room if needed, dropping the oldest mapping.
+        while len(self.dat_mmap_dict) >= self.max_open_files:
+            old_path, old_mmap = self.dat_mmap_dict.popitem(last = False)
+            self._Close_Mmap(old_mmap)
+            self.num_evictions += 1
+
+        with open(dat_path, 'rb') as file:
+            # Zero length files cannot be mapped; record them as None.
+            # The mmap holds its own handle, so the file can be closed
+            # right away.
+            if file.seek(0, 2) == 0:
+                dat_mmap = None
+            else:
+                dat_mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        self.num_opens += 1
+        self.dat_mmap_dict[dat_path] = dat_mmap
+        return dat_mmap
+
+
+    def _Close_Mmap(self, dat_mmap):
+        '''
+        Close a mapping, if possible.
+        '''
+        if dat_mmap == None:
+            return
+        # If a caller still holds a memoryview into the mapping, it
+        # cannot be closed yet; in that case just drop the pool
+        # reference and let it close once the views are released.
+        try:
+            dat_mmap.close()
+        except BufferError:
+            pass
+        return
+
+
+    def Read(self, dat_path, start_byte, num_bytes):
+        '''
+        Returns a read-only memoryview over the given byte range of
+        the dat file, without copying. The view should be released
+        (or dropped) once no longer needed, else the underlying
+        mapping cannot be closed on pool reset.
+        '''
+        with self.lock:
+            dat_mmap = self._Get_Mmap(dat_path)
+            self.num_reads += 1
+            self.num_bytes_read += num_bytes
+
+            if dat_mmap == None or num_bytes == 0:
+                return memoryview(b'')
+            # Take the view while locked; once it exists, another thread
+            # evicting or closing this mapping cannot invalidate it.
+            # Note: x4 catalogs may run past the end of a truncated dat;
+            # slicing clips this the same way file.read() would.
+            return memoryview(dat_mmap)[start_byte : start_byte + num_bytes]
+
+
+    def Close_All(self):
+        '''
+        Close all open dat mappings. Later reads will reopen files
+        as needed. Called on file system resets, and before cleanup
+        removes old output catalogs.
+        '''
+        with self.lock:
+            for dat_mmap in self.dat_mmap_dict.values():
+                self._Close_Mmap(dat_mmap)
+            self.dat_mmap_dict.clear()
+        return
+
+
+    def Print_Stats(self):
+        '''
+        Print the open/read counters, for profiling.
+        '''
+        Print(('Dat_File_Pool: {} opens, {} reads, {:.1f} MB read,'
+               ' {} evictions, {} files open').format(
+                self.num_opens,
+                self.num_reads,
+                self.num_bytes_read / 1e6,
+                self.num_evictions,
+                len(self.dat_mmap_dict),
+                ))
+        return
+
+# Static pool object.
+Dat_File_Pool = Dat_File_Pool_class()
+
+
 class Cat_Reader:
     '''
     Parsed catalog file contents.
@@ -90,6 +242,14 @@ class Cat_Reader:
         # Read the cat. Error if not found.
         if not self.cat_path.exists():
             raise AssertionError('Error: failed to find cat file at {}'.format(path))
+
+        # Reuse the parsed entries from a prior session if the cat
+        # is unchanged.
+        cached_entries = Catalog_Index_Cache.Get_Cat_Entries(self.cat_path)
+        if cached_entries != None:
+            self.cat_entries = cached_entries
+            return
+
         # This can just do a raw text read.
         with open(self.cat_path, 'r') as file:
             text = file.read()
@@ -117,7 +277,8 @@ class Cat_Reader:
 
             # Advance the offset for the next packed file.
             dat_start_offset += num_bytes
-            
+
+        Catalog_Index_Cache.Set_Cat_Entries(self.cat_path, self.cat_entries)
         return
 
 
@@ -137,7 +298,13 @@ class Cat_Reader:
         return self.cat_entries
 
             
-    def Read(self, virtual_path, error_if_not_found = False, allow_md5_error = False):
+    def Read(
+            self, 
+            virtual_path, 
+            error_if_not_found = False, 
+            allow_md5_error = False,
+            as_memoryview = False,
+        ):
         '''
         Read an entry in the corresponding dat file, based on the
         provided file name (including internal path).
@@ -150,6 +317,10 @@ class Cat_Reader:
         * allow_md5_error
           - Bool, if True then the md5 check will be suppressed and
             errors allowed. May still print a warning message.
+        * as_memoryview
+          - Bool, if True and the Dat_File_Pool is in use, a memoryview
+            slice of the mapped dat file is returned instead of a bytes
+            copy. The caller should release it when done.
         '''
         # Ensure lower case path.
         virtual_path = virtual_path.lower()
@@ -161,38 +332,57 @@ class Cat_Reader:
                     virtual_path, self.cat_path))
             return None
 
-        # For now, open the dat file on every call and close it
-        #  afterwards.  Could also consider leaving this open
-        #  across calls, if many reads are expected, for a speedup.
-        with open(self.dat_path, 'rb') as file:
-            # Move to the file start location.
-            file.seek(self.cat_entries[virtual_path].start_byte)
-            # Grab the byte range.
-            binary = file.read(self.cat_entries[virtual_path].num_bytes)
-
-
-        # Verify the hash.
-        binary_hash_str = Get_Hash_String(binary)
-        cat_hash_str = self.cat_entries[virtual_path].hash_str
-
-        # Note: egosoft cats are buggy and can have a 0 for the hash
-        # of empty files, so also check that, but keep the normal
-        # check incase proper empty file hashes show up sometimes.
-        if (cat_hash_str == binary_hash_str):
-            # Hash match.
-            pass
-        elif not binary and cat_hash_str == '00000000000000000000000000000000':
-            # Alt hash match for empty file.
-            pass
+        cat_entry = self.cat_entries[virtual_path]
+
+        # When pooling, read from the shared memory mapped dat.
+        # Otherwise, open the dat file on every call and close it
+        #  afterwards.
+        if Settings.use_dat_file_pool:
+            binary = Dat_File_Pool.Read(
+                self.dat_path, cat_entry.start_byte, cat_entry.num_bytes)
         else:
-            # Handle the error message.
-            message = 'File {} in cat {} failed the md5 hash check'.format(
-                    virtual_path, self.cat_path)
-            # Prevent the exception based on Settings or the input arg.
-            if not Settings.allow_cat_md5_errors and not allow_md5_error:
-                raise Cat_Hash_Exception(message)
-            elif Settings.verbose:
-                Print(message)
+            with open(self.dat_path, 'rb') as file:
+                # Move to the file start location.
+                file.seek(cat_entry.start_byte)
+                # Grab the byte range.
+                binary = file.read(cat_entry.num_bytes)
+
+
+        try:
+            # Verify the hash.
+            # (md5 accepts memoryviews directly, so no copy is needed.)
+            binary_hash_str = Get_Hash_String(binary)
+            cat_hash_str = cat_entry.hash_str
+
+            # Note: egosoft cats are buggy and can have a 0 for the hash
+            # of empty files, so also check that, but keep the normal
+            # check incase proper empty file hashes show up sometimes.
+            if (cat_hash_str == binary_hash_str):
+                # Hash match.
+                pass
+            elif not binary and cat_hash_str == '00000000000000000000000000000000':
+                # Alt hash match for empty file.
+                pass
+            else:
+                # Handle the error message.
+                message = 'File {} in cat {} failed the md5 hash check'.format(
+                        virtual_path, self.cat_path)
+                # Prevent the exception based on Settings or the input arg.
+                if not Settings.allow_cat_md5_errors and not allow_md5_error:
+                    raise Cat_Hash_Exception(message)
+                elif Settings.verbose:
+                    Print(message)
+        except Exception:
+            # Don't leave a pooled view open, else the dat can't be closed.
+            if isinstance(binary, memoryview):
+                binary.release()
+            raise
 
+        # Convert pooled views to bytes unless the caller can use the
+        # view directly.
+        if isinstance(binary, memoryview) and not as_memoryview:
+            view = binary
+            binary = view.tobytes()
+            view.release()
         return binary
 
@@ -19,11 +19,12 @@ _doc_category = Doc_Category_Default('File_Manager')
 import gzip
 import time
 import hashlib
+from collections import deque
 from pathlib import Path
-from .File_Types import Game_File, Signature_File, Machine_Code_File
+from .File_Types import Game_File, Signature_File, Machine_Code_File, XML_File
 from .File_Types import Generate_Signatures
 from .Cat_Reader import Get_Hash_String
-from ..Common import Print
+from ..Common import Print, Settings, Worker_Pool
 
 
 class Cat_Writer:
@@ -39,12 +40,21 @@ class Cat_Writer:
       - Set automatically to match the cat_path index.
     * game_files
       - List of Game_File objects to be written.
+    * num_workers
+      - Int, number of worker processes used by the latest Write,
+        or 0 if it ran serially.
     '''
+    # Minimum number of files with binary jobs (eg. xml diffs) before
+    # the worker pool is used; below this, pickling overhead
+    # outweighs the gains.
+    min_pool_jobs = 8
+
     def __init__(self, cat_path):
         # Ensure this is a Path.
         self.cat_path = Path(cat_path)
         self.dat_path = self.cat_path.with_suffix('.dat')
         self.game_files = []
+        self.num_workers = 0
         return
 
 
@@ -65,6 +75,12 @@ class Cat_Writer:
         Write the contents to a cat/dat file pair.
         Any existing files will be overwritten.
 
+        File binaries are produced and hashed one at a time and streamed
+        to the dat, so memory use is bounded by the largest file rather
+        than the whole dat. Where there are enough xml files, their
+        diff patches are generated and hashed in parallel worker
+        processes, with results still written in the original order.
+
         * generate_sigs
           - Bool, if True then dummy signature files will be created.
         * separate_sigs
@@ -72,6 +88,11 @@ class Cat_Writer:
             cat/dat pair suffixed with .sig. This may result in an
             empty dat.
         '''
+        if Settings.profile or Settings.verbose:
+            start = time.time()
+        total_bytes = 0
+        total_files = 0
+
         # Handle signature generation first.
         game_files = self.game_files
         if generate_sigs:
@@ -84,46 +105,56 @@ class Cat_Writer:
         else:
             modes = ['all']
 
+        # Use the worker pool if there is enough xml work to justify it.
+        # This is shared across passes; sig files will not use it anyway.
+        pool = self._Get_Pool()
         for mode in modes:
 
+            # If just wanting standard or sig files, filter the
+            # others out.
+            if mode == 'std':
+                mode_files = [x for x in game_files 
+                              if not isinstance(x, Signature_File)]
+            elif mode == 'sig':
+                mode_files = [x for x in game_files 
+                              if isinstance(x, Signature_File)]
+            else:
+                mode_files = game_files
+
+            # Append a .sig to the names for signature files.
+            if mode == 'sig':
+                cat_path = self.cat_path.parent / (self.cat_path.name + '.sig')
+                dat_path = self.dat_path.parent / (self.dat_path.name + '.sig')
+            else:
+                cat_path = self.cat_path
+                dat_path = self.dat_path
+
             # Cat contents will be kept as a list of strings.
-            # Dat contents will be running binary.
             cat_lines = []
-            dat_binary = bytearray()
 
             # Get the current time since epoch, as an integer, then
             #  swap to a string (normal base 10).
             timestamp = str(int(time.time()))
 
-            # Collect info from the files.
+            # Collect info from the files, writing the dat as it goes.
             # Note: this may generate nothing if no game files were added,
             #  eg. when making dummy catalogs.
-            for game_file in self.game_files:
-
-                # If just wanting standard or sig files, filter the
-                # others out.
-                if mode == 'std' and isinstance(game_file, Signature_File):
-                    continue
-                if mode == 'sig' and not isinstance(game_file, Signature_File):
-                    continue
-
-                # Get the binary data; any text should be utf-8.
-                this_binary = game_file.Get_Binary(for_cat = True)
-                x = bytes(this_binary)
+            with open(dat_path, 'wb') as dat_file:
+                for game_file, this_binary, hash_str in self._Gen_Binaries(
+                        mode_files, pool):
 
-                # Append to the existing dat binary.
-                dat_binary += this_binary
+                    # Append to the dat file.
+                    dat_file.write(this_binary)
+                    total_bytes += len(this_binary)
+                    total_files += 1
 
-                # Get the hash.
-                hash_str = Get_Hash_String(this_binary)
-
-                # Add the cat entry line.
-                cat_lines.append( ' '.join([
-                    game_file.virtual_path,
-                    str(len(this_binary)),
-                    timestamp,
-                    hash_str,
-                    ]))
+                    # Add the cat entry line.
+                    cat_lines.append( ' '.join([
+                        game_file.virtual_path,
+                        str(len(this_binary)),
+                        timestamp,
+                        hash_str,
+                        ]))
 
 
             # The cat needs to end in a newline.
@@ -134,19 +165,95 @@ class Cat_Writer:
             # method will match.
             cat_str = '\n'.join(cat_lines)
             cat_binary = bytes(cat_str, encoding = 'utf-8')
-        
-            # Append a .sig to the names for signature files.
-            if mode == 'sig':
-                cat_path = self.cat_path.parent / (self.cat_path.name + '.sig')
-                dat_path = self.dat_path.parent / (self.dat_path.name + '.sig')
-            else:
-                cat_path = self.cat_path
-                dat_path = self.dat_path
 
-            # Write the data out.
+            # Write the cat out. This follows the dat, so a cat will
+            # not refer to a partially written dat.
             with open(cat_path, 'wb') as file:
                 file.write(cat_binary)
-            with open(dat_path, 'wb') as file:
-                file.write(dat_binary)
 
+        if Settings.profile or Settings.verbose:
+            duration = time.time() - start
+            Print('Cat_Writer wrote {} files, {:.2f} MB to {} in {:.2f} s ({:.2f} MB/s{})'.format(
+                total_files,
+                total_bytes / 1e6,
+                self.cat_path.name,
+                duration,
+                total_bytes / 1e6 / duration if duration else 0,
+                ', {} workers'.format(self.num_workers) if pool != None else '',
+                ))
         return
+
+
+    def _Get_Pool(self):
+        '''
+        Returns the shared Worker_Pool for generating file binaries,
+        or None if threading is disabled or there are too few files
+        that would benefit from it.
+        '''
+        self.num_workers = 0
+        num_jobs = sum(1 for x in self.game_files 
+                       if isinstance(x, XML_File))
+        if num_jobs < self.min_pool_jobs:
+            return None
+        pool = Worker_Pool.Get_Pool()
+        if pool != None:
+            self.num_workers = Worker_Pool.num_workers
+        return pool
+
+
+    def _Gen_Binaries(self, game_files, pool = None):
+        '''
+        Generator which yields tuples of (game_file, binary, hash_str)
+        for the given game_files, in order. 
+        If a pool is given, files with binary jobs are processed by it, 
+        keeping a limited number of results in flight at a time so
+        that memory stays bounded.
+        '''
+        # Queue of (game_file, async_result or None) for files that
+        # have been started but not yet yielded.
+        pending = deque()
+        max_pending = 2 * self.num_workers if pool != None else 0
+
+        for game_file in game_files:
+            job = game_file.Get_Binary_Job(for_cat = True) if pool != None else None
+            if job != None:
+                func, args = job
+                result = pool.apply_async(_Run_Binary_Job, (func, args))
+            else:
+                result = None
+            pending.append((game_file, result))
+
+            # Drain completed work from the front, and block on it
+            # if too much is in flight.
+            while pending and (len(pending) > max_pending 
+                               or pending[0][1] == None
+                               or pending[0][1].ready()):
+                yield self._Finish_Binary(*pending.popleft())
+
+        while pending:
+            yield self._Finish_Binary(*pending.popleft())
+        return
+
+
+    def _Finish_Binary(self, game_file, result):
+        '''
+        Returns (game_file, binary, hash_str) for a file, either from
+        a pool async result or by generating it here.
+        '''
+        if result != None:
+            binary, hash_str = result.get()
+            game_file.Record_Binary_Job_Result(binary)
+        else:
+            # Get the binary data; any text should be utf-8.
+            binary = game_file.Get_Binary(for_cat = True)
+            hash_str = Get_Hash_String(binary)
+        return game_file, binary, hash_str
+
+
+def _Run_Binary_Job(func, args):
+    '''
+    Worker process function: run a Game_File binary job and hash
+    the result, returning (binary, hash_str).
+    '''
+    binary = func(*args)
+    return binary, Get_Hash_String(binary)
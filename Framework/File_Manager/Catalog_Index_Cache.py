@@ -0,0 +1,253 @@
+'''
+Persistent cache of parsed catalog indexes, to speed up startup.
+
+Parsing every cat file line by line, merging the entries by priority,
+and gathering the full set of virtual paths takes several seconds when
+many extensions are present, and repeats every session even though
+the catalogs rarely change. This cache pickles the parsed Cat_Entry
+dicts to a binary file next to the customizer log, and reuses them
+on later runs.
+
+Each catalog is validated separately by its path, size and modification
+time, so only changed catalogs get reparsed. Merged results (per
+location entry dicts, and the overall virtual path set) are validated
+with a signature built from the stats of every catalog involved.
+'''
+from ..Documentation import Doc_Category_Default
+_doc_category = Doc_Category_Default('File_Manager')
+
+import os
+import pickle
+import threading
+from pathlib import Path
+
+from ..Common import Settings, Print
+
+
+class Catalog_Index_Cache_class:
+    '''
+    Container for cached catalog index information.
+    Inactive until Load is called; while inactive, all lookups miss
+    and nothing is recorded, so standalone utilities that do not
+    use Settings paths are unaffected.
+
+    Attributes:
+    * cache_path
+      - Path to the cache file, set on Load.
+      - None when the cache is inactive.
+    * cat_dict
+      - Dict, keyed by cat file path string, holding tuples of
+        (file_size, mtime_ns, cat_entries_dict).
+    * merged_dict
+      - Dict, keyed by a location path string, holding tuples of
+        (signature, path_entry_dict) for Location_Source_Reader
+        merged entries.
+    * virtual_paths
+      - Tuple of (signature, set of virtual paths) for the
+        Source_Reader merged path set, or None.
+    * modified
+      - Bool, True if the cache changed since it was loaded or stored.
+    * num_hits, num_misses
+      - Ints, counts of catalog lookups served from or missing in
+        the cache, for profiling.
+    '''
+    # Version of the stored format; bump when Cat_Entry or the
+    # layout below changes, to discard older files.
+    format_version = 1
+
+    def __init__(self):
+        self.cache_path = None
+        self.lock = threading.Lock()
+        self.Clear()
+        return
+
+
+    def Clear(self):
+        '''
+        Clear out all cached information.
+        '''
+        self.cat_dict = {}
+        self.merged_dict = {}
+        self.virtual_paths = None
+        self.modified = False
+        self.num_hits = 0
+        self.num_misses = 0
+        return
+
+
+    def Is_Active(self):
+        '''
+        Returns True if the cache has been loaded and is in use.
+        '''
+        return self.cache_path != None
+
+
+    def Load(self, cache_path):
+        '''
+        Activate the cache, loading prior information from the given
+        file path if it exists. A file that is missing, unreadable, or
+        from another format version is ignored.
+        '''
+        self.Clear()
+        self.cache_path = Path(cache_path)
+        if not self.cache_path.exists():
+            return
+
+        # Load in a try/except for safety, similar to the customizer log.
+        try:
+            with open(self.cache_path, 'rb') as file:
+                cache_dict = pickle.load(file)
+            if cache_dict.get('version') != self.format_version:
+                return
+            self.cat_dict      = cache_dict['cat_dict']
+            self.merged_dict   = cache_dict['merged_dict']
+            self.virtual_paths = cache_dict['virtual_paths']
+        except Exception as ex:
+            if Settings.verbose:
+                Print('Ignoring catalog index cache due to {}.'.format(
+                    type(ex).__name__))
+            self.Clear()
+        return
+
+
+    def Store(self):
+        '''
+        Write the cache out to its file, if active and modified.
+        Catalogs that no longer exist are dropped.
+        '''
+        if not self.Is_Active() or not self.modified:
+            return
+        with self.lock:
+            # Prune catalogs that were removed, eg. from uninstalled
+            # extensions, so the file doesn't grow indefinitely.
+            for cat_path in list(self.cat_dict.keys()):
+                if not os.path.exists(cat_path):
+                    del self.cat_dict[cat_path]
+
+            cache_dict = {
+                'version'       : self.format_version,
+                'cat_dict'      : self.cat_dict,
+                'merged_dict'   : self.merged_dict,
+                'virtual_paths' : self.virtual_paths,
+                }
+            # Write to a temp file first and swap it in, so a crash
+            # mid-write doesn't leave a truncated cache.
+            temp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+            try:
+                with open(temp_path, 'wb') as file:
+                    pickle.dump(cache_dict, file, protocol = pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self.cache_path)
+                self.modified = False
+            except Exception as ex:
+                Print('Failed to store catalog index cache due to {}.'.format(
+                    type(ex).__name__))
+        return
+
+
+    def Close(self):
+        '''
+        Store any changes and deactivate the cache.
+        '''
+        self.Store()
+        self.cache_path = None
+        self.Clear()
+        return
+
+
+    def Get_Cat_Stats(self, cat_path):
+        '''
+        Returns a tuple of (path string, size, mtime_ns) for a cat file,
+        used to validate cached information.
+        '''
+        stat = os.stat(cat_path)
+        return (str(cat_path), stat.st_size, stat.st_mtime_ns)
+
+
+    def Get_Cat_Entries(self, cat_path):
+        '''
+        Returns the cached dict of Cat_Entry objects for the given
+        cat file, or None if not cached or out of date.
+        '''
+        if not self.Is_Active():
+            return None
+        path_str, size, mtime = self.Get_Cat_Stats(cat_path)
+        cached = self.cat_dict.get(path_str)
+        if cached != None and cached[0] == size and cached[1] == mtime:
+            self.num_hits += 1
+            return cached[2]
+        self.num_misses += 1
+        return None
+
+
+    def Set_Cat_Entries(self, cat_path, cat_entries):
+        '''
+        Record the dict of Cat_Entry objects parsed from a cat file.
+        '''
+        if not self.Is_Active():
+            return
+        path_str, size, mtime = self.Get_Cat_Stats(cat_path)
+        with self.lock:
+            self.cat_dict[path_str] = (size, mtime, cat_entries)
+            self.modified = True
+        return
+
+
+    def Get_Merged_Entries(self, location, signature):
+        '''
+        Returns the cached merged entry dict for a location, or None
+        if not cached or if the signature differs.
+        '''
+        if not self.Is_Active():
+            return None
+        cached = self.merged_dict.get(str(location))
+        if cached != None and cached[0] == signature:
+            return cached[1]
+        return None
+
+
+    def Set_Merged_Entries(self, location, signature, path_entry_dict):
+        '''
+        Record the merged entry dict for a location.
+        '''
+        if not self.Is_Active():
+            return
+        with self.lock:
+            self.merged_dict[str(location)] = (signature, path_entry_dict)
+            self.modified = True
+        return
+
+
+    def Get_Virtual_Paths(self, signature):
+        '''
+        Returns the cached set of all virtual paths, or None if not
+        cached or if the signature differs.
+        '''
+        if not self.Is_Active() or self.virtual_paths == None:
+            return None
+        if self.virtual_paths[0] == signature:
+            return self.virtual_paths[1]
+        return None
+
+
+    def Set_Virtual_Paths(self, signature, virtual_paths):
+        '''
+        Record the set of all virtual paths.
+        '''
+        if not self.Is_Active():
+            return
+        with self.lock:
+            self.virtual_paths = (signature, virtual_paths)
+            self.modified = True
+        return
+
+
+    def Print_Stats(self):
+        '''
+        Print the hit/miss counters, for profiling.
+        '''
+        Print('Catalog_Index_Cache: {} catalog hits, {} misses'.format(
+            self.num_hits, self.num_misses))
+        return
+
+# Static cache object.
+Catalog_Index_Cache = Catalog_Index_Cache_class()
@@ -0,0 +1,245 @@
+'''
+Persistent cache of generated xml diff patches, to speed up output.
+
+Generating a diff patch for a large modified file (eg. wares or text
+files) requires walking both trees, building xpaths, and then verifying
+the patch by applying it to a copy of the original. When a script is
+rerun without changes, the same patches get rebuilt every time.
+
+This cache stores the final patch binary keyed by a hash of the inputs:
+the original (patched) xml, the modified xml, the forced xpath attributes,
+and the diff settings. On a hit the binary is returned directly, skipping
+patch generation and verification. Node ids (held in element tails) are
+hashed by their order of appearance rather than their raw values, since
+raw ids depend on how many files were loaded before this one.
+'''
+from ..Documentation import Doc_Category_Default
+_doc_category = Doc_Category_Default('File_Manager')
+
+import os
+import pickle
+import hashlib
+import threading
+from pathlib import Path
+
+from lxml import etree as ET
+
+from ..Common import Settings, Print
+
+
+class Diff_Patch_Cache_class:
+    '''
+    Container for cached diff patch binaries.
+    Inactive until Load is called; while inactive, all lookups miss
+    and nothing is recorded.
+
+    Attributes:
+    * cache_path
+      - Path to the cache file, set on Load.
+      - None when the cache is inactive.
+    * patch_dict
+      - Dict, keyed by hash string, holding patch binaries.
+    * used_keys
+      - Set of keys looked up successfully or recorded since Load.
+        On Store, entries not in this set are dropped, so the file
+        only holds patches from the latest run.
+    * modified
+      - Bool, True if the cache changed since it was loaded or stored.
+    * num_hits, num_misses
+      - Ints, counts of lookups served from or missing in the cache,
+        for profiling.
+    '''
+    # Version of the stored format; bump when the key or the patch
+    # generation logic changes, to discard older files.
+    format_version = 1
+
+    def __init__(self):
+        self.cache_path = None
+        self.lock = threading.Lock()
+        self.Clear()
+        return
+
+
+    def Clear(self):
+        '''
+        Clear out all cached information.
+        '''
+        self.patch_dict = {}
+        self.used_keys = set()
+        self.modified = False
+        self.num_hits = 0
+        self.num_misses = 0
+        return
+
+
+    def Is_Active(self):
+        '''
+        Returns True if the cache has been loaded and is in use.
+        '''
+        return self.cache_path != None
+
+
+    def Load(self, cache_path):
+        '''
+        Activate the cache, loading prior patches from the given
+        file path if it exists. A file that is missing, unreadable, or
+        from another format version is ignored.
+        '''
+        self.Clear()
+        self.cache_path = Path(cache_path)
+        if not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, 'rb') as file:
+                cache_dict = pickle.load(file)
+            if cache_dict.get('version') != self.format_version:
+                return
+            self.patch_dict = cache_dict['patch_dict']
+        except Exception as ex:
+            if Settings.verbose:
+                Print('Ignoring diff patch cache due to {}.'.format(
+                    type(ex).__name__))
+            self.Clear()
+        return
+
+
+    def Store(self):
+        '''
+        Write the cache out to its file, if active and changed.
+        Patches not used since Load are dropped.
+        '''
+        if not self.Is_Active():
+            return
+        with self.lock:
+            # Entries unused this run will be pruned, which is also
+            # a change worth storing.
+            if not self.modified and len(self.used_keys) == len(self.patch_dict):
+                return
+            self.patch_dict = {k : v for k, v in self.patch_dict.items()
+                               if k in self.used_keys}
+            cache_dict = {
+                'version'    : self.format_version,
+                'patch_dict' : self.patch_dict,
+                }
+            # Write to a temp file first and swap it in, so a crash
+            # mid-write doesn't leave a truncated cache.
+            temp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+            try:
+                with open(temp_path, 'wb') as file:
+                    pickle.dump(cache_dict, file, protocol = pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self.cache_path)
+                self.modified = False
+            except Exception as ex:
+                Print('Failed to store diff patch cache due to {}.'.format(
+                    type(ex).__name__))
+        return
+
+
+    def Close(self):
+        '''
+        Store any changes and deactivate the cache.
+        '''
+        if Settings.profile and self.Is_Active():
+            self.Print_Stats()
+        self.Store()
+        self.cache_path = None
+        self.Clear()
+        return
+
+
+    def Get_Key(self, original_root, modified_root, patch_kwargs, for_cat):
+        '''
+        Returns a hash string identifying the patch that would be made
+        from the given inputs, or None if the cache is inactive.
+
+        * patch_kwargs
+          - Dict of extra args for XML_Diff.Make_Patch.
+        * for_cat
+          - Bool, whether the binary is formatted for a catalog.
+        '''
+        if not self.Is_Active():
+            return None
+        hasher = hashlib.md5()
+        hasher.update(repr(sorted(patch_kwargs.items())).encode('utf-8'))
+        hasher.update(b'1' if for_cat else b'0')
+
+        # Dict of original node id string to its normalized position.
+        # Modified nodes reuse these, and new ids continue the count.
+        id_dict = {}
+        for root in [original_root, modified_root]:
+            hasher.update(_Get_Normalized_XML(root, id_dict))
+        return hasher.hexdigest()
+
+
+    def Contains(self, key):
+        '''
+        Returns True if the key has a cached patch, without counting
+        toward hit/miss stats.
+        '''
+        return key != None and key in self.patch_dict
+
+
+    def Get(self, key):
+        '''
+        Returns the cached patch binary for the key, or None if not found.
+        '''
+        if key == None:
+            return None
+        binary = self.patch_dict.get(key)
+        with self.lock:
+            if binary != None:
+                self.num_hits += 1
+                self.used_keys.add(key)
+            else:
+                self.num_misses += 1
+        return binary
+
+
+    def Set(self, key, binary):
+        '''
+        Record the patch binary for the key.
+        '''
+        if key == None or not self.Is_Active():
+            return
+        with self.lock:
+            self.patch_dict[key] = bytes(binary)
+            self.used_keys.add(key)
+            self.modified = True
+        return
+
+
+    def Print_Stats(self):
+        '''
+        Print the hit/miss counters, for profiling.
+        '''
+        Print('Diff_Patch_Cache: {} hits, {} misses'.format(
+            self.num_hits, self.num_misses))
+        return
+
+
+def _Get_Normalized_XML(root, id_dict):
+    '''
+    Returns the serialized xml of the given root, with node id tails
+    replaced by their order of first appearance, recorded in id_dict.
+    Tails are restored before returning.
+    '''
+    # Back up all tails and swap in normalized ids.
+    node_tail_list = []
+    for node in root.iter():
+        tail = node.tail
+        node_tail_list.append((node, tail))
+        if tail:
+            norm_id = id_dict.get(tail)
+            if norm_id == None:
+                norm_id = id_dict[tail] = str(len(id_dict))
+            node.tail = norm_id
+    try:
+        # Note: lxml includes the root tail by default.
+        return ET.tostring(root, encoding = 'utf-8')
+    finally:
+        for node, tail in node_tail_list:
+            node.tail = tail
+
+
+# Static cache object.
+Diff_Patch_Cache = Diff_Patch_Cache_class()
@@ -5,7 +5,7 @@ _doc_category = Doc_Category_Default('File_Manager')
     
 from pathlib import Path
 import datetime
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from lxml import etree as ET
 from functools import wraps
 import fnmatch
@@ -14,6 +14,10 @@ import re
 
 from .Source_Reader import Source_Reader_class
 from .Cat_Writer import Cat_Writer
+from .Cat_Reader import Dat_File_Pool
+from .Catalog_Index_Cache import Catalog_Index_Cache
+from .Diff_Patch_Cache import Diff_Patch_Cache
+from .Path_Index import Path_Index
 from .File_Types import Misc_File, XML_File, Signature_File, Machine_Code_File
 from .File_Types import Generate_Signatures
 from ..Common import Settings
@@ -21,6 +25,7 @@ from ..Common import File_Missing_Exception
 from ..Common import Customizer_Log_class
 from ..Common import Change_Log, Plugin_Log, Print
 from ..Common import home_path
+from ..Common import Worker_Pool
 
 
 class File_System_class:
@@ -58,9 +63,13 @@ class File_System_class:
     * _patterns_loaded
       - Set of strings, virtual path name patterns that have been
         loaded and, when macros, added to class_macro_dict.
+    * loaded_path_index
+      - Path_Index of the virtual paths in game_file_dict, for
+        fast pattern matching.
     '''
     def __init__(self):
         self.game_file_dict = {}
+        self.loaded_path_index = Path_Index()
         self.old_log = Customizer_Log_class()
         self.init_complete = False
         self.source_reader = Source_Reader_class()
@@ -119,7 +128,22 @@ class File_System_class:
         returning to non-initialized state, etc.
         This will also reset the Live_Editor, since it is out of date.
         '''
+        # Release any pooled dat files, so they aren't held open while
+        # the user may be changing extensions or similar.
+        if Settings.profile:
+            Dat_File_Pool.Print_Stats()
+            self.Print_XML_Memory_Report()
+        Dat_File_Pool.Close_All()
+        Dat_File_Pool.Reset_Stats()
+        # Save any newly parsed catalog indexes; the next init will
+        # reload the cache, maybe from a different output folder.
+        Catalog_Index_Cache.Close()
+        # Stop any worker processes; they carry settings and loaded
+        # plugin state from this session, and restart on next use.
+        Worker_Pool.Close()
+
         self.game_file_dict.clear()
+        self.loaded_path_index.Clear()
         self.asset_class_dict.clear()
         self.asset_name_dict.clear()
         self._patterns_loaded.clear()
@@ -155,6 +179,7 @@ class File_System_class:
         Returns the game_file, for convenience.
         '''
         self.game_file_dict[game_file.virtual_path] = game_file
+        self.loaded_path_index.Add(game_file.virtual_path)
         
         # Check if the game_file is an xml file with a supported
         # asset tag, and updates the asset_class_dict if so.
@@ -170,6 +195,37 @@ class File_System_class:
         return game_file
 
 
+    def Print_XML_Memory_Report(self, max_files = 20):
+        '''
+        Print an estimate of the memory held by loaded xml files, and
+        the bytes saved by sharing unmodified trees between the vanilla,
+        patched, and current versions, for profiling.
+        Per-file savings are listed for the files with the largest savings,
+        up to max_files.
+        '''
+        file_stats = []
+        for virtual_path, game_file in self.game_file_dict.items():
+            if not isinstance(game_file, XML_File):
+                continue
+            tree_bytes, saved_bytes = game_file.Get_Memory_Savings()
+            file_stats.append((saved_bytes, tree_bytes, virtual_path))
+        if not file_stats:
+            return
+
+        file_stats.sort(reverse = True)
+        Print('XML memory: {} files, ~{:.2f} MB in trees, ~{:.2f} MB saved by sharing'.format(
+            len(file_stats),
+            sum(x[1] for x in file_stats) / 1e6,
+            sum(x[0] for x in file_stats) / 1e6,
+            ))
+        for saved_bytes, tree_bytes, virtual_path in file_stats[:max_files]:
+            if not saved_bytes:
+                break
+            Print('  {}: ~{:.1f} KB saved (tree ~{:.1f} KB)'.format(
+                virtual_path, saved_bytes / 1e3, tree_bytes / 1e3))
+        return
+
+
     def Reset_File(self, virtual_path):
         '''
         Reset a single file, if loaded. Any later Load_File calls
@@ -184,6 +240,7 @@ class File_System_class:
         game_file = self.Load_File(virtual_path)
         # Remove from the main file dict.
         self.game_file_dict.pop(virtual_path)
+        self.loaded_path_index.Remove(virtual_path)
 
         # Also remove from anywhere else that might use it.
         # These will use a game_file object search.
@@ -323,7 +380,9 @@ class File_System_class:
         #    if pattern == None or fnmatch(path, pattern):
         #        ret_list.append(game_file)
         # Speed up with filter().
-        paths = fnmatch.filter(self.game_file_dict.keys(), pattern.lower())
+        #paths = fnmatch.filter(self.game_file_dict.keys(), pattern.lower())
+        # Speed up further with a path index.
+        paths = self.loaded_path_index.Filter(pattern.lower())
         return [self.game_file_dict[x] for x in paths]
     
 
@@ -413,11 +472,49 @@ class File_System_class:
         self._patterns_loaded.add(pattern)
 
         # Load all files matching the pattern.
+        # Files not yet loaded are read together, so that extension
+        # patching can be spread across processes.
+        virtual_paths = list(self.Gen_All_Virtual_Paths(pattern))
+        read_dict = self.Load_Multiple(virtual_paths)
+
         files = []
-        for virtual_path in self.Gen_All_Virtual_Paths(pattern):
+        for virtual_path in virtual_paths:
+            # Error on files that failed to load, same as Load_File,
+            # without reading them again.
+            if virtual_path in read_dict and read_dict[virtual_path] == None:
+                raise File_Missing_Exception(('Error: Could not find file'
+                        ' "{}", or file was empty').format(virtual_path))
             files.append( self.Load_File(virtual_path) )
         return files
 
+
+    @_Verify_Init
+    def Load_Multiple(self, virtual_paths, error_if_unmatched_diff = False):
+        '''
+        Bulk version of Load_File, loading all of the given files not
+        already loaded, using Source_Reader.Read_Multiple.
+        Returns a dict, keyed by virtual_path, of the files newly read,
+        with None for any that were not found or were empty.
+        '''
+        # Standardize the paths the same way as Load_File.
+        virtual_paths = [x.lower().replace('\\','/') for x in virtual_paths]
+        # Skip loaded files, and any duplicates.
+        virtual_paths = [x for x in OrderedDict.fromkeys(virtual_paths)
+                         if x not in self.game_file_dict]
+        if not virtual_paths:
+            return {}
+
+        game_files = self.source_reader.Read_Multiple(
+            virtual_paths, 
+            error_if_not_found = False,
+            error_if_unmatched_diff = error_if_unmatched_diff)
+
+        for virtual_path, game_file in zip(virtual_paths, game_files):
+            if game_file != None:
+                assert game_file.virtual_path == virtual_path
+                self.Add_File(game_file)
+        return dict(zip(virtual_paths, game_files))
+
     
     @_Verify_Init
     def Get_Source_Reader(self):
@@ -448,6 +545,11 @@ class File_System_class:
          are not removed if the new run had an error during a transform.
         '''
         Print('Cleaning up old files')
+
+        # Close pooled dat files first, since an old output catalog
+        # may have been read this run (eg. with ignore_output_extension
+        # off), and open mappings would block its removal on windows.
+        Dat_File_Pool.Close_All()
         
         # Find all files generated on a prior run, that still appear to be
         #  from that run (eg. were not changed externally), and remove
@@ -574,6 +676,10 @@ class File_System_class:
         # Do this before the proper writeout, so it can reuse functionality.
         self.Add_Source_Folder_Copies()
 
+        # Set up the diff patch cache, to skip remaking unchanged patches.
+        if Settings.use_diff_patch_cache:
+            Diff_Patch_Cache.Load(Settings.Get_Diff_Patch_Cache_Path())
+
         # TODO: do a pre-pass on all files to do a test write, then if all
         #  look good, do the actual writes and log updates, to weed out
         #  bugs early.
@@ -601,6 +707,7 @@ class File_System_class:
         if Settings.generate_sigs:
             for game_file in Generate_Signatures(self.game_file_dict.values()):
                 self.game_file_dict[game_file.virtual_path] = game_file
+                self.loaded_path_index.Add(game_file.virtual_path)
 
 
         # Loop over the files that were loaded.
@@ -686,6 +793,10 @@ class File_System_class:
                 # Refresh the log file.
                 log.Store()
 
+        # Save any catalog indexes parsed during this run.
+        Catalog_Index_Cache.Store()
+        # Save the diff patches made this run, dropping older ones.
+        Diff_Patch_Cache.Close()
         return
 
     
@@ -12,6 +12,7 @@ __all__ = [
     'XML_Text_File',
     'XML_Wares_File',
     'XML_Index_File',
+    'XML_Keyed_File',
     'Machine_Code_File',
     'Signature_File',
     'Text_File',
@@ -24,6 +25,7 @@ from lxml import etree as ET
 from copy import deepcopy
 from collections import OrderedDict, defaultdict
 import fnmatch
+import itertools
 import time
 
 from ..Common import Plugin_Log
@@ -31,6 +33,8 @@ from ..Common import Settings
 from ..Common import Print
 #Settings = Common.Settings
 from . import XML_Diff
+from .Diff_Patch_Cache import Diff_Patch_Cache
+from .Path_Index import Path_Index
 
 
 def New_Game_File(binary, **kwargs):
@@ -69,6 +73,9 @@ def New_Game_File(binary, **kwargs):
             or virtual_path == 'libraries/mousecursors.xml'):
                 class_type = XML_Index_File
 
+            elif virtual_path in keyed_xml_file_specs:
+                class_type = XML_Keyed_File
+
         elif suffix == 'xsd':
             # These are xml style documentation of xml syntax.
             # May be compatible with xml, so try that.
@@ -376,22 +383,149 @@ class Game_File:
         '''
         return
 
+    def Get_Binary_Job(self, for_cat = False):
+        '''
+        Returns a tuple of (func, args) such that func(*args) returns
+        the same binary as Get_Binary(for_cat = for_cat), where func
+        and args are picklable and can run in a worker process.
+        Returns None if producing the binary is cheap, in which case
+        Get_Binary should just be called directly.
+        '''
+        return None
+
+
+    def Record_Binary_Job_Result(self, binary):
+        '''
+        Called with the binary produced by running the job from
+        Get_Binary_Job, in case the file wants to keep it (eg. to cache).
+        '''
+        return
+
+
     def Standardize_Binary_Newlines(self, binary):
         '''
         If the given binary represents text, has newlines, and does not
         have carriage returns, this method adds the carriage returns
         and passed back the modified binary.
         '''
-        # Standardize newlines to \r\n.
-        newline = '\n'.encode()
-        creturn = '\r'.encode()
-        # Just in case it already uses \r\n, check for carriage returns first.
-        # (Assume they don't show up otherwise.)
-        if newline in binary and creturn not in binary:
-            binary = binary.replace(newline, creturn + newline)
-        return binary
+        return Standardize_Binary_Newlines(binary)
+
+
+def Standardize_Binary_Newlines(binary):
+    '''
+    If the given binary represents text, has newlines, and does not
+    have carriage returns, this adds the carriage returns and passes
+    back the modified binary.
+    '''
+    # Standardize newlines to \r\n.
+    newline = '\n'.encode()
+    creturn = '\r'.encode()
+    # Just in case it already uses \r\n, check for carriage returns first.
+    # (Assume they don't show up otherwise.)
+    if newline in binary and creturn not in binary:
+        binary = binary.replace(newline, creturn + newline)
+    return binary
 
 
+def _Print_XML_Binary(xml_root, for_cat):
+    '''
+    Returns the pretty printed binary for an xml root, with declaration,
+    standardizing newlines if for_cat.
+    '''
+    # Pack into an ElementTree, to get full header.
+    tree = ET.ElementTree(xml_root)
+
+    # Pretty print it. This returns bytes.
+    binary = XML_Diff.Print(tree, encoding = 'utf-8', xml_declaration = True)
+
+    # To be safe, add a newline at the end if not there, since
+    # some file readers need it.
+    # -Removed for now; ego cat/dats do not add extra newlines.
+    #newline_char = '\n'.encode(encoding = 'utf-8')
+    #if not binary.endswith(newline_char):
+    #    binary += newline_char
+        
+    # TODO: maybe standardize always anyway.
+    if for_cat:
+        binary = Standardize_Binary_Newlines(binary)
+    return binary
+
+
+def Estimate_XML_Bytes(xml_root):
+    '''
+    Returns a rough estimate of the memory used by an lxml tree, in bytes.
+    lxml doesn't expose this, so it is based on typical libxml2 struct
+    sizes on 64-bit: about 120 bytes per element or text node, and 96
+    per attribute (plus its value text node), plus string lengths.
+    '''
+    if xml_root == None:
+        return 0
+    total = 0
+    for node in xml_root.iter():
+        total += 120
+        if node.text:
+            total += 120 + len(node.text)
+        if node.tail:
+            total += 120 + len(node.tail)
+        for value in node.attrib.values():
+            total += 216 + len(value)
+    return total
+
+
+def _Make_XML_Diff_Binary(
+        original_root, 
+        modified_root, 
+        patch_kwargs, 
+        for_cat,
+        running_id = None,
+    ):
+    '''
+    Returns the binary of a diff patch from original_root to
+    modified_root. For use by XML_File binary jobs, possibly in
+    a worker process.
+
+    * patch_kwargs
+      - Dict of extra args for XML_Diff.Make_Patch, normally from
+        XML_File.Get_Diff_Kwargs.
+    * running_id
+      - Int, optional, the node id counter of the process that
+        created the job. Worker processes advance their own counter
+        past this, so new nodes never reuse ids in the given trees.
+    '''
+    if running_id != None:
+        XML_Diff.Advance_Running_ID(running_id)
+    patch_node = XML_Diff.Make_Patch(
+        original_node = original_root, 
+        modified_node = modified_root,
+        **patch_kwargs)
+    return _Print_XML_Binary(patch_node, for_cat)
+
+
+class _Node_Index:
+    '''
+    Lookup tables for finding nodes of one xml root version, used when
+    reading many single nodes (eg. live editor items).
+
+    Attributes:
+    * root
+      - Element the tables were built from.
+    * node_id_dict
+      - Dict, keyed by node id, holding the node (or None for shared
+        ids), from XML_Diff.Make_Node_ID_Dict; None until first used.
+    * xpath_nodes_dict
+      - Dict, keyed by xpath, holding the list of found nodes.
+    '''
+    __slots__ = ('root', 'node_id_dict', 'xpath_nodes_dict')
+    def __init__(self, root):
+        self.root = root
+        self.node_id_dict = None
+        self.xpath_nodes_dict = {}
+        return
+
+
+# Source of XML_File modified_stamp values.
+_modified_stamp_counter = itertools.count(1)
+
 # Note: encoding assumed to be utf-8 in general.
 # A grep of the x4 dat files didn't find any non-utf8 xml encodings.
 # Mods may be non-utf8; keep the logic for handling encoding here just
@@ -415,9 +549,22 @@ class XML_File(Game_File):
       - Element holding the original parsed xml, pre-patches, pre-transforms.
     * patched_root
       - Element holding the diff patched root, pre-transforms.
+      - This is the same object as original_root until the first
+        diff patch is applied, at which point it is copied.
     * modified_root
       - Element holding transformed xml, suitable for generating
         new diff patches.
+      - None until the first Update_Root; until then the patched_root
+        serves as the current version.
+    * root_requested
+      - Bool, True once Get_Root has been called, as a sanity check
+        for Update_Root.
+    * modified_stamp
+      - Int, unique to the current modified_root, or None when there
+        is no modified_root. See Get_Modified_Stamp.
+    * node_index_dict
+      - Dict, keyed by root Element, holding the _Node_Index for that
+        root, used by Find_Nodes. Entries for replaced roots are dropped.
     * root_tag
       - Tag name of the root node, for convenient referencing.
       - This is never expected to change across diff patches or transforms.
@@ -477,8 +624,10 @@ class XML_File(Game_File):
             
         if self.original_root != None:
             # Init the patched version to the original.
-            # Deepcopy this, since patching will edit it in place.
-            self.patched_root = deepcopy(self.original_root)
+            # This is shared until patching, which edits it in place,
+            # so that unpatched files (the large majority, including all
+            # of the diff patch files themselves) hold a single tree.
+            self.patched_root = self.original_root
 
             # The root tag should never be changed by mods, so can
             #  record it here pre-patching.
@@ -489,8 +638,11 @@ class XML_File(Game_File):
             self.load_error = True
 
         # Modified root starts as None; gets initialized sometime after
-        # Delayed_Init when Get_Root is called by a transform.
+        # Delayed_Init when a transform calls Update_Root.
         self.modified_root = None
+        self.modified_stamp = None
+        self.node_index_dict = {}
+        self.root_requested = False
         return
     
     
@@ -505,6 +657,8 @@ class XML_File(Game_File):
 
         # Annotate the patched_root with node ids.
         XML_Diff.Fill_Node_IDs(self.patched_root)
+        # Any node indexes predate the ids.
+        self.node_index_dict.clear()
         
         # Skip if the tag doesn't match supported asset types.
         # Note: diff patches will have a 'diff' root, and don't
@@ -621,17 +775,15 @@ class XML_File(Game_File):
         '''
         Return an Element object with a copy of the current modified xml.
         The first call of this should occur after all initial patching is
-        complete, as that is when the patched_root is first annotated
-        and copied.
-        '''
-        if self.modified_root == None:
-            # Set the initial modified tree to a deep copy of the patched
-            #  version; this will keep node_ids intact.
-            self.modified_root = deepcopy(self.patched_root)
-        # Return a deepcopy of the modified_root, so that a transform
+        complete, as that is when the patched_root is first annotated.
+        '''
+        self.root_requested = True
+        # Return a deepcopy of the current root, so that a transform
         #  can edit it safely, even if it exceptions out and doesn't
-        #  complete.
-        return deepcopy(self.modified_root)
+        #  complete. The deepcopy keeps node_ids intact.
+        # Note: the modified_root isn't copied from the patched_root
+        #  here; the patched_root stands in for it until Update_Root.
+        return deepcopy(self.Get_Root_Readonly())
 
 
     def Get_Root_Readonly(self, version = None):
@@ -647,8 +799,6 @@ class XML_File(Game_File):
           - 'current': Default, returns the current modified root.
         '''
         if not version or version == 'current':
-            # TODO: maybe just have modified_root init to the patched_root,
-            # removing this check.
             if self.modified_root != None:
                 return self.modified_root
             return self.patched_root
@@ -673,9 +823,9 @@ class XML_File(Game_File):
         if (element_root is self.patched_root 
             or element_root is self.original_root 
             or element_root is self.modified_root
-            # Backup check in case node ids go awry; the modified root
-            # should have been created.
-            or self.modified_root == None):
+            # Backup check in case node ids go awry; the root should
+            # have been requested.
+            or not self.root_requested):
             raise AssertionError('Attempted to Update_Root with a read-only'
                                  ' existing root.')
         # Ensure tags match up.
@@ -683,13 +833,31 @@ class XML_File(Game_File):
         # wouldn't support complete xml replacements, it can catch
         # xml being written back from a different file (unless that
         # should be allowed).
-        assert element_root.tag == self.modified_root.tag
+        assert element_root.tag == self.Get_Root_Readonly().tag
         # Assume the xml changed from the patched version.
         self.modified = True
         self.modified_root = element_root
+        self.modified_stamp = next(_modified_stamp_counter)
+
+        # Drop the node index of the replaced root.
+        live_roots = [self.original_root, self.patched_root, self.modified_root]
+        for old_root in list(self.node_index_dict):
+            if not any(old_root is x for x in live_roots):
+                del self.node_index_dict[old_root]
         return
 
 
+    def Get_Modified_Stamp(self):
+        '''
+        Returns an int that changes whenever the 'current' root is
+        updated, or None if the file is unmodified (in which case the
+        'current' root matches the 'patched' root). Stamps are unique
+        across all files, including those reloaded after a file
+        system reset.
+        '''
+        return self.modified_stamp
+
+
     def Get_Xpath_Nodes(self, xpath, version = 'current'):
         '''
         Returns a list of read-only nodes found using the given xpath on
@@ -704,6 +872,33 @@ class XML_File(Game_File):
         return nodes
 
 
+    def Find_Nodes(self, xpath, node_id = None, version = 'current'):
+        '''
+        Returns a list of read-only nodes for the given version, looked
+        up by node id if given and found (a single node), else by the
+        xpath. Lookup tables are built once per root, and xpath results
+        are kept, so this suits repeated single node reads of a file
+        (eg. from live editor items) where positional xpaths are slow.
+        Nodes should not be modified.
+        '''
+        root = self.Get_Root_Readonly(version)
+        index = self.node_index_dict.get(root)
+        if index == None:
+            index = self.node_index_dict[root] = _Node_Index(root)
+
+        if node_id != None:
+            if index.node_id_dict == None:
+                index.node_id_dict = XML_Diff.Make_Node_ID_Dict(root)
+            node = index.node_id_dict.get(node_id)
+            if node != None:
+                return [node]
+
+        nodes = index.xpath_nodes_dict.get(xpath)
+        if nodes == None:
+            nodes = index.xpath_nodes_dict[xpath] = self.Get_Xpath_Nodes(xpath, version)
+        return nodes
+
+
     # Note: xml only needs diffing if it originates from somewhere else,
     #  and isn't new.
     # TODO: set up a flag for new, non-diff xml files. For now, all need
@@ -716,19 +911,10 @@ class XML_File(Game_File):
         if Settings.profile:
             start = time.time()
 
-        # Combine forced attributes with a comma.
-        forced_attributes = Settings.forced_xpath_attributes
-        if forced_attributes and self.forced_xpath_attributes:
-            forced_attributes += ','
-        forced_attributes += self.forced_xpath_attributes
-
         patch_node = XML_Diff.Make_Patch(
             original_node = self.patched_root, 
             modified_node = self.Get_Root_Readonly(),
-            forced_attributes = forced_attributes,
-            maximal = Settings.make_maximal_diffs,
-            shorten_xpaths = Settings.shorten_xpaths,
-            verify = True)
+            **self.Get_Diff_Kwargs())
 
         if Settings.profile:
             Print('XML_Diff.Make_Patch for {} time: {:.2f}'.format(
@@ -736,6 +922,58 @@ class XML_File(Game_File):
         return patch_node
 
 
+    def Get_Memory_Savings(self):
+        '''
+        Returns a tuple of (tree_bytes, saved_bytes), with estimated bytes
+        held by this file's current xml tree, and bytes saved by sharing
+        trees between versions instead of holding separate copies.
+        '''
+        tree_bytes = Estimate_XML_Bytes(self.Get_Root_Readonly())
+        saved_bytes = 0
+        # Unpatched files share the vanilla tree.
+        if self.patched_root is not None and self.patched_root is self.original_root:
+            saved_bytes += Estimate_XML_Bytes(self.patched_root)
+        # Files read by transforms but not updated share the patched tree.
+        # (Previously Get_Root kept a copy as the modified_root.)
+        if self.root_requested and self.modified_root == None:
+            saved_bytes += Estimate_XML_Bytes(self.patched_root)
+        return tree_bytes, saved_bytes
+
+
+    def Get_Diff_Kwargs(self):
+        '''
+        Returns a dict of the Make_Patch options used for this file's diffs,
+        taken from Settings and this file's forced attributes.
+        '''
+        # Combine forced attributes with a comma.
+        forced_attributes = Settings.forced_xpath_attributes
+        if forced_attributes and self.forced_xpath_attributes:
+            forced_attributes += ','
+        forced_attributes += self.forced_xpath_attributes
+
+        return {
+            'forced_attributes' : forced_attributes,
+            'maximal'           : Settings.make_maximal_diffs,
+            'shorten_xpaths'    : Settings.shorten_xpaths,
+            'verify'            : True,
+            }
+
+
+    def Uses_Diff(self, version = 'current', no_diff = False):
+        '''
+        Returns True if Get_Binary for the given version will produce
+        a diff patch rather than the full xml.
+        '''
+        # Modified source files will form a diff patch, others
+        # just record full xml.
+        # Non-xml will not support diffs.
+        return (self.from_source
+            and not self.edit_in_place
+            and not no_diff 
+            and version == 'current' 
+            and self.virtual_path.endswith('.xml'))
+
+
     def Get_Binary(self, version = 'current', no_diff = False, for_cat = False):
         '''
         Returns a bytearray with the full modified_root.
@@ -751,33 +989,70 @@ class XML_File(Game_File):
           - Bool, set True if this binary is going to be placed in a catalog
             file. Changes newline handling (simple linefeed).
         '''
-        # Pack into an ElementTree, to get full header.
-        # Modified source files will form a diff patch, others
-        # just record full xml.
-        # Non-xml will not support diffs.
-        if (self.from_source
-        and not self.edit_in_place
-        and not no_diff 
-        and version == 'current' 
-        and self.virtual_path.endswith('.xml')):
-            tree = ET.ElementTree(self.Get_Diff())
-        else:
-            tree = ET.ElementTree(self.Get_Root_Readonly(version))
+        if self.Uses_Diff(version, no_diff):
+            # Check for a prior run having made this same patch.
+            cache_key = self.Get_Diff_Cache_Key(for_cat)
+            binary = Diff_Patch_Cache.Get(cache_key)
+            if binary == None:
+                binary = _Print_XML_Binary(self.Get_Diff(), for_cat)
+                Diff_Patch_Cache.Set(cache_key, binary)
+            return binary
+        return _Print_XML_Binary(self.Get_Root_Readonly(version), for_cat)
 
-        # Pretty print it. This returns bytes.
-        binary = XML_Diff.Print(tree, encoding = 'utf-8', xml_declaration = True)
 
-        # To be safe, add a newline at the end if not there, since
-        # some file readers need it.
-        # -Removed for now; ego cat/dats do not add extra newlines.
-        #newline_char = '\n'.encode(encoding = 'utf-8')
-        #if not binary.endswith(newline_char):
-        #    binary += newline_char
-        
-        # TODO: maybe standardize always anyway.
-        if for_cat:
-            binary = self.Standardize_Binary_Newlines(binary)
-        return binary
+    def Get_Diff_Cache_Key(self, for_cat = False):
+        '''
+        Returns the Diff_Patch_Cache key for this file's current diff,
+        or None if the cache is inactive.
+        '''
+        if not Diff_Patch_Cache.Is_Active():
+            return None
+        modified_root = self.Get_Root_Readonly()
+        # Make_Patch fills in ids for newly added nodes; do so ahead of
+        # time so the key doesn't depend on whether a patch was made
+        # from this root already.
+        XML_Diff.Fill_Node_IDs(modified_root)
+        return Diff_Patch_Cache.Get_Key(
+            self.patched_root, 
+            modified_root,
+            self.Get_Diff_Kwargs(),
+            for_cat)
+
+
+    def Get_Binary_Job(self, for_cat = False):
+        '''
+        Returns a tuple of (func, args) such that func(*args) returns
+        the current binary, suitable for running in a worker process.
+        The xml roots in args are pickled when sent to a worker, and
+        Settings options are captured here, since workers may not
+        share the Settings of this process.
+        '''
+        if self.Uses_Diff():
+            # Cached patches are cheap; leave them to Get_Binary.
+            # (This recomputes the key, but that is small next to
+            # shipping the trees to a worker.)
+            cache_key = self.Get_Diff_Cache_Key(for_cat)
+            if Diff_Patch_Cache.Contains(cache_key):
+                return None
+            self._diff_cache_key = cache_key
+            return (_Make_XML_Diff_Binary, (
+                self.patched_root, 
+                self.Get_Root_Readonly(),
+                self.Get_Diff_Kwargs(),
+                for_cat,
+                XML_Diff.Get_Running_ID()))
+        return (_Print_XML_Binary, (self.Get_Root_Readonly(), for_cat))
+
+
+    def Record_Binary_Job_Result(self, binary):
+        '''
+        Record a diff patch made by a binary job in the Diff_Patch_Cache.
+        '''
+        cache_key = getattr(self, '_diff_cache_key', None)
+        if cache_key != None:
+            Diff_Patch_Cache.Set(cache_key, binary)
+            self._diff_cache_key = None
+        return
 
 
     def Write_File(self, file_path):
@@ -852,6 +1127,10 @@ class XML_File(Game_File):
 
         # Diff patches have a series of add, remove, replace nodes.
         # Operated on the patched_root, leaving the original_root untouched.
+        # If the patched_root is still shared with the original, split
+        # them off here.
+        if self.patched_root is self.original_root:
+            self.patched_root = deepcopy(self.original_root)
         # Note: the patched_node root may be replaced, so need to capture
         # the result and restore it (normally it will just be the same
         # patched_root object).
@@ -879,81 +1158,292 @@ class XML_File(Game_File):
 
 
 
-class XML_Text_File(XML_File):
+class _Keyed_Child_Cache:
     '''
-    XML file holding game text.
-    This provides functionality for looking up text references.
+    Lookup tables for the keyed children of one xml root version.
 
     Attributes:
-    * page_text_dict
-      - Dict, keyed by 'page[id]' then 't[id]', holding the current
-        text values. Keys are kept as strings.
-      - Added to speed up performance compared to looking up
-        text each time in the xml with xpath.
-    * requests_until_refresh
-      - Int, how many text lookup requests may occurred since the
-        last page_text_dict reset (due to modification) before
-        an automatic refresh is triggerred.
-      - Used to prevent refreshing too often when fine grain
-        modifications occur.
+    * root
+      - Element the tables were built from.
+    * node_dict
+      - Dict, keyed by child key, holding the child node.
+      - When keys repeat, the later child wins.
+    * repeat_dict
+      - Dict, keyed by child key, holding a list of all children with
+        that key, in document order, only for keys used more than once
+        (eg. a text page extended by a second page of the same id).
+    * value_dict
+      - Dict, keyed by child key, holding values derived from the
+        children with that key, filled in as they are requested.
+    * key_index
+      - Path_Index of the node_dict keys, or None if not yet built.
     '''
+    __slots__ = ('root', 'node_dict', 'repeat_dict', 'value_dict', 'key_index')
+    def __init__(self, root):
+        self.root = root
+        self.node_dict = {}
+        self.repeat_dict = {}
+        self.value_dict = {}
+        self.key_index = None
+        return
+
+
+class XML_Keyed_File(XML_File):
     '''
-    Note: for writing out wares to html, 16% of the long runtime
-    was spent on xpath lookups of ware names, hence the effort
-    to speed this process up. (This may have been influenced
-    by using a .// style xpath, since reduced to ./ style.)
+    XML file holding many regularly structured children, each with a
+    unique key attribute (eg. wares by id). This maintains lookup
+    tables from keys to child nodes, to avoid full xpath scans.
+
+    Tables are built per root version with a single pass over the
+    keyed children, on first use. When the root is updated, only the
+    'current' tables are rebuilt, and values derived from children
+    (eg. text pages) are recomputed only for children that are read
+    again. A prior key index is carried over with just the added and
+    removed keys.
+
+    Large regular files can opt into this class by adding their path
+    to keyed_xml_file_specs, or by subclassing with new child_path
+    and child_key values.
+
+    Attributes:
+    * keyed_cache_dict
+      - Dict, keyed by root Element, holding the _Keyed_Child_Cache
+        for that root. Entries for replaced roots are dropped.
+    * stale_key_index
+      - Path_Index taken from the cache of a replaced root, to be
+        updated for the next 'current' cache, or None.
     '''
-    # Static value for how many requests are allowed before a refresh.
-    # One request may count multiple times if there are recursive
-    # text lookups, so don't make this too sensitive.
-    # Note: number is an intuitive guess, and wasn't tested for optimality.
-    # Note: setting 0 here will disable the refreshes.
-    requests_until_refresh_limit = 20
+    # Relative path (as used by findall) from the root to keyed children.
+    child_path = None
+    # Attribute holding each child's key.
+    child_key = 'id'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.page_text_dict = defaultdict(dict)
-        self.requests_until_refresh = self.requests_until_refresh_limit
+        # Generic keyed files pick up their layout by path.
+        if self.child_path == None:
+            spec = keyed_xml_file_specs.get(self.virtual_path)
+            if spec != None:
+                self.child_path, self.child_key = spec
+        self.keyed_cache_dict = {}
+        self.stale_key_index = None
         return
 
 
-    def Refresh_Cache(self):
+    def Update_Root(self, *args, **kwargs):
         '''
-        Reads the xml and sets up the page_text_dict.
-        This will need a rerun when the xml gets modified and a new
-        Read is requested, if it is to be beneficial.
+        Drops the keyed cache of the replaced root; the new one is
+        built on the next lookup.
         '''
-        # Stop the counter.
-        self.requests_until_refresh = 0
-        # Skip early if the dict is already filled in.
-        if self.page_text_dict:
-            return
-        for page_node in self.Get_Root_Readonly().getchildren():
-            if page_node.tag != 'page':
-                continue
-            page_id = page_node.get('id')
-            for t_node in page_node.getchildren():
-                if t_node.tag != 't':
-                    continue
-                self.page_text_dict[page_id][t_node.get('id')] = t_node.text
+        super().Update_Root(*args, **kwargs)
+        self._Drop_Stale_Caches()
         return
 
 
-    def Update_Root(self, *args, **kwargs):
+    def _Drop_Stale_Caches(self):
         '''
-        Clears the page_text_dict when root is updated.
+        Drops caches of roots no longer in use (normally the prior
+        'current' root), keeping any key index to patch up later.
         '''
-        super().Update_Root(*args, **kwargs)
-        self.page_text_dict.clear()
-        # Set the refresh countdown.
-        self.requests_until_refresh = self.requests_until_refresh_limit
+        live_roots = [self.original_root, self.patched_root, self.modified_root]
+        for old_root in list(self.keyed_cache_dict):
+            if not any(old_root is x for x in live_roots):
+                old_cache = self.keyed_cache_dict.pop(old_root)
+                if old_cache.key_index != None:
+                    self.stale_key_index = old_cache.key_index
         return
 
 
+    def Get_Keyed_Cache(self, version = 'current'):
+        '''
+        Returns the _Keyed_Child_Cache for the given root version,
+        building it if needed.
+        '''
+        root = self.Get_Root_Readonly(version)
+        cache = self.keyed_cache_dict.get(root)
+        if cache == None:
+            cache = self._Build_Keyed_Cache(root)
+        return cache
+
+
+    def _Build_Keyed_Cache(self, root):
+        '''
+        Builds, records, and returns a _Keyed_Child_Cache for the given
+        root. Caches of roots no longer in use are dropped, reusing
+        any key index from them.
+        '''
+        if Settings.profile:
+            start = time.time()
+
+        cache = _Keyed_Child_Cache(root)
+        if root != None and self.child_path != None:
+            key = self.child_key
+            node_dict = cache.node_dict
+            for child in root.iterfind(self.child_path):
+                child_key = child.get(key)
+                # Children missing the key can't be looked up.
+                if child_key == None:
+                    continue
+                prior = node_dict.get(child_key)
+                if prior != None:
+                    repeats = cache.repeat_dict.get(child_key)
+                    if repeats == None:
+                        repeats = cache.repeat_dict[child_key] = [prior]
+                    repeats.append(child)
+                node_dict[child_key] = child
+
+        # Patch up the key index of the replaced root if present, and
+        # if this is the new current root; most updates change few,
+        # if any, keys.
+        self._Drop_Stale_Caches()
+        old_index = self.stale_key_index
+        if old_index != None and root is self.Get_Root_Readonly():
+            self.stale_key_index = None
+            for name in [x for x in old_index.key_path_dict.values()
+                         if x not in cache.node_dict]:
+                old_index.Remove(name)
+            for name in cache.node_dict:
+                old_index.Add(name)
+            cache.key_index = old_index
+
+        self.keyed_cache_dict[root] = cache
+
+        if Settings.profile:
+            Print('{} keyed cache built for {} children in {:.3f} s'.format(
+                self.virtual_path, len(cache.node_dict), time.time() - start))
+        return cache
+
+
+    def Get_Keyed_Children(self, version = 'current'):
+        '''
+        Returns a dict, keyed by child key, of the child nodes for
+        the given version. Nodes should be considered read only.
+        '''
+        return self.Get_Keyed_Cache(version).node_dict
+
+
+    def Get_Keyed_Child(self, key, version = 'current'):
+        '''
+        Returns the child node with the given key, or None if not found.
+        '''
+        return self.Get_Keyed_Cache(version).node_dict.get(key)
+
+
+    def Get_Keyed_Value(self, key, version = 'current'):
+        '''
+        Returns the value derived from the children with the given key
+        (see Make_Keyed_Value), or None if the key is not found.
+        Values are cached until the root changes.
+        '''
+        cache = self.Get_Keyed_Cache(version)
+        if key in cache.value_dict:
+            return cache.value_dict[key]
+        node = cache.node_dict.get(key)
+        if node == None:
+            return None
+        nodes = cache.repeat_dict.get(key, [node])
+        value = cache.value_dict[key] = self.Make_Keyed_Value(nodes)
+        return value
+
+
+    def Make_Keyed_Value(self, nodes):
+        '''
+        Returns the value to cache for a key, given the list of child
+        nodes with that key, in document order (normally just one).
+        Subclasses may override this; by default returns the last node,
+        matching Get_Keyed_Child.
+        '''
+        return nodes[-1]
+
+
+    def Filter_Keys(self, pattern, version = 'current'):
+        '''
+        Returns a list of child keys matching the given wildcard pattern.
+        '''
+        cache = self.Get_Keyed_Cache(version)
+        if cache.key_index == None:
+            cache.key_index = Path_Index(cache.node_dict.keys())
+        return cache.key_index.Filter(pattern)
+
+
+    def Get_Xpath_Nodes(self, xpath, version = 'current'):
+        '''
+        Returns a list of nodes found using the given xpath on the given
+        version of the xml root. Defaults to the 'current' version.
+        Nodes should be considered read only.
+
+        If the xpath starts with the pattern './{child_path}[@{child_key}="*"]',
+        eg. './ware[@id="*"]/*', its lookup will be accelerated.
+        '''
+        nodes = None
+        if self.child_path == None:
+            return super().Get_Xpath_Nodes(xpath, version)
+        prefix = './{}[@{}="'.format(self.child_path, self.child_key)
+        if xpath.startswith(prefix):
+            # Split out the key.
+            key, remainder = xpath[len(prefix):].split('"]',1)
+
+            # If the remainder is empty or a '/', can continue,
+            # otherwise do a normal xpath since there are more
+            # qualifiers.
+            if not remainder or remainder[0] == '/':
+                node = self.Get_Keyed_Child(key, version)
+                if node != None:
+                    # If there is a remainder, reform it into a further
+                    #  xpath starting from the child node.
+                    if remainder:
+                        nodes = node.xpath('.' + remainder)
+                    # Otherwise, just return this child.
+                    else:
+                        nodes = [node]
+
+        # If nothing was found in the cache, do a normal lookup.
+        if not nodes:
+            nodes = super().Get_Xpath_Nodes(xpath, version)
+        return nodes
+
+
+# Other large, regular xml files, that transforms tend to look up by
+# key, matched to their (child_path, child_key).
+keyed_xml_file_specs = {
+    'libraries/jobs.xml'     : ('job', 'id'),
+    'libraries/factions.xml' : ('faction', 'id'),
+    'libraries/god.xml'      : ('stations/station', 'id'),
+    }
+
+
+class XML_Text_File(XML_Keyed_File):
+    '''
+    XML file holding game text.
+    This provides functionality for looking up text references.
+    Pages are keyed by id, and each page's text is gathered into a
+    dict, keyed by 't[id]', on its first lookup. Keys are kept
+    as strings. Pages sharing an id (eg. one added by an extension)
+    are merged, with later text winning, as the game does.
+    '''
+    '''
+    Note: for writing out wares to html, 16% of the long runtime
+    was spent on xpath lookups of ware names, hence the effort
+    to speed this process up. (This may have been influenced
+    by using a .// style xpath, since reduced to ./ style.)
+    '''
+    child_path = 'page'
+    child_key = 'id'
+
+    def Make_Keyed_Value(self, page_nodes):
+        '''
+        Returns a dict of t node text, keyed by t id, merged over all
+        pages with the same id.
+        '''
+        return {x.get('id') : x.text 
+                for page_node in page_nodes 
+                for x in page_node.iterfind('t')}
+
+
     def Read(
-            self, 
-            text = None, 
-            page = None, 
+            self,
+            text = None,
+            page = None,
             id = None,
             ):
         '''
@@ -966,12 +1456,6 @@ class XML_Text_File(XML_File):
           - Int or string, page and id separated; give for direct
             dereference instead of a full text string.
         '''
-        # Maybe do a refresh of the page_text_dict.
-        if self.requests_until_refresh > 0:
-            self.requests_until_refresh -= 1
-            if self.requests_until_refresh <= 0:
-                self.Refresh_Cache()
-
         # Verify if text is given, it is just in brackets, and split it.
         if text != None:
             try:
@@ -989,85 +1473,38 @@ class XML_Text_File(XML_File):
             # Convert page/id to strings if needed.
             page = str(page)
             id = str(id)
-            
+
         # Look up the entry.
-        # Use xpath if the page_text_dict is not ready,
-        # else use the dict for faster lookup.
-        ret_text = None
-        if self.page_text_dict:
-            try:
-                ret_text = self.page_text_dict[page][id]
-            except KeyError:
-                return
-        else:
-            nodes = self.Get_Root_Readonly().xpath(f'./page[@id="{page}"]/t[@id="{id}"]')
-            if not nodes:
-                return
-            ret_text = nodes[0].text
+        page_text_dict = self.Get_Keyed_Value(page)
+        if page_text_dict == None:
+            return
+        return page_text_dict.get(id)
 
-        return ret_text
 
-    
-class XML_Index_File(XML_File):
+class XML_Index_File(XML_Keyed_File):
     '''
     XML file holding a an index (effectively dict) of name:path pairs.
     Expected to be used for macros, components, and mousecursors.
     This will append a '.xml' extension to the looked up paths, since
     it is missing from the x4 source file paths.
 
-    Attributes:
-    * name_path_dict
-      - Dict, keyed by entry name, with the virtual_path to an
-        xml source file.
-      - Paths will be lower cased; name is kept in original case.
-    * requests_until_refresh
-      - Int, how many text lookup requests may occurred since the
-        last page_text_dict reset (due to modification) before
-        an automatic refresh is triggerred.
-      - Used to prevent refreshing too often when fine grain
-        modifications occur.
+    Entries are keyed by name, kept in original case, and their values
+    are the lower cased virtual_paths to xml source files.
     '''
-    requests_until_refresh_limit = 5
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.name_path_dict = {}
-        self.requests_until_refresh = self.requests_until_refresh_limit
-        return
-
-    def Refresh_Cache(self):
-        '''
-        Reads the xml and sets up the name_path_dict.
-        This will need a rerun when the xml gets modified and a new
-        Get is requested, if it is to be beneficial.
-        '''
-        # Stop the counter.
-        self.requests_until_refresh = 0
-        # Skip early if the dict is already filled in.
-        if self.name_path_dict:
-            return
-        # Root is an <index> node, children are <entry> nodes.
-        for entry_node in self.Get_Root_Readonly().getchildren():
-            if entry_node.tag != 'entry':
-                continue
-            # Note: if a mod appends new entries to the index, they will
-            #  overwrite those earlier in the index, as described at
-            #  https://forum.egosoft.com/viewtopic.php?t=347831 .
-            # No warning will be printed here, as such cases are assumed
-            #  to be intentional.
-            self.name_path_dict[entry_node.get('name')] = entry_node.get('value').lower() + '.xml'
-        return
-
+    child_path = 'entry'
+    child_key = 'name'
 
-    def Update_Root(self, *args, **kwargs):
+    # Note: if a mod appends new entries to the index, they will
+    #  overwrite those earlier in the index, as described at
+    #  https://forum.egosoft.com/viewtopic.php?t=347831 .
+    # No warning will be printed here, as such cases are assumed
+    #  to be intentional. The keyed cache keeps the last entry of
+    #  a given name, matching this.
+    def Make_Keyed_Value(self, entry_nodes):
         '''
-        Clears the page_text_dict when root is updated.
+        Returns the virtual_path for the last entry node of a name.
         '''
-        super().Update_Root(*args, **kwargs)
-        self.name_path_dict.clear()
-        # Set the refresh countdown.
-        self.requests_until_refresh = self.requests_until_refresh_limit
-        return
+        return entry_nodes[-1].get('value').lower() + '.xml'
 
 
     def Find(self, name):
@@ -1075,24 +1512,7 @@ class XML_Index_File(XML_File):
         Returns the indexed path matching the given name, or None
         if the name is not found. Name is case sensitive.
         '''
-        # Maybe do a refresh of the name_path_dict.
-        if self.requests_until_refresh > 0:
-            self.requests_until_refresh -= 1
-            if self.requests_until_refresh <= 0:
-                self.Refresh_Cache()
-
-        # Do a normal or xpath lookup, depending on cache status.
-        # Name is not lowercased, to preserve it for the xpath.
-        if self.name_path_dict:
-            return self.name_path_dict.get(name, None)
-        else:
-            root = self.Get_Root_Readonly()
-            nodes = root.xpath('./entry[@name="{}"]'.format(name))
-            if not nodes:
-                value = nodes[0].get('value', None)
-                if value != None:
-                    return value.lower() + '.xml'
-        return None
+        return self.Get_Keyed_Value(name)
 
 
     def Findall(self, pattern):
@@ -1102,138 +1522,37 @@ class XML_Index_File(XML_File):
         Eg. Findall('ship_*') is expected to find every ship file path.
         Duplicates are ignored.
         '''
-        # Use the cached dict for this; ensure it is filled in.
-        self.Refresh_Cache()
-
         # Seach the keys.
         #ret_list = []
         #for key, value in self.name_path_dict.items():
         #    if fnmatch(key, pattern):
         #        ret_list.add(value)
         # Switch to filter() for speed.
-        keys = fnmatch.filter(self.name_path_dict.keys(), pattern.lower())
+        #keys = fnmatch.filter(self.name_path_dict.keys(), pattern.lower())
+        # Switch to an index for more speed, since most lookups have
+        # a literal prefix, eg. 'ship_'.
+        keys = self.Filter_Keys(pattern.lower())
         # TODO: is the set cast needed?
-        return set([self.name_path_dict[x] for x in keys])
+        return set([self.Get_Keyed_Value(x) for x in keys])
 
 
-class XML_Wares_File(XML_File):
+class XML_Wares_File(XML_Keyed_File):
     '''
     The libraries/wares.xml file. This has some functionality for
-    speeding up xpath reads.
-
-    Attributes:
-    * version_ware_node_dict
-      - Dict, keyed by version then by 'ware[id]', holding the node for
-        each ware.
-      - Added to speed up performance compared to looking up
-        nodes each time in the xml with xpath, when the xpaths
-        have ware id qualifiers.
-    * requests_until_refresh
-      - Int, how many text lookup requests may occurred since the
-        last ware_node_dict reset (due to modification) before
-        an automatic refresh is triggerred.
-      - Used to prevent refreshing too often when fine grain
-        modifications occur.
+    speeding up xpath reads, using the keyed cache of wares by id.
     '''
     '''
     Note: this caching dropped the wares live editor object parsing
     from 18 seconds down to 2, compared to using the full xpath
     every time.
     '''
-    requests_until_refresh_limit = 5
+    child_path = 'ware'
+    child_key = 'id'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         assert self.virtual_path == 'libraries/wares.xml'
-        self.version_ware_node_dict = defaultdict(dict)
-        self.requests_until_refresh = self.requests_until_refresh_limit
-        return
-    
-
-    def Refresh_Cache(self):
-        '''
-        Reads the xml and sets up the ware_node_dict.
-        This will need a rerun when the xml gets modified and a new
-        Get_Xpath_Nodes is requested, if it is to be beneficial.
-        The 'vanilla' and 'patched' versions will be filled once
-        and never cleared.
-        '''
-        # Stop the counter.
-        self.requests_until_refresh = 0
-        for version in ['vanilla','patched','current']:
-            # Skip if already filled in.
-            if self.version_ware_node_dict[version]:
-                continue
-            # Convenience renaming.
-            this_dict = self.version_ware_node_dict[version]
-            # Loop over the wares.
-            for ware_node in self.Get_Root_Readonly(version).getchildren():
-                if ware_node.tag != 'ware':
-                    continue
-                # Store it by id.
-                this_dict[ware_node.get('id')] = ware_node
-        return
-
-
-    def Update_Root(self, *args, **kwargs):
-        '''
-        Clears version_ware_node_dict['current'] when root is updated.
-        '''
-        super().Update_Root(*args, **kwargs)
-        self.version_ware_node_dict['current'].clear()
-        # Set the refresh countdown.
-        self.requests_until_refresh = self.requests_until_refresh_limit
         return
-    
-
-    def Get_Xpath_Nodes(self, xpath, version = 'current'):
-        '''
-        Returns a list of nodes found using the given xpath on the given
-        version of the xml root. Defaults to the 'current' version.
-        Nodes should be considered read only.
-
-        If the xpath starts with the pattern './ware[@id="*"]/*', its
-        lookup will be accelerated.
-        '''
-        # Maybe do a refresh of the version_ware_node_dict.
-        if self.requests_until_refresh > 0:
-            self.requests_until_refresh -= 1
-            if self.requests_until_refresh <= 0:
-                # This will fill in all versions, which shouldn't
-                # have much overhead vs just one version, and saves
-                # this from having to have separate version countdowns.
-                self.Refresh_Cache()
-
-        # Check if the cache is ready.
-        ware_nodes = None
-        if self.version_ware_node_dict[version]:
-
-            # Check the xpath start.
-            if xpath.startswith('./ware[@id="'):
-                # Split out the id.
-                id, remainder = xpath.replace('./ware[@id="','').split('"]',1)
-
-                # If the remainder is empty or a '/', can continue,
-                # otherwise do a normal xpath since there are more
-                # qualifiers.
-                if not remainder or remainder[0] == '/':
-
-                    # Look up the node from the cache.
-                    ware_node = self.version_ware_node_dict[version].get(id)
-                    if ware_node != None:
-                        # If there is a remainder, reform it into a further
-                        #  xpath starting from the ware node.
-                        if remainder:
-                            new_xpath = '.' + remainder
-                            ware_nodes = ware_node.xpath(new_xpath)
-                        # Otherwise, just return this ware.
-                        else:
-                            ware_nodes = [ware_node]                               
-
-        # If nothing was found in the cache, do a normal lookup.
-        if not ware_nodes:
-            ware_nodes = super().Get_Xpath_Nodes(xpath, version)            
-        return ware_nodes
 
 
 # TODO: split this into separate text and binary versions.
@@ -1333,7 +1652,9 @@ class Text_File(Misc_File):
         else:
             assert binary != None
             # Manually standardize newlines.
-            self.text = binary.decode().replace('\r\n','\n').replace('\r','\n')
+            # (Binary may be a memoryview from a pooled dat, so decode
+            # through str() instead of bytes.decode.)
+            self.text = str(binary, encoding = 'utf-8').replace('\r\n','\n').replace('\r','\n')
     
     def Needs_Subst(self):
         # Shader files may need to be packed, else they are not found
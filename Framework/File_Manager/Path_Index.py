@@ -0,0 +1,265 @@
+'''
+Support for fast wildcard matching against large sets of virtual paths.
+
+fnmatch.filter translates the pattern to a regex and tests every
+name, which gets slow with 100k+ virtual paths, and is repeated for
+each pattern requested by transforms. Path_Index instead keeps the
+paths in a directory trie, so a pattern with a literal prefix (eg.
+"assets/units/size_s/macros/*.xml") descends straight to the matching
+folder and only tests the paths below it. Compiled pattern regexes
+are cached.
+
+Matching follows fnmatch.filter: "*" matches across folder separators,
+and case is ignored on systems where os.path.normcase ignores it.
+'''
+from ..Documentation import Doc_Category_Default
+_doc_category = Doc_Category_Default('File_Manager')
+
+import os
+import re
+import fnmatch
+from bisect import bisect_left
+from functools import lru_cache
+
+__all__ = [
+    'Path_Index',
+    'Compile_Pattern',
+    'Has_Wildcards',
+    ]
+
+# Regex to find the first wildcard character in a pattern.
+_wildcard_re = re.compile(r'[*?\[]')
+
+# Match the case handling of fnmatch.filter, which normcases both the
+# names and pattern (on windows this lowercases, and also swaps the
+# slashes, though that swap doesn't change which paths match).
+_ignore_case = os.path.normcase('A') == 'a'
+
+
+def _Normalize(path):
+    'Normalize a path or pattern for matching.'
+    return path.lower() if _ignore_case else path
+
+
+def Has_Wildcards(pattern):
+    '''
+    Returns True if the pattern has any fnmatch wildcard characters,
+    else False (in which case it can only match itself).
+    '''
+    return _wildcard_re.search(pattern) != None
+
+
+@lru_cache(maxsize = 512)
+def Compile_Pattern(pattern):
+    '''
+    Returns the compiled regex match method for a wildcard pattern,
+    using fnmatch syntax. Results are cached.
+    Note: case is not normalized here.
+    '''
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+class _Trie_Node:
+    '''
+    Node of the Path_Index directory trie.
+
+    Attributes:
+    * dirs
+      - Dict of child _Trie_Nodes, keyed by folder name.
+    * files
+      - Dict of normalized full paths, keyed by file name.
+    * sorted_dirs, sorted_files
+      - Lists of the above names sorted, for prefix searches,
+        or None when they need to be rebuilt.
+    '''
+    __slots__ = ('dirs', 'files', 'sorted_dirs', 'sorted_files')
+    def __init__(self):
+        self.dirs = {}
+        self.files = {}
+        self.sorted_dirs = None
+        self.sorted_files = None
+
+
+    def Gen_Names_With_Prefix(self, prefix, dirs = False):
+        '''
+        Yields the file names (or folder names if dirs is True) in this
+        node that start with the given prefix.
+        '''
+        name_dict = self.dirs if dirs else self.files
+        if not prefix:
+            yield from name_dict
+            return
+        # Sort lazily, since nodes may see many adds between lookups.
+        if dirs:
+            if self.sorted_dirs == None:
+                self.sorted_dirs = sorted(self.dirs)
+            names = self.sorted_dirs
+        else:
+            if self.sorted_files == None:
+                self.sorted_files = sorted(self.files)
+            names = self.sorted_files
+
+        index = bisect_left(names, prefix)
+        while index < len(names) and names[index].startswith(prefix):
+            yield names[index]
+            index += 1
+        return
+
+
+    def Gen_All_Keys(self):
+        '''
+        Yields the normalized paths of all files at or below this node.
+        '''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield from node.files.values()
+            stack.extend(node.dirs.values())
+        return
+
+
+class Path_Index:
+    '''
+    Index of virtual paths, supporting fast wildcard filtering.
+    Paths should use forward slash separators.
+
+    Parameters:
+    * paths
+      - Optional iterable of initial paths.
+
+    Attributes:
+    * root
+      - _Trie_Node at the top of the directory trie.
+    * key_path_dict
+      - Dict, keyed by normalized path, holding the original path.
+    * key_order_dict
+      - Dict, keyed by normalized path, holding an increasing integer
+        recording when the path was added, so that filter results can
+        be returned in insertion order (as fnmatch.filter would).
+    '''
+    def __init__(self, paths = None):
+        self.Clear()
+        if paths != None:
+            for path in paths:
+                self.Add(path)
+        return
+
+
+    def Clear(self):
+        '''
+        Remove all paths.
+        '''
+        self.root = _Trie_Node()
+        self.key_path_dict = {}
+        self.key_order_dict = {}
+        self._next_order = 0
+        return
+
+
+    def __len__(self):
+        return len(self.key_path_dict)
+
+
+    def __contains__(self, path):
+        return _Normalize(path) in self.key_path_dict
+
+
+    def _Get_Node(self, dir_names, create = False):
+        '''
+        Returns the trie node for the given list of folder names,
+        or None if not present and not creating.
+        '''
+        node = self.root
+        for name in dir_names:
+            next_node = node.dirs.get(name)
+            if next_node == None:
+                if not create:
+                    return None
+                next_node = node.dirs[name] = _Trie_Node()
+                node.sorted_dirs = None
+            node = next_node
+        return node
+
+
+    def Add(self, path):
+        '''
+        Add a path to the index. Repeated adds are ignored.
+        '''
+        key = _Normalize(path)
+        if key in self.key_path_dict:
+            return
+        self.key_path_dict[key] = path
+        self.key_order_dict[key] = self._next_order
+        self._next_order += 1
+
+        *dir_names, file_name = key.split('/')
+        node = self._Get_Node(dir_names, create = True)
+        node.files[file_name] = key
+        node.sorted_files = None
+        return
+
+
+    def Remove(self, path):
+        '''
+        Remove a path from the index, if present.
+        '''
+        key = _Normalize(path)
+        if key not in self.key_path_dict:
+            return
+        del self.key_path_dict[key]
+        del self.key_order_dict[key]
+
+        # Empty folders are left in place; they are harmless.
+        *dir_names, file_name = key.split('/')
+        node = self._Get_Node(dir_names)
+        del node.files[file_name]
+        node.sorted_files = None
+        return
+
+
+    def Filter(self, pattern):
+        '''
+        Returns a list of paths matching the given wildcard pattern,
+        in the order they were added, matching fnmatch.filter.
+        '''
+        key_pattern = _Normalize(pattern)
+
+        # If there are no wildcards, this is a direct lookup.
+        wildcard = _wildcard_re.search(key_pattern)
+        if wildcard == None:
+            path = self.key_path_dict.get(key_pattern)
+            return [path] if path != None else []
+
+        # Split the literal prefix into full folder names, and a
+        # partial final name (possibly empty).
+        prefix = key_pattern[ : wildcard.start()]
+        *dir_names, partial_name = prefix.split('/')
+
+        # Without a folder prefix the trie doesn't narrow things much,
+        # so just test all paths, which are already in order.
+        if not dir_names:
+            match = Compile_Pattern(key_pattern)
+            return [path for key, path in self.key_path_dict.items()
+                    if match(key)]
+
+        # Descend to the folder holding all possible matches.
+        node = self._Get_Node(dir_names)
+        if node == None:
+            return []
+
+        # Collect candidates starting with the partial name, either files
+        # in this folder, or anything inside similarly named subfolders
+        # (since '*' can match the slash).
+        keys = [node.files[x] for x in node.Gen_Names_With_Prefix(partial_name)]
+        for dir_name in node.Gen_Names_With_Prefix(partial_name, dirs = True):
+            keys.extend(node.dirs[dir_name].Gen_All_Keys())
+
+        # A trailing '*' after the prefix matches everything; otherwise
+        # test with the regex.
+        if key_pattern != prefix + '*':
+            match = Compile_Pattern(key_pattern)
+            keys = [x for x in keys if match(x)]
+
+        # Return original paths, in order.
+        keys.sort(key = self.key_order_dict.__getitem__)
+        return [self.key_path_dict[x] for x in keys]
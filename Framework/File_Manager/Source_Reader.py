@@ -94,7 +94,7 @@ Note on case:
 
 '''
 from lxml import etree as ET
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict, defaultdict, deque
 import fnmatch
 from time import time
 
@@ -104,7 +104,10 @@ from ..Common import Settings
 from ..Common import File_Missing_Exception, Unmatched_Diff_Exception
 from ..Common import File_Loading_Error_Exception
 from ..Common import Plugin_Log, Print
-from .Source_Reader_Local import Location_Source_Reader
+from ..Common import Worker_Pool
+from .Source_Reader_Local import Location_Source_Reader, Build_Game_File
+from .Catalog_Index_Cache import Catalog_Index_Cache
+from .Path_Index import Path_Index
 from .Extension_Finder import Find_Extensions
 
 class Source_Reader_class:
@@ -129,12 +132,24 @@ class Source_Reader_class:
       - String, during xml patch application this is the name (folder) of the
         extension sourcing the patch.
       - For use by monitoring code.
+    * num_load_workers
+      - Int, number of worker processes used by the latest Read_Multiple,
+        or 0 if it ran serially.
+    * extension_path_index
+      - Dict, keyed by virtual_path, holding a list of tuples of
+        (mode, extension_name, cat_path, loose_path) for each extension
+        substitution or patch of that file, in application order.
+      - Mode is 'substitution' (from 'subst_' catalogs) or 'patch'
+        (from 'ext_' catalogs or loose files).
+      - Built on first use after Sort_Extensions, and cleared by it.
     '''
     def __init__(self):
         self.base_x4_source_reader    = None
         self.loose_source_reader      = None
         self.extension_source_readers = OrderedDict()
         self.ext_currently_patching = None
+        self.num_load_workers = 0
+        self.extension_path_index = None
         return
 
 
@@ -149,6 +164,11 @@ class Source_Reader_class:
         if Settings.profile:
             start = time()
 
+        # Activate the persistent catalog index, so the readers below
+        # can skip parsing unchanged catalogs.
+        if Settings.use_catalog_index_cache:
+            Catalog_Index_Cache.Load(Settings.Get_Catalog_Index_Cache_Path())
+
         # Set up the base X4 folder.
         self.base_x4_source_reader = Location_Source_Reader(
             location = Settings.Get_X4_Folder())
@@ -347,9 +367,49 @@ class Source_Reader_class:
 
         # Store the sorted list.
         self.extension_source_readers = sorted_dict
+
+        # The extension path index follows extension order, so needs
+        # to be rebuilt.
+        self.extension_path_index = None
         return
 
 
+    def Get_Extension_Path_Index(self):
+        '''
+        Returns the extension_path_index, building it if needed.
+        This maps each virtual path to the extensions that substitute
+        or patch it, so that reads only visit those extensions.
+        '''
+        if self.extension_path_index == None:
+            if Settings.profile:
+                start = time()
+
+            # Gather lists separately per mode, since all substitutions
+            # preceed all patches.
+            subst_index = defaultdict(list)
+            patch_index = defaultdict(list)
+            for ext_name, ext_reader in self.extension_source_readers.items():
+                for virtual_path, (subst_cat_path, ext_cat_path, loose_path
+                                   ) in ext_reader.Get_Path_Sources().items():
+                    if subst_cat_path != None:
+                        subst_index[virtual_path].append(
+                            ('substitution', ext_name, subst_cat_path, None))
+                    if ext_cat_path != None or loose_path != None:
+                        patch_index[virtual_path].append(
+                            ('patch', ext_name, ext_cat_path, loose_path))
+
+            index = {}
+            for virtual_path in subst_index.keys() | patch_index.keys():
+                index[virtual_path] = (subst_index.get(virtual_path, []) 
+                                       + patch_index.get(virtual_path, []))
+            self.extension_path_index = index
+
+            if Settings.profile:
+                Print('Source_Reader extension path index: {} paths, {:.3f} s'.format(
+                    len(index), time() - start))
+        return self.extension_path_index
+
+
     def Get_Extension_Names(self):
         '''
         Returns a list of names of all enabled extensions.
@@ -396,30 +456,42 @@ class Source_Reader_class:
         return
 
     
-    def Gen_All_Virtual_Paths(self, pattern = None):
+    def Get_Cache_Signature(self):
         '''
-        Generator which yields all virtual_path names of all discovered files,
-        optionally filtered by a wildcard pattern.
+        Returns a tuple identifying the state of all source locations,
+        for validating a cached virtual path set.
+        '''
+        return tuple(reader.Get_Cache_Signature() 
+                     for reader in ([self.base_x4_source_reader, 
+                                     self.loose_source_reader]
+                                    + list(self.extension_source_readers.values()))
+                     if reader != None)
 
-        * pattern
-          - String, optional, wildcard pattern to use for matching names.
-          - Pattern is lowercased internally.
+
+    def _Build_All_Virtual_Paths(self):
         '''
-        # Ensure a lowercase pattern.
-        if pattern:
-            pattern = pattern.lower()
+        Fills in _all_virtual_paths, the set of virtual paths of all
+        discovered files, either from the persistent catalog index cache
+        or by collecting them from all readers.
+        '''
+        if Settings.profile:
+            start = time()
 
-        # Results will be cached for quick lookups.
-        # TODO: maybe move this into a normal attribute for use by
-        # other methods.
-        # To speed up somewhat, first pass collects virtual_paths into
-        # a list, which will then be converted to a set() to clear
-        # any duplicates.
-        if not hasattr(self, '_all_virtual_paths'):
-            path_list = []
+        # Check for a persistent copy from a prior session.
+        signature = None
+        cached_paths = None
+        if Catalog_Index_Cache.Is_Active():
+            signature = self.Get_Cache_Signature()
+            cached_paths = Catalog_Index_Cache.Get_Virtual_Paths(signature)
 
-            if Settings.profile:
-                start = time()
+        if cached_paths != None:
+            self._all_virtual_paths = cached_paths
+
+        else:
+            # To speed up somewhat, first pass collects virtual_paths into
+            # a list, which will then be converted to a set() to clear
+            # any duplicates.
+            path_list = []
             
             # Loop over readers.
             # Note: multiple readers may produce the same file, in which
@@ -443,10 +515,38 @@ class Source_Reader_class:
             # Cache the result, casting to set to uniquify paths.
             self._all_virtual_paths = set(path_list)
 
-            if Settings.profile:
-                Print('Source_Reader.Gen_All_Virtual_Paths build time: {:.3f} s'.format(
-                    time() - start
-                    ))
+            # Save the cat indexes parsed so far along with the paths.
+            if signature != None:
+                Catalog_Index_Cache.Set_Virtual_Paths(
+                    signature, self._all_virtual_paths)
+                Catalog_Index_Cache.Store()
+
+        if Settings.profile:
+            Print('Source_Reader.Gen_All_Virtual_Paths build time: {:.3f} s'.format(
+                time() - start
+                ))
+            Catalog_Index_Cache.Print_Stats()
+        return
+
+    
+    def Gen_All_Virtual_Paths(self, pattern = None):
+        '''
+        Generator which yields all virtual_path names of all discovered files,
+        optionally filtered by a wildcard pattern.
+
+        * pattern
+          - String, optional, wildcard pattern to use for matching names.
+          - Pattern is lowercased internally.
+        '''
+        # Ensure a lowercase pattern.
+        if pattern:
+            pattern = pattern.lower()
+
+        # Results will be cached for quick lookups.
+        # TODO: maybe move this into a normal attribute for use by
+        # other methods.
+        if not hasattr(self, '_all_virtual_paths'):
+            self._Build_All_Virtual_Paths()
                 
         # -Removed for now, in favor of building a list below.
         # With the paths filled in, can do a pass to yield each path.
@@ -469,10 +569,15 @@ class Source_Reader_class:
             # this up.
             #paths = [x for x in self._all_virtual_paths
             #         if fnmatch.fnmatch(x, pattern)]
-            paths = fnmatch.filter(self._all_virtual_paths, pattern)
+            #paths = fnmatch.filter(self._all_virtual_paths, pattern)
+            # Further speed this up with an indexed path trie, which
+            # can skip most paths for patterns with folder prefixes.
+            if not hasattr(self, '_all_virtual_path_index'):
+                self._all_virtual_path_index = Path_Index(self._all_virtual_paths)
+            paths = self._all_virtual_path_index.Filter(pattern)
 
             if Settings.profile:
-                Print('Source_Reader.Gen_All_Virtual_Paths fnmatch time: {:.3f} s'.format(
+                Print('Source_Reader.Gen_All_Virtual_Paths match time: {:.3f} s'.format(
                     time() - start
                     ))
 
@@ -514,13 +619,154 @@ class Source_Reader_class:
         # do it here as well to support direct source_reader reads
         # for now, in case any plugins use that.)
         virtual_path = virtual_path.lower()
-        
 
+        # Gather the file contents from all sources, then merge them.
+        # Binaries may be memoryviews into pooled dat files, released
+        # once the game files are constructed.
+        load_spec = self.Get_Load_Spec(virtual_path, as_memoryview = True)
+        try:
+            game_file = Merge_Load_Spec(
+                load_spec, 
+                error_if_not_found = error_if_not_found,
+                error_if_unmatched_diff = error_if_unmatched_diff,
+                patch_tracker = self)
+        finally:
+            _Release_Load_Spec(load_spec)
+
+        # Finish initializing the xml file once patching is complete.
+        if game_file != None:
+            game_file.Delayed_Init()
+        return game_file
+
+
+    def Read_Multiple(
+            self, 
+            virtual_paths,
+            error_if_not_found = True,
+            error_if_unmatched_diff = False,
+        ):
+        '''
+        Bulk version of Read, returning a list of Game_Files (or Nones)
+        matching the given virtual_paths.
+
+        Files patched or substituted by extensions are parsed and merged
+        in the shared Worker_Pool, unless Settings.disable_threading
+        is set. Results are finalized in the given order, with node ids
+        assigned and any log messages printed just as if Read were
+        called on each path in turn, so results match serial loading.
+
+        Arguments are as for Read. Exceptions are raised in order, when
+        the file causing them is reached.
+        '''
+        virtual_paths = [x.lower() for x in virtual_paths]
+        return list(self._Gen_Multiple(
+            virtual_paths, error_if_not_found, error_if_unmatched_diff))
+
+
+    # Minimum number of paths in a bulk read before using the worker
+    # pool; smaller loads aren't worth the pickling overhead.
+    min_pool_reads = 16
+
+    def _Gen_Multiple(
+            self, 
+            virtual_paths, 
+            error_if_not_found,
+            error_if_unmatched_diff,
+        ):
+        '''
+        Generator for Read_Multiple, yielding finalized game files
+        in order.
+        '''
+        # Queue of (load_spec, async_result or None) for files that have
+        # been started but not yet finished.
+        pending = deque()
+        max_pending = 0
+        # The shared worker pool, requested on the first file that would
+        # use it, so serial-only reads never start it.
+        pool = None
+        use_pool = len(virtual_paths) >= self.min_pool_reads
+        self.num_load_workers = 0
+        merge_args = (error_if_not_found, error_if_unmatched_diff)
+
+        def Finish(load_spec, result):
+            '''
+            Returns the finalized game file for a queued entry.
+            '''
+            if result == None:
+                # Merge locally, same as Read.
+                game_file = Merge_Load_Spec(load_spec, *merge_args, 
+                                            patch_tracker = self)
+            else:
+                game_file, exception, messages = result.get()
+                # Replay log messages, with the patching extension set
+                # the same as during serial loading.
+                for ext_name, message in messages:
+                    self.ext_currently_patching = ext_name
+                    Plugin_Log.Print(message)
+                self.ext_currently_patching = None
+                if exception != None:
+                    raise exception
+            if game_file != None:
+                game_file.Delayed_Init()
+            return game_file
+
+        for virtual_path in virtual_paths:
+            # Collect binaries as bytes, so they can be sent to workers.
+            load_spec = self.Get_Load_Spec(virtual_path)
+
+            # Only files with extension contributions have enough
+            # work to be worth sending out, since the merged trees
+            # need to be pickled back.
+            if use_pool and load_spec[2] and pool == None:
+                pool = Worker_Pool.Get_Pool()
+                use_pool = pool != None
+                if use_pool:
+                    self.num_load_workers = Worker_Pool.num_workers
+                    max_pending = 4 * self.num_load_workers
+            if use_pool and load_spec[2]:
+                result = pool.apply_async(
+                    _Merge_Load_Spec_Worker, (load_spec, *merge_args))
+            else:
+                result = None
+            pending.append((load_spec, result))
+
+            # Finish ready entries from the front, and block on them
+            # if too much is in flight.
+            while pending and (len(pending) > max_pending 
+                               or pending[0][1] == None
+                               or pending[0][1].ready()):
+                yield Finish(*pending.popleft())
+
+        while pending:
+            yield Finish(*pending.popleft())
+        return
+
+
+    def Get_Load_Spec(self, virtual_path, as_memoryview = False):
+        '''
+        Returns a tuple of (virtual_path, base_entry, ext_entries) holding
+        the binaries needed to load the given file, to be passed to
+        Merge_Load_Spec. Input virtual_path should be lowercase.
+
+        * base_entry
+          - Tuple of (local_path, source_path, binary, extension_name) for
+            the base file, or None if not found.
+          - binary is None for a generated dummy text file.
+        * ext_entries
+          - List of tuples of (mode, extension_name, source_path, binary,
+            exception), for extension substitutions and patches, in
+            the order they are applied. Mode is 'substitution' or 'patch'.
+          - exception is any error raised while reading, to be handled
+            at merge time (so that skipped extensions don't error).
+        * as_memoryview
+          - Bool, if True then binaries may be memoryviews into pooled
+            dat files; release them with _Release_Load_Spec.
+        '''
         # Step 1: get the base version of the file.
         # If the virtual_path begins with "extentions", read from the
         # selected extension if present, else from the base x4 folder
         # or source folder.
-        game_file = None
+        base_entry = None
         if virtual_path.startswith('extensions/'):
             # Can split on all '/' and take the second term for the
             # extension name, 3rd term for virtual path within that
@@ -531,141 +777,61 @@ class Source_Reader_class:
             if ext_name in self.extension_source_readers:
                 # Get it from this extension, using the extension
                 # specific path.
-                # TODO: consider instead giving the whole virtual_path
-                # and a base_file flag to let the location source reader
-                # deal with picking the path apart locally.
-                game_file = self.extension_source_readers[ext_name].Read(ext_path)
-
-                # Fix the virtual_path that was attached to the file.
-                # The reader only give its local path.
-                if game_file != None:
-                    game_file.virtual_path = virtual_path
+                ext_reader = self.extension_source_readers[ext_name]
+                source_path, binary = ext_reader.Read_Binary(
+                    ext_path, as_memoryview = as_memoryview)
+                if binary != None:
+                    base_entry = (ext_path, source_path, binary, 
+                                  ext_reader.extension_name)
 
         else:
             # Read from the source and base x4 locations.
-            if self.loose_source_reader != None:
-                game_file = self.loose_source_reader.Read(virtual_path)
-            if game_file == None:
-                game_file = self.base_x4_source_reader.Read(virtual_path)
+            for reader in [self.loose_source_reader, self.base_x4_source_reader]:
+                if reader == None:
+                    continue
+                source_path, binary = reader.Read_Binary(
+                    virtual_path, as_memoryview = as_memoryview)
+                if binary != None:
+                    base_entry = (virtual_path, source_path, binary, 
+                                  reader.extension_name)
+                    break
 
             # Special case: if the game_file is not found, and it is a
-            # text file, generate a dummy version of it. This is so that
-            # extensions can add to 0001.xml, which doesn't normally exist.
-            if game_file == None and virtual_path.startswith('t/'):
-                game_file = File_Types.XML_Text_File(
-                    virtual_path = virtual_path,
-                    xml_root = ET.Element('language'),
-                    )
-
-        # Deal with cases where the file is not found.
-        if game_file == None:
-            if error_if_not_found:
-                raise File_Missing_Exception(
-                    'Could not find a match for file {}'.format(virtual_path))
-            return None
-        
-        # Check for load errors, eg. an empty xml file that has no root.
-        # Can continue past this point, but needs some care to disable
-        # diff patching (subst is fine).
-        if game_file.load_error:            
-            message = ('Warning: File experienced a loading error, on path "{}".'
-                       ).format(virtual_path)
-            # TODO: maybe an option to throw an exception.
-            # In the motivating case, empty shader ogl (xml format) files,
-            # no exception was wanted.
-            Plugin_Log.Print(message)
-
-        # This could go awry if the first extension file is a diff
-        #  patch, which has nothing to patch.
-        # This case can also come up if a substitution is done with
-        #  a diff patch, but that will be caught in the merge function.
-        # However, don't hard error; want to print the message
-        #  and keep going with best effort, similar to x4 (though there
-        #  they give no warning).
-        if (isinstance(game_file, File_Types.XML_File)
-        and not game_file.load_error
-        and game_file.Get_Root_Readonly().tag == 'diff'):
-            message = ('Error: File found is a diff patch with nothing'
-                              ' to patch, on path "{}".').format(virtual_path)
-            if error_if_unmatched_diff:
-                raise Unmatched_Diff_Exception(message)
-            Plugin_Log.Print(message)
-            return None
-
+            # text file, a dummy version of it will be generated.
+            if base_entry == None and virtual_path.startswith('t/'):
+                base_entry = (virtual_path, None, None, None)
 
         # Step 2: collect any patches/substitutions.
-        # These can come from any extension, except the one the file
-        #  was sourced from (if it came from an ext).
+        # These can come from any extension; the one the file was
+        # sourced from is skipped at merge time.
         # Note: substitions should be evaluated separately from
         #  patches; an extension can apply both, and substitutions
         #  from all extensions should preceed patches from all.
-        for mode in ['substitution','patch']:
-            # Skip patches if there was a loading error.
-            if game_file.load_error and mode == 'patch':
-                continue
-
-            for ext_reader in self.extension_source_readers.values():
-
-                # Skip if this ext is the original source.
-                # This should be harmless to allow, but saves a little time.
-                # (A path of 'extensions/name/...' is never expected to
-                # show up again as 'extensions/name/extensions/name/...',
-                # hence an extension will not patch its own source file.)
-                if ext_reader.extension_name == game_file.extension_name:
-                    continue
-
-                # Note: if there is a problem loading the file, typically
-                # bad xml syntax, x4 will print an error and skip it;
-                # do the same here.
-
-                # Start by recording the extension name for reference
-                #  by the extension_checker utility.
-                self.ext_currently_patching = ext_reader.extension_name
-                
+        # The index lists only extensions holding this path, already
+        # in that order, with substitutions from 'subst_' catalogs and
+        # patches from 'ext_' catalogs or loose files.
+        ext_entries = []
+        if base_entry != None:
+            for mode, ext_name, cat_path, loose_path in \
+                    self.Get_Extension_Path_Index().get(virtual_path, []):
+                ext_reader = self.extension_source_readers[ext_name]
+                exception = None
                 try:
-                    # Get the file, if any.
-                    if mode == 'substitution':
-                        # For substitutions, want to just search the 'subst_'
-                        # catalogs and not any loose files.
-                        ext_game_file = ext_reader.Read(
-                            virtual_path,
-                            include_loose_files = False,
-                            cat_prefix = 'subst_')
-                    else:
-                        # For patches, want to search the 'ext_' catalogs and
-                        # any loose files.
-                        ext_game_file = ext_reader.Read(
-                            virtual_path,
-                            include_loose_files = True,
-                            cat_prefix = 'ext_')
-                        
-                # Catch File_Loading_Error_Exception errors here,
-                # to more reliably skip over problem patch files.
-                # TODO: maybe general error catching.
-                except File_Loading_Error_Exception as ex:
-                    Plugin_Log.Print(
-                        ('Error: Skipping patch from "{}" due to exception: {}.'
-                         ).format(ext_reader.extension_name, ex))
-                    continue
-                
-                # Skip if no matching file was found.
-                # This is the normal case.
-                if ext_game_file == None:
-                    continue            
-
-                # Call the merger.
-                # This may return the ext_game_file if a substitution
-                #  occurred, so update the game_file link.
-                game_file = game_file.Merge(ext_game_file)
-            
+                    source_path, binary = ext_reader.Read_Indexed_Binary(
+                        virtual_path,
+                        cat_path = cat_path,
+                        loose_path = loose_path,
+                        as_memoryview = as_memoryview)
+                except Exception as ex:
+                    source_path, binary, exception = None, None, ex
 
-        # Clear out the patching note.
-        self.ext_currently_patching = None
+                # Skip if no matching file was found.
+                if binary == None and exception == None:
+                    continue
+                ext_entries.append((mode, ext_reader.extension_name, 
+                                    source_path, binary, exception))
 
-        # Finish initializing the xml file once patching is complete.
-        game_file.Delayed_Init()
-
-        return game_file
+        return (virtual_path, base_entry, ext_entries)
 
 
     def Get_All_Loose_Source_Files(self):
@@ -676,3 +842,177 @@ class Source_Reader_class:
         if self.loose_source_reader == None:
             return {}
         return self.loose_source_reader.Get_All_Loose_Files()
+
+
+def Merge_Load_Spec(
+        load_spec,
+        error_if_not_found = True,
+        error_if_unmatched_diff = False,
+        patch_tracker = None,
+    ):
+    '''
+    Returns a Game_File built from a load spec (see 
+    Source_Reader_class.Get_Load_Spec), with any extension substitutions
+    and patches merged in, or None if not loaded.
+    Delayed_Init is not called, since it assigns node ids, which should
+    be done in the main process in load order.
+    This does not require a Source_Reader, so that it can run in
+    a worker process.
+
+    * patch_tracker
+      - Object with an ext_currently_patching attribute, set to the
+        name of the extension while merging its file, eg. the
+        Source_Reader. Optional.
+    '''
+    virtual_path, base_entry, ext_entries = load_spec
+
+    game_file = None
+    if base_entry != None:
+        local_path, source_path, binary, ext_name = base_entry
+        if binary == None:
+            # Generate a dummy text file. This is so that extensions can
+            # add to 0001.xml, which doesn't normally exist.
+            game_file = File_Types.XML_Text_File(
+                virtual_path = virtual_path,
+                xml_root = ET.Element('language'),
+                )
+        else:
+            game_file = Build_Game_File(local_path, source_path, binary, ext_name)
+            # Fix the virtual_path that was attached to the file.
+            # Extension readers only give their local path.
+            game_file.virtual_path = virtual_path
+
+    # Deal with cases where the file is not found.
+    if game_file == None:
+        if error_if_not_found:
+            raise File_Missing_Exception(
+                'Could not find a match for file {}'.format(virtual_path))
+        return None
+        
+    # Check for load errors, eg. an empty xml file that has no root.
+    # Can continue past this point, but needs some care to disable
+    # diff patching (subst is fine).
+    if game_file.load_error:            
+        message = ('Warning: File experienced a loading error, on path "{}".'
+                    ).format(virtual_path)
+        # TODO: maybe an option to throw an exception.
+        # In the motivating case, empty shader ogl (xml format) files,
+        # no exception was wanted.
+        Plugin_Log.Print(message)
+
+    # This could go awry if the first extension file is a diff
+    #  patch, which has nothing to patch.
+    # This case can also come up if a substitution is done with
+    #  a diff patch, but that will be caught in the merge function.
+    # However, don't hard error; want to print the message
+    #  and keep going with best effort, similar to x4 (though there
+    #  they give no warning).
+    if (isinstance(game_file, File_Types.XML_File)
+    and not game_file.load_error
+    and game_file.Get_Root_Readonly().tag == 'diff'):
+        message = ('Error: File found is a diff patch with nothing'
+                            ' to patch, on path "{}".').format(virtual_path)
+        if error_if_unmatched_diff:
+            raise Unmatched_Diff_Exception(message)
+        Plugin_Log.Print(message)
+        return None
+
+
+    # Apply the patches/substitutions.
+    for mode, ext_name, source_path, binary, exception in ext_entries:
+        # Skip patches if there was a loading error.
+        if game_file.load_error and mode == 'patch':
+            continue
+
+        # Skip if this ext is the original source.
+        # This should be harmless to allow, but saves a little time.
+        # (A path of 'extensions/name/...' is never expected to
+        # show up again as 'extensions/name/extensions/name/...',
+        # hence an extension will not patch its own source file.)
+        if ext_name == game_file.extension_name:
+            continue
+
+        # Note: if there is a problem loading the file, typically
+        # bad xml syntax, x4 will print an error and skip it;
+        # do the same here.
+
+        # Start by recording the extension name for reference
+        #  by the extension_checker utility.
+        if patch_tracker != None:
+            patch_tracker.ext_currently_patching = ext_name
+                
+        try:
+            if exception != None:
+                raise exception
+            ext_game_file = Build_Game_File(
+                virtual_path, source_path, binary, ext_name)
+                        
+        # Catch File_Loading_Error_Exception errors here,
+        # to more reliably skip over problem patch files.
+        # TODO: maybe general error catching.
+        except File_Loading_Error_Exception as ex:
+            Plugin_Log.Print(
+                ('Error: Skipping patch from "{}" due to exception: {}.'
+                    ).format(ext_name, ex))
+            continue
+
+        # Call the merger.
+        # This may return the ext_game_file if a substitution
+        #  occurred, so update the game_file link.
+        game_file = game_file.Merge(ext_game_file)
+            
+    # Clear out the patching note.
+    if patch_tracker != None:
+        patch_tracker.ext_currently_patching = None
+    return game_file
+
+
+def _Release_Load_Spec(load_spec):
+    '''
+    Release any memoryviews held by a load spec.
+    '''
+    _, base_entry, ext_entries = load_spec
+    binaries = [x[3] for x in ext_entries]
+    if base_entry != None:
+        binaries.append(base_entry[2])
+    for binary in binaries:
+        if isinstance(binary, memoryview):
+            binary.release()
+    return
+
+
+class _Worker_Log_Capture:
+    '''
+    Worker process stand-in for the Source_Reader while merging,
+    capturing log messages along with the extension being patched
+    when each was printed, so they can be replayed in the main process.
+    '''
+    def __init__(self):
+        self.ext_currently_patching = None
+        self.messages = []
+
+    def Log(self, message):
+        self.messages.append((self.ext_currently_patching, message))
+
+
+def _Merge_Load_Spec_Worker(load_spec, error_if_not_found, error_if_unmatched_diff):
+    '''
+    Worker process function for bulk reads. Returns a tuple of
+    (game_file, exception, messages), with the merged file (prior to
+    Delayed_Init), any exception raised, and the captured log messages.
+    '''
+    capture = _Worker_Log_Capture()
+    Plugin_Log.logging_function = capture.Log
+    game_file = None
+    exception = None
+    try:
+        game_file = Merge_Load_Spec(
+            load_spec, 
+            error_if_not_found = error_if_not_found,
+            error_if_unmatched_diff = error_if_unmatched_diff,
+            patch_tracker = capture)
+    except Exception as ex:
+        exception = ex
+    finally:
+        Plugin_Log.logging_function = None
+    return game_file, exception, capture.messages
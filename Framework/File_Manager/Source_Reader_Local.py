@@ -5,9 +5,11 @@ _doc_category = Doc_Category_Default('File_Manager')
 from pathlib import Path
 from collections import OrderedDict, defaultdict
 from itertools import chain
+import hashlib
 
 from . import File_Types
 from .Cat_Reader import Cat_Reader
+from .Catalog_Index_Cache import Catalog_Index_Cache
 from .. import Common
 from ..Common import Settings
 from ..Common import File_Missing_Exception
@@ -85,6 +87,11 @@ class Location_Source_Reader:
         from each of the catalog readers.
     * all_virtual_paths
       - Set of all virtual paths in the catalogs or loose files.
+    * path_source_dict
+      - Dict, keyed by virtual_path, holding a list of [subst_cat_path,
+        ext_cat_path, loose_path] with the highest priority source of
+        each kind, or None where absent.
+      - Built on the first Get_Path_Sources call.
     '''
     def __init__(
             self, 
@@ -101,6 +108,7 @@ class Location_Source_Reader:
         self.source_file_path_dict = None
         self.cat_path_entry_dict = None
         self.all_virtual_paths = None
+        self.path_source_dict = None
 
         # Search for cats and loose files if location given.
         if location != None:
@@ -295,6 +303,17 @@ class Location_Source_Reader:
         # Caches the result to avoid doing this more than once.
         # Build the dict on first call.
         if self.cat_path_entry_dict == None:
+
+            # Check for a persistent copy from a prior session, valid
+            # if none of the catalogs changed.
+            if self.location != None and Catalog_Index_Cache.Is_Active():
+                signature = self.Get_Catalog_Signature()
+                path_entry_dict = Catalog_Index_Cache.Get_Merged_Entries(
+                    self.location, signature)
+                if path_entry_dict != None:
+                    self.cat_path_entry_dict = path_entry_dict
+                    return self.cat_path_entry_dict
+
             path_entry_dict = {}
             self.cat_path_entry_dict = path_entry_dict
 
@@ -310,9 +329,39 @@ class Location_Source_Reader:
                     if not virtual_path in path_entry_dict:
                         path_entry_dict[virtual_path] = cat_entry
 
+            if self.location != None and Catalog_Index_Cache.Is_Active():
+                Catalog_Index_Cache.Set_Merged_Entries(
+                    self.location, signature, path_entry_dict)
+
         return self.cat_path_entry_dict
 
 
+    def Get_Catalog_Signature(self):
+        '''
+        Returns a tuple identifying the current state of the catalogs
+        at this location, in priority order, built from their paths,
+        sizes and modification times.
+        For use in validating cached catalog information.
+        '''
+        return tuple(Catalog_Index_Cache.Get_Cat_Stats(cat_path)
+                     for cat_path in self.catalog_file_dict)
+
+
+    def Get_Cache_Signature(self):
+        '''
+        Returns a tuple identifying the state of this location, including
+        the catalog signature and the set of loose files found.
+        For use in validating cached virtual paths.
+        '''
+        # Loose files are few enough to hash their sorted names.
+        loose_hash = hashlib.md5('\n'.join(sorted(
+            self.Get_All_Loose_Files().keys())).encode()).hexdigest()
+        return (str(self.location), 
+                self.extension_name, 
+                self.Get_Catalog_Signature(),
+                loose_hash)
+
+
     def Get_Virtual_Paths(self):
         '''
         Returns a set of all virtual paths used at this location
@@ -338,6 +387,84 @@ class Location_Source_Reader:
         return self.all_virtual_paths
 
 
+    def Get_Path_Sources(self):
+        '''
+        Returns a dict, keyed by virtual_path, of lists holding
+        [subst_cat_path, ext_cat_path, loose_path] for the highest
+        priority source of each kind, or None where absent.
+        For use in indexing which extensions provide which files.
+        '''
+        # Cache the results to avoid doing more than once.
+        if self.path_source_dict == None:
+            path_source_dict = {}
+
+            # Loop over the cats in priority order; the first cat seen for
+            # a path and prefix is the one Read_Catalog_File would use.
+            for cat_path in self.catalog_file_dict:
+                if cat_path.name.startswith('subst_'):
+                    slot = 0
+                elif cat_path.name.startswith('ext_'):
+                    slot = 1
+                else:
+                    continue
+                for virtual_path in self.Get_Catalog_Reader(cat_path).Get_Cat_Entries():
+                    sources = path_source_dict.get(virtual_path)
+                    if sources == None:
+                        sources = path_source_dict[virtual_path] = [None, None, None]
+                    if sources[slot] == None:
+                        sources[slot] = cat_path
+
+            for virtual_path, file_path in self.Get_All_Loose_Files().items():
+                sources = path_source_dict.get(virtual_path)
+                if sources == None:
+                    sources = path_source_dict[virtual_path] = [None, None, None]
+                sources[2] = file_path
+
+            self.path_source_dict = path_source_dict
+        return self.path_source_dict
+
+
+    def Read_Indexed_Binary(
+            self, 
+            virtual_path, 
+            cat_path = None, 
+            loose_path = None,
+            allow_md5_error = False,
+            as_memoryview = False,
+        ):
+        '''
+        Returns a tuple of (source_path, file_binary) for a file whose
+        sources are already known, eg. from Get_Path_Sources, skipping
+        the search over other catalogs.
+        Follows the same loose/catalog preference as Read_Binary.
+        If neither source has the file, file_binary is None.
+
+        * cat_path
+          - Path of the catalog holding the file, or None.
+        * loose_path
+          - Path of the loose file, or None.
+        '''
+        # Preference is taken from Settings.
+        if Settings.prefer_single_files:
+            source_order = [loose_path, cat_path]
+        else:
+            source_order = [cat_path, loose_path]
+
+        for source_path in source_order:
+            if source_path == None:
+                continue
+            if source_path is loose_path:
+                source_path, file_binary = self.Read_Loose_File(virtual_path)
+            else:
+                file_binary = self.Get_Catalog_Reader(source_path).Read(
+                    virtual_path, 
+                    allow_md5_error = allow_md5_error,
+                    as_memoryview = as_memoryview)
+            if file_binary != None:
+                return source_path, file_binary
+        return None, None
+
+
     def Read_Loose_File(self, virtual_path, **kwargs):
         '''
         Returns a tuple of (file_path, file_binary) for a loose file
@@ -357,7 +484,8 @@ class Location_Source_Reader:
 
 
     def Read_Catalog_File(self, virtual_path, 
-                          cat_prefix = None, allow_md5_error = False):
+                          cat_prefix = None, allow_md5_error = False,
+                          as_memoryview = False):
         '''
         Returns a tuple of (cat_path, file_binary) for a cat/dat entry
         matching the given virtual_path.
@@ -368,6 +496,9 @@ class Location_Source_Reader:
           - Optional string, prefix of catalog files to search.
         * allow_md5_error
           - Bool, if True then the md5 check will be suppressed.
+        * as_memoryview
+          - Bool, if True then file_binary may be a memoryview into
+            a pooled dat file; see Cat_Reader.Read.
         '''
         cat_path = None
         file_binary = None
@@ -385,7 +516,8 @@ class Location_Source_Reader:
 
             # Check the cat for the file.
             file_binary = cat_reader.Read(virtual_path, 
-                                          allow_md5_error = allow_md5_error)
+                                          allow_md5_error = allow_md5_error,
+                                          as_memoryview = as_memoryview)
 
             # Stop looping over cats once a match found.
             if file_binary != None:
@@ -425,6 +557,51 @@ class Location_Source_Reader:
         # Ensure the virtual_path is lowercase.
         virtual_path = virtual_path.lower()
 
+        # Catalog reads may hand back a memoryview into a pooled dat;
+        # game files copy or parse what they need from it, so it
+        # gets released below once the file is constructed.
+        source_path, file_binary = self.Read_Binary(
+            virtual_path,
+            include_loose_files = include_loose_files,
+            cat_prefix = cat_prefix,
+            allow_md5_error = allow_md5_error,
+            as_memoryview = True,
+            )
+            
+        # If no binary was found, error.
+        if file_binary == None:
+            if error_if_not_found:
+                message = 'Could not find a match for file {}'.format(virtual_path)
+                raise File_Missing_Exception(message)
+            return None
+        
+        try:
+            game_file = Build_Game_File(
+                virtual_path, source_path, file_binary, self.extension_name)
+        finally:
+            if isinstance(file_binary, memoryview):
+                file_binary.release()
+        return game_file
+
+
+    def Read_Binary(self, 
+             virtual_path,
+             include_loose_files = True,
+             cat_prefix = None,
+             allow_md5_error = False,
+             as_memoryview = False,
+             ):
+        '''
+        Returns a tuple of (source_path, file_binary) for the contents of
+        a loose file or a packed file, using the same search as Read.
+        If no file found, file_binary is None.
+        The binary can be turned into a Game_File using Build_Game_File.
+        Input virtual_path should be lowercase.
+
+        * as_memoryview
+          - Bool, if True then file_binary may be a memoryview into
+            a pooled dat file; see Cat_Reader.Read.
+        '''
         # Can pick from either loose files or cat/dat files.
         # Preference is taken from Settings.
         if Settings.prefer_single_files:
@@ -449,40 +626,52 @@ class Location_Source_Reader:
                 virtual_path, 
                 cat_prefix = cat_prefix,
                 allow_md5_error = allow_md5_error,
+                as_memoryview = as_memoryview,
                 )
             if file_binary != None:
                 break
-            
-        # If no binary was found, error.
-        if file_binary == None:
-            if error_if_not_found:
-                message = 'Could not find a match for file {}'.format(virtual_path)
-                raise File_Missing_Exception(message)
-            return None
-        
-        # Construct the game file.
-        # This may throw an exception on a problem (eg. bad xml might
-        # toss an lxml.etree.XMLSyntaxError).
-        try:
-            game_file = File_Types.New_Game_File(
-                binary = file_binary,
-                virtual_path = virtual_path,
-                file_source_path = source_path,
-                from_source = True,
-                extension_name = self.extension_name,
-                )
-        except Exception as ex:
-            # Want to keep the original stack trace; can use 'from'
-            # syntax to do so.
-            message = ('Error when parsing file "{}" from "{}"; original'
-                       ' exception: {}.').format(virtual_path, source_path, ex)
-            raise File_Loading_Error_Exception(message) from ex
-        
-        # Debug print the read location.
-        if Settings.log_source_paths:
-            Plugin_Log.Print('Loaded file "{}" from "{}"'.format(
-                virtual_path, source_path))
-        
-        return game_file
+        return source_path, file_binary
 
     
+
+
+def Build_Game_File(virtual_path, source_path, file_binary, extension_name):
+    '''
+    Returns a Game_File constructed from the binary read from a source
+    location. This is separate from Location_Source_Reader so that it
+    can run in a worker process during bulk loads.
+    Raises File_Loading_Error_Exception on a problem (eg. bad xml).
+
+    * virtual_path
+      - String, virtual path of the file within its location.
+    * source_path
+      - Path of the loose or cat file the binary was read from.
+    * file_binary
+      - Bytes or memoryview of the file contents.
+    * extension_name
+      - String, name of the source extension, or None.
+    '''
+    # Construct the game file.
+    # This may throw an exception on a problem (eg. bad xml might
+    # toss an lxml.etree.XMLSyntaxError).
+    try:
+        game_file = File_Types.New_Game_File(
+            binary = file_binary,
+            virtual_path = virtual_path,
+            file_source_path = source_path,
+            from_source = True,
+            extension_name = extension_name,
+            )
+    except Exception as ex:
+        # Want to keep the original stack trace; can use 'from'
+        # syntax to do so.
+        message = ('Error when parsing file "{}" from "{}"; original'
+                   ' exception: {}.').format(virtual_path, source_path, ex)
+        raise File_Loading_Error_Exception(message) from ex
+        
+    # Debug print the read location.
+    if Settings.log_source_paths:
+        Plugin_Log.Print('Loaded file "{}" from "{}"'.format(
+            virtual_path, source_path))
+        
+    return game_file
@@ -136,6 +136,8 @@ from lxml import etree as ET
 from copy import deepcopy
 from itertools import zip_longest
 import random
+import re
+from functools import lru_cache
 import time # Used for some profiling.
 
 from ..Common import Plugin_Log
@@ -166,7 +168,9 @@ def LXML_Element_Depickler(xml_string):
     xml_bulk, tail = xml_string.rsplit('>',1)
     xml_bulk += '>'
     element = ET.fromstring(xml_bulk)
-    element.tail = tail
+    # Elements without a tail (eg. before node ids are filled) come
+    # back with an empty string; restore those to None.
+    element.tail = tail if tail else None
     return element
 
 # Set up the pickler with copyreg.
@@ -195,6 +199,43 @@ def Fill_Node_IDs(xml_node):
     return xml_node
 
 
+def Get_Running_ID():
+    '''
+    Returns the next node id that Fill_Node_IDs will assign.
+    '''
+    return _running_id
+
+
+def Advance_Running_ID(running_id):
+    '''
+    Ensure future node ids are at least the given value. For use in
+    worker processes handling trees annotated by another process, so
+    that newly filled ids cannot collide with existing ones.
+    '''
+    global _running_id
+    _running_id = max(_running_id, running_id)
+    return
+
+
+def Make_Node_ID_Dict(xml_node):
+    '''
+    Returns a dict of the nodes under (and including) the given node,
+    keyed by node id. Nodes without an id are skipped. Ids held by
+    multiple nodes (eg. when a transform copied a node) map to None,
+    since they don't identify a single node.
+    '''
+    node_id_dict = {}
+    for node in xml_node.iter():
+        node_id = node.tail
+        if not node_id:
+            continue
+        if node_id in node_id_dict:
+            node_id_dict[node_id] = None
+        else:
+            node_id_dict[node_id] = node
+    return node_id_dict
+
+
 def Print(xml_node, **kwargs):
     '''
     Returns the prettyprinted string for the xml_node.
@@ -202,15 +243,21 @@ def Print(xml_node, **kwargs):
     Any kwargs are passed to ET.tostring.
     '''
     # Back up all tails, and clear them.
-    node_id_dict = {}
+    # Note: tails are kept in a list in iteration order, and matched
+    # back up to nodes by iterating again, instead of keying a dict by
+    # node; a dict keeps an lxml proxy alive for every node, which for
+    # large files costs more time and memory than the print itself.
+    tails = []
     for node in xml_node.iter():
-        node_id_dict[node] = node.tail
+        tails.append(node.tail)
         node.tail = None
     # Print.
-    text = ET.tostring(xml_node, pretty_print = True, **kwargs)
-    # Put tails back.
-    for node, tail in node_id_dict.items():
-        node.tail = tail
+    try:
+        text = ET.tostring(xml_node, pretty_print = True, **kwargs)
+    finally:
+        # Put tails back.
+        for node, tail in zip(xml_node.iter(), tails):
+            node.tail = tail
     return text
 
 
@@ -250,7 +297,320 @@ def NS_xpath(node, xpath):
     return node.xpath(NS_unqualify(xpath), namespaces=namespaces)
 
 
-def Apply_Patch(original_node, patch_node, error_prefix = None):
+# Quoted string literals in xpaths.
+_xpath_literal_re = re.compile(r"""'[^']*'|"[^"]*\"""")
+
+@lru_cache(maxsize = 1024)
+def _Compile_Xpath_Shape(shape):
+    'Returns a compiled XPath for an xpath with $v# variables.'
+    return ET.XPath(shape, namespaces = namespaces)
+
+def Compiled_Xpath(node, xpath):
+    """
+    Returns result of an xpath() lookup on the given node, as NS_xpath,
+    compiling the xpath. String literals are swapped for variables, so
+    that xpaths differing only by attribute values (eg. diff patch
+    selections of many wares) share the compiled form.
+    """
+    xpath = NS_unqualify(xpath)
+    values = []
+    def Swap_Literal(match):
+        values.append(match.group()[1:-1])
+        return '$v{}'.format(len(values) - 1)
+    shape = _xpath_literal_re.sub(Swap_Literal, xpath)
+    try:
+        compiled = _Compile_Xpath_Shape(shape)
+    except ET.XPathSyntaxError:
+        # Some spots need literals; evaluate normally (and raise any
+        # real syntax errors from there).
+        return node.xpath(xpath, namespaces=namespaces)
+    return compiled(node, **{'v{}'.format(i) : x for i, x in enumerate(values)})
+
+
+# Xpath step of a tag (or *), with an optional attribute value
+# condition and then an optional index, eg. "job[@id='x']" or "t[5]".
+_simple_step_re = re.compile(
+    r"""^([\w.-]+|\*)"""
+    r"""(?:\[@([\w.-]+)=(?:'([^']*)'|"([^"]*)")\])?"""
+    r"""(?:\[(\d+)\])?$""")
+# Final xpath step selecting an attribute.
+_attribute_step_re = re.compile(r'^@[\w.-]+$')
+
+class _Child_Index:
+    """
+    Index of the element children of one parent, for _Xpath_Resolver.
+
+    Attributes:
+    * parent
+      - The indexed element.
+    * key_children_dict
+      - Dict, keyed by (tag, attribute name, attribute value) tuples,
+        and by (tag, None, None), holding lists of matching children.
+        Tag '*' covers all elements.
+    * unsorted_keys
+      - Set of keys whose lists may be out of document order, after
+        incremental changes; these get sorted when next looked up.
+    """
+    __slots__ = ('parent', 'key_children_dict', 'unsorted_keys')
+    def __init__(self, parent):
+        self.parent = parent
+        self.key_children_dict = {}
+        self.unsorted_keys = set()
+        for child in parent.iterchildren(tag = ET.Element):
+            self.Add(child, in_order = True)
+        return
+
+
+    @staticmethod
+    def _Get_Keys(child):
+        """
+        Returns a list of index keys that match the given child.
+        Comments and such have none.
+        """
+        keys = []
+        if not isinstance(child.tag, str):
+            return keys
+        for tag in (child.tag, '*'):
+            keys.append((tag, None, None))
+            for name, value in child.attrib.items():
+                keys.append((tag, name, value))
+        return keys
+
+
+    def Add(self, child, in_order = False):
+        """
+        Add a child to the index. Set in_order if it comes after all
+        children already indexed.
+        """
+        key_children_dict = self.key_children_dict
+        for key in self._Get_Keys(child):
+            children = key_children_dict.get(key)
+            if children == None:
+                key_children_dict[key] = [child]
+            else:
+                children.append(child)
+                if not in_order:
+                    self.unsorted_keys.add(key)
+        return
+
+
+    def Remove(self, child):
+        """
+        Remove a child from the index.
+        """
+        key_children_dict = self.key_children_dict
+        for key in self._Get_Keys(child):
+            children = key_children_dict[key]
+            children.remove(child)
+            if not children:
+                del key_children_dict[key]
+        return
+
+
+    def Replace(self, old_child, new_child):
+        """
+        Swap a child for another in the index, as replaced in the tree.
+        """
+        old_keys = self._Get_Keys(old_child)
+        if old_keys == self._Get_Keys(new_child):
+            # Can keep the same spots in the lists.
+            for key in old_keys:
+                children = self.key_children_dict[key]
+                children[children.index(old_child)] = new_child
+        else:
+            self.Remove(old_child)
+            self.Add(new_child)
+        return
+
+
+    def Get(self, key):
+        """
+        Returns the list of children matching the key in document
+        order, or None if there are no matches.
+        """
+        children = self.key_children_dict.get(key)
+        if children != None and key in self.unsorted_keys:
+            self.unsorted_keys.discard(key)
+            if len(children) > 1:
+                positions = {x : i for i, x in enumerate(
+                    self.parent.iterchildren(tag = ET.Element))}
+                children.sort(key = positions.__getitem__)
+        return children
+
+
+class _Xpath_Resolver:
+    """
+    Resolves diff patch 'sel' xpaths for Apply_Patch. Xpaths made of
+    simple steps, eg. "/jobs/job[@id='x']/basket[2]", are answered from
+    per-parent indexes of children by tag and attribute value, avoiding
+    xpath scans of large sibling lists (and lxml's slow indexed lookups).
+    Other xpaths are evaluated with Compiled_Xpath.
+
+    Patch ops should be applied through Apply_Op, which keeps the
+    indexes up to date.
+
+    Attributes:
+    * child_index_dict
+      - Dict, keyed by parent element, holding its _Child_Index.
+    """
+    def __init__(self):
+        self.child_index_dict = {}
+        return
+
+
+    def Get_Child_Index(self, parent):
+        """
+        Returns the _Child_Index for the given parent, building it
+        if needed.
+        """
+        child_index = self.child_index_dict.get(parent)
+        if child_index == None:
+            child_index = self.child_index_dict[parent] = _Child_Index(parent)
+        return child_index
+
+
+    def Invalidate(self, node):
+        """
+        Drop the child index of the given node, after its children
+        (or their attributes) change.
+        """
+        self.child_index_dict.pop(node, None)
+        return
+
+
+    def Find(self, temp_tree, xpath):
+        """
+        Returns a list of matches for the given absolute xpath, relative
+        to the root of temp_tree (a super root holding the xml root).
+        """
+        steps = _Split_Xpath_Steps(xpath)
+        step_matches = []
+        if steps != None:
+            for step in steps:
+                match = _simple_step_re.match(step)
+                if match == None:
+                    break
+                step_matches.append(match)
+
+        # Give anything unusual to lxml. A final attribute selection
+        # is fine, being quick from its node.
+        if (steps == None or len(step_matches) < len(steps) - 1
+        or (len(step_matches) == len(steps) - 1
+            and not _attribute_step_re.match(steps[-1]))):
+            if xpath[0] == '(':
+                rel_xpath = xpath.replace('(','(.',1)
+            else:
+                rel_xpath = '.' + xpath
+            return Compiled_Xpath(temp_tree, rel_xpath)
+
+        nodes = [temp_tree.getroot()]
+        for match in step_matches:
+            tag, name, value_1, value_2, index = match.groups()
+            if name == None:
+                key = (tag, None, None)
+            else:
+                key = (tag, name, value_1 if value_1 != None else value_2)
+
+            next_nodes = []
+            for node in nodes:
+                children = self.Get_Child_Index(node).Get(key)
+                if not children:
+                    continue
+                if index == None:
+                    next_nodes.extend(children)
+                # Xpath indexes are 1-based.
+                elif 0 < int(index) <= len(children):
+                    next_nodes.append(children[int(index) - 1])
+            nodes = next_nodes
+
+        if len(step_matches) < len(steps):
+            return [x for node in nodes for x in node.xpath(steps[-1])]
+        return nodes
+
+
+    def Replace_Child(self, old_child, new_child):
+        """
+        Replaces a node in its parent with a new one, updating indexes.
+        """
+        parent = old_child.getparent()
+        parent.replace(old_child, new_child)
+        self.Invalidate(old_child)
+        child_index = self.child_index_dict.get(parent)
+        if child_index != None:
+            child_index.Replace(old_child, new_child)
+        return
+
+
+    def Apply_Op(self, op_node, target_node, optype):
+        """
+        Applies a patch op as _Apply_Patch_Op, updating any indexes
+        of the target's parent or children.
+        """
+        parent = target_node.getparent()
+        parent_index = self.child_index_dict.get(parent)
+        target_index = self.child_index_dict.get(target_node)
+        if optype == 'text' or (parent_index == None and target_index == None):
+            _Apply_Patch_Op(op_node, target_node, optype)
+            return
+
+        if optype == 'attrib':
+            # Reindex the target under its new attributes.
+            if parent_index != None:
+                parent_index.Remove(target_node)
+            try:
+                _Apply_Patch_Op(op_node, target_node, optype)
+            finally:
+                if parent_index != None:
+                    parent_index.Add(target_node)
+            return
+
+        # Node changes. Find the nodes bounding where new children will
+        # go, to pick them out afterward.
+        pos = op_node.get('pos')
+        if op_node.tag == 'add' and pos in [None, 'prepend']:
+            container, child_index = target_node, target_index
+            if pos == None:
+                start = target_node[-1] if len(target_node) else None
+                end = None
+            else:
+                start = None
+                end = target_node[0] if len(target_node) else None
+        else:
+            container, child_index = parent, parent_index
+            start = target_node if pos == 'after' else target_node.getprevious()
+            end = target_node if pos == 'before' else target_node.getnext()
+
+        try:
+            _Apply_Patch_Op(op_node, target_node, optype)
+        except Exception:
+            # May be partly applied; rebuild later.
+            self.Invalidate(target_node)
+            self.Invalidate(parent)
+            raise
+
+        if op_node.tag != 'add':
+            self.Invalidate(target_node)
+            if parent_index != None:
+                parent_index.Remove(target_node)
+
+        if child_index != None:
+            if start != None:
+                node = start.getnext()
+            else:
+                node = container[0] if len(container) else None
+            while node != None and node is not end:
+                child_index.Add(node, in_order = node.getnext() == None)
+                node = node.getnext()
+        return
+
+
+def Apply_Patch(
+        original_node, 
+        patch_node, 
+        error_prefix = None, 
+        xpath_resolver = None,
+        op_callback = None,
+    ):
     '''
     Apply a diff patch to the target xml node.
     Returns the modified node, a changed-in-place original_node, or
@@ -263,6 +623,13 @@ def Apply_Patch(original_node, patch_node, error_prefix = None):
     * error_prefix
       - Optional string, a prefix to put before any error messages.
       - Can be used to indicate the sources for the xml nodes.
+    * xpath_resolver
+      - Optional _Xpath_Resolver to use, eg. to keep its indexes across
+        calls patching the same xml; a new one is made by default.
+    * op_callback
+      - Optional function called before each diff op is applied, with
+        the temporary tree (holding original_node under a super root)
+        and the op node.
     '''
     # Requires elements as inputs.
     assert isinstance(original_node, ET._Element)
@@ -323,6 +690,11 @@ def Apply_Patch(original_node, patch_node, error_prefix = None):
         temp_root = ET.Element('root')
         temp_root.append(original_node)
         temp_tree = ET.ElementTree(temp_root)
+
+        # Xpath lookups go through a resolver, which indexes children
+        # of large parents (eg. wares) to speed up lookups.
+        if xpath_resolver == None:
+            xpath_resolver = _Xpath_Resolver()
         
         # Work through the patch operation nodes.
         for op_node in patch_node.getchildren():
@@ -342,6 +714,9 @@ def Apply_Patch(original_node, patch_node, error_prefix = None):
                 Print_Error('"sel" not found')
                 continue
 
+            if op_callback != None:
+                op_callback(temp_tree, op_node)
+
             # This gets a little messy here; the modification target
             # could be a node, a node attribute, or a node's text.
             # In any case, want to know the node itself being modified.
@@ -382,12 +757,14 @@ def Apply_Patch(original_node, patch_node, error_prefix = None):
             # just to enable modifying the schema path.
             # Note: if the expression is in parentheses, put the '.' inside
             # the first parenthesis.
+            # -Moved into the resolver.
+            #if xpath[0] == '(':
+            #    rel_xpath = xpath.replace('(','(.',1)
+            #else:
+            #    rel_xpath = '.' + xpath
+            #matched_nodes = NS_xpath(temp_tree, rel_xpath)
             try:
-                if xpath[0] == '(':
-                    rel_xpath = xpath.replace('(','(.',1)
-                else:
-                    rel_xpath = '.' + xpath
-                matched_nodes = NS_xpath(temp_tree, rel_xpath)
+                matched_nodes = xpath_resolver.Find(temp_tree, xpath)
             except Exception as ex:
                 Print_Error('xpath exception: {}'.format(ex))
                 continue
@@ -416,10 +793,11 @@ def Apply_Patch(original_node, patch_node, error_prefix = None):
             if op_node.get('type'):
                 optype = 'attrib'
 
-            # Apply the patch op.
+            # Apply the patch op, through the resolver to keep its
+            # indexes up to date.
             error_message = None
             try:
-                _Apply_Patch_Op(op_node, matched_node, optype)
+                xpath_resolver.Apply_Op(op_node, matched_node, optype)
             except Exception as ex:
                 error_message = f'{type(ex).__name__}: {ex}'
 
@@ -603,9 +981,13 @@ def Make_Patch(
         # Set up a config dict.
         # This was added just for holding forced_attributes in a slightly
         # cleaner way. Short name for easier passing (since passes often).
+        # The xpath_resolver indexes children by attribute values, for
+        # picking unique xpaths; it is kept up to date as patch ops
+        # are applied to the original copy.
         cfg = {
             'forced_attributes' : [],
             'shorten_xpaths' : shorten_xpaths,
+            'xpath_resolver' : _Xpath_Resolver(),
             }
 
         # Break up forced attributes strings into a list.
@@ -763,7 +1145,8 @@ def _Patch_Node_Constructor(
             op_node.text = value
 
     # Run this patch on the original xml node to keep it updated.
-    error_message = _Apply_Patch_Op(op_node, target, type)
+    # (Through the resolver, to keep its indexes updated as well.)
+    error_message = cfg['xpath_resolver'].Apply_Op(op_node, target, type)
     if error_message:
         raise XML_Patch_Exception('Patch generation error, message: {}'.format(
             error_message))
@@ -1031,6 +1414,11 @@ def _Get_Xpath_Recursive(node, cfg):
         xpath = 'comment()'
         similar_elements = parent.xpath(xpath)
 
+    # Most nodes can use the child indexes instead of xpath searches
+    # of siblings; this gives the same result.
+    elif _Can_Use_Child_Index(node, cfg):
+        xpath, similar_elements = _Get_Indexed_Xpath_Step(node, parent, cfg)
+
     else:
         # The xpath is just the path to the parent, combined with the tag
         #  of the child node and its attributes, and the index among 
@@ -1175,6 +1563,86 @@ def _Get_Xpath_Recursive(node, cfg):
     return xpath
 
 
+def _Can_Use_Child_Index(node, cfg):
+    '''
+    Returns True if _Get_Indexed_Xpath_Step supports the given node,
+    which needs a plain tag and attribute names, and no forced
+    attributes that look into children.
+    '''
+    if not isinstance(node.tag, str) or '{' in node.tag:
+        return False
+    if any('{' in x for x in node.keys()):
+        return False
+    if any('/' in x for x in cfg['forced_attributes']):
+        return False
+    return True
+
+
+def _Get_Indexed_Xpath_Step(node, parent, cfg):
+    '''
+    Returns a tuple of (xpath step, list of matching siblings) for the
+    node, relative to its parent, using the resolver child indexes.
+    This follows the same attribute picking as _Get_Xpath_Recursive,
+    giving the same xpath step, but each check of how many siblings
+    match only looks through those sharing the first attribute value.
+    '''
+    child_index = cfg['xpath_resolver'].Get_Child_Index(parent)
+    # Attribute (name, value) conditions added so far.
+    conditions = []
+
+    def Get_Matches():
+        'Returns siblings matching the tag and conditions, in order.'
+        if not conditions:
+            return child_index.Get((node.tag, None, None)) or []
+        name, value = conditions[0]
+        matches = child_index.Get((node.tag, name, value)) or []
+        for name, value in conditions[1:]:
+            matches = [x for x in matches if x.get(name) == value]
+        return matches
+
+    xpath = node.tag
+
+    # Add forced attributes.
+    forced_attr_added = False
+    for key in cfg['forced_attributes']:
+        value = node.get(key)
+        # Often nodes will not have the attribute; skip those cases.
+        if value == None:
+            continue
+        # Skip anything with quotes.
+        if '"' in value or "'" in value:
+            continue
+        xpath += '''[@{}='{}']'''.format(key, value)
+        conditions.append((key, value))
+        forced_attr_added = True
+
+    # Skip to adding attributes for large parents, as the xpath version.
+    if len(parent) > 50 and len(node.attrib) >= 1 and not forced_attr_added:
+        similar_elements = [None, None]
+    else:
+        similar_elements = Get_Matches()
+
+    if len(similar_elements) > 1:
+        for key in Sort_Attributes(node.keys()):
+            if key in cfg['forced_attributes']:
+                continue
+            value = node.get(key)
+            if '"' in value or "'" in value:
+                continue
+            xpath += '''[@{}='{}']'''.format(key, value)
+            conditions.append((key, value))
+
+            similar_elements = Get_Matches()
+            if len(similar_elements) == 1:
+                break
+
+    if similar_elements[0] == None:
+        similar_elements = Get_Matches()
+
+    assert len(similar_elements) >= 1
+    return xpath, similar_elements
+
+
 def Sort_Attributes(attr_names):
     '''
     Sort attribute names, placing the highest priority first, to aid
@@ -1214,42 +1682,38 @@ def Sort_Attributes(attr_names):
     return ret_list + low_prio_list
 
 
-def Verify_Patch(original_node, modified_node, patch_node):
+def Verify_Patch(original_node, modified_node, patch_node, full_copy = False):
     '''
     Verify that the patch applied to the original recreates the modified
     xml node. Returns True on success, False on failure.
-    '''
-    # Copy the original, to do the patching without changing the input.
-    original_node_patched = deepcopy(original_node)
-    original_node_patched = Apply_Patch(original_node_patched, patch_node)
-    
-    # Line comparison works poorly if the attributes are out of
-    # order, which can happen since the diff patch adds attributes to
-    # the end of a dict that may have been earlier in the original.
-    # As such, since lxml has no way to order attributes on printout,
-    # this comparison needs to be done in a way that allows ordering
-    # differences.
-    original_elements = [x for x in original_node_patched.iter()]
-    modified_elements = [x for x in modified_node.iter()]
 
-    success = True
-    # Compare by node, out to the longest list.
-    for orig, mod in zip_longest(original_elements, modified_elements):
-    
-        # Filter the attributes to remove namespaced ones, which will
-        # be allowed to mismatch.
-        orig_attr = {k:v for k,v in orig.attrib.items() if not Is_NS_Attribute(k)}
-        mod_attr  = {k:v for k,v in mod.attrib.items()  if not Is_NS_Attribute(k)}
-
-        # Look at tag, attributes, text.
-        if orig.tag != mod.tag or orig_attr != mod_attr or orig.text != mod.text:
-            # If it was succesful up to this point, print a message.
-            if success:
-                Print_Log('Patch test failed on line {}.'.format(orig.sourceline))
-            # Flag as a failure.
-            success = False
-            break
+    By default, only the children of the original root that the patch
+    ops reach into are copied and patched, and other children are
+    compared to the modified xml directly. Patches this cannot handle
+    (eg. replacing the root, or xpaths with // or child conditions)
+    fall back to a full copy.
 
+    * full_copy
+      - Bool, if True then always patch a full copy of the original.
+    '''
+    original_node_patched = None
+    if not full_copy:
+        original_node_patched, placeholder_dict = _Apply_Patch_To_Shallow_Copy(
+            original_node, patch_node)
+
+    if original_node_patched != None:
+        mismatch_node = _Find_Shallow_Mismatch(
+            original_node, original_node_patched, 
+            modified_node, placeholder_dict)
+    else:
+        # Copy the original, to do the patching without changing the input.
+        original_node_patched = deepcopy(original_node)
+        original_node_patched = Apply_Patch(original_node_patched, patch_node)
+        mismatch_node = _Find_Mismatch(original_node_patched, modified_node)
+
+    success = mismatch_node == None
+    if not success:
+        Print_Log('Patch test failed on line {}.'.format(mismatch_node.sourceline))
     
     # For checking, dump all of the xml to files.
     # This is mainly intended for use by the unit test.
@@ -1272,6 +1736,211 @@ def Verify_Patch(original_node, modified_node, patch_node):
     return success
 
 
+def _Find_Mismatch(patched_node, modified_node):
+    '''
+    Compares the nodes of two trees in iteration order, returning the
+    first node of patched_node that differs from its modified_node
+    counterpart, or None if all match.
+    '''
+    # Compare by node, out to the longest list.
+    for orig, mod in zip_longest(patched_node.iter(), modified_node.iter()):
+        # If one tree ran out of nodes, report the extra node, or
+        # the patched root if the modified tree has extras.
+        if orig == None or mod == None:
+            return orig if orig != None else patched_node
+        if not _Nodes_Match(orig, mod):
+            return orig
+    return None
+
+
+def _Nodes_Match(orig, mod):
+    '''
+    Returns True if the two nodes have the same tag, attributes, and
+    text, else False. Children are not checked.
+    '''
+    # Line comparison works poorly if the attributes are out of
+    # order, which can happen since the diff patch adds attributes to
+    # the end of a dict that may have been earlier in the original.
+    # As such, since lxml has no way to order attributes on printout,
+    # this comparison needs to be done in a way that allows ordering
+    # differences.
+    # Filter the attributes to remove namespaced ones, which will
+    # be allowed to mismatch.
+    orig_attr = {k:v for k,v in orig.attrib.items() if not Is_NS_Attribute(k)}
+    mod_attr  = {k:v for k,v in mod.attrib.items()  if not Is_NS_Attribute(k)}
+
+    # Look at tag, attributes, text.
+    return orig.tag == mod.tag and orig_attr == mod_attr and orig.text == mod.text
+
+
+def _Get_Structure_Hash(node):
+    '''
+    Returns a hash of the tag, non-namespaced attributes (in any order),
+    and text of the node and all of its descendants, in tree structure.
+    Tails (node ids) are ignored.
+    '''
+    return hash((
+        node.tag,
+        frozenset((k,v) for k,v in node.attrib.items() if not Is_NS_Attribute(k)),
+        node.text,
+        tuple(_Get_Structure_Hash(x) for x in node),
+        ))
+
+
+# Xpath step (tag or comment, with optional attribute value or index
+# conditions) that only depends on the node itself and its position,
+# and so selects the same nodes whether or not they have children.
+_shallow_step_re = re.compile(
+    r'''^(?:[\w.:*-]+|comment\(\))'''
+    r'''(?:\[(?:@[\w.:-]+=(?:'[^']*'|"[^"]*")|\d+)\])*$''')
+
+def _Split_Xpath_Steps(xpath):
+    '''
+    Splits an absolute xpath into its steps, on slashes that are not
+    inside conditions or quotes. Returns None if the xpath is not a
+    plain absolute path, eg. starts with // or a parenthesis.
+    '''
+    if not xpath.startswith('/') or xpath.startswith('//'):
+        return None
+    steps = []
+    start = 1
+    depth = 0
+    quote = None
+    for index, char in enumerate(xpath):
+        if quote != None:
+            if char == quote:
+                quote = None
+        elif char in '\'"':
+            quote = char
+        elif char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+        elif char == '/' and depth == 0 and index >= start:
+            steps.append(xpath[start : index])
+            start = index + 1
+    steps.append(xpath[start:])
+    if not all(steps):
+        return None
+    return steps
+
+
+def _Apply_Patch_To_Shallow_Copy(original_node, patch_node):
+    '''
+    Applies a diff patch to a copy of original_node in which the root
+    children start as childless placeholders. Before each op, root
+    children its xpath reaches are swapped for full copies.
+
+    Returns a tuple of (patched root, dict of remaining placeholders
+    keyed to their original children), or (None, None) if the patch
+    needs a full copy.
+    '''
+    if patch_node.tag != 'diff':
+        return None, None
+
+    # Check the ops up front, collecting the xpath to the root child
+    # that each reaches, keyed by op node.
+    op_child_xpath_dict = {}
+    for op_node in patch_node.iterchildren(tag = ET.Element):
+        xpath = op_node.get('sel')
+        steps = _Split_Xpath_Steps(xpath) if xpath else None
+        if not steps or not _shallow_step_re.match(steps[0]):
+            return None, None
+
+        # Ops on the root itself (attributes, text, or child additions)
+        # leave the other children untouched, but replacing or
+        # removing it changes everything.
+        if len(steps) == 1 or steps[1][0] == '@' or steps[1].startswith('text()'):
+            if len(steps) == 1 and (op_node.tag != 'add' 
+            or op_node.get('pos') not in [None, 'prepend']):
+                return None, None
+        elif _shallow_step_re.match(steps[1]):
+            op_child_xpath_dict[op_node] = '/{}/{}'.format(steps[0], steps[1])
+        else:
+            return None, None
+
+    # Build the copy. Comments and such are small, and copied fully.
+    shallow_root = ET.Element(original_node.tag, original_node.attrib,
+                              nsmap = original_node.nsmap)
+    shallow_root.text = original_node.text
+    shallow_root.tail = original_node.tail
+    placeholder_dict = {}
+    for child in original_node:
+        if isinstance(child.tag, str):
+            placeholder = ET.SubElement(shallow_root, child.tag, child.attrib)
+            placeholder.text = child.text
+            placeholder.tail = child.tail
+            placeholder_dict[placeholder] = child
+        else:
+            shallow_root.append(deepcopy(child))
+
+    # Before each op, swap in full children as needed.
+    xpath_resolver = _Xpath_Resolver()
+    def Expand_Children(temp_tree, op_node):
+        child_xpath = op_child_xpath_dict.get(op_node)
+        if child_xpath == None:
+            return
+        try:
+            matched_nodes = xpath_resolver.Find(temp_tree, child_xpath)
+        except Exception:
+            # Leave the error message to Apply_Patch.
+            return
+        for node in matched_nodes:
+            original_child = placeholder_dict.pop(node, None)
+            if original_child != None:
+                xpath_resolver.Replace_Child(node, deepcopy(original_child))
+        return
+
+    shallow_root = Apply_Patch(shallow_root, patch_node, 
+                               xpath_resolver = xpath_resolver,
+                               op_callback = Expand_Children)
+    return shallow_root, placeholder_dict
+
+
+def _Find_Shallow_Mismatch(
+        original_node, 
+        patched_node, 
+        modified_node, 
+        placeholder_dict
+    ):
+    '''
+    Compares a root patched by _Apply_Patch_To_Shallow_Copy against the
+    modified root, returning the first mismatched node of the patched
+    side (using the original child for placeholders, and the original
+    root in place of the patched root), or None if all match.
+    Root children are compared by structural hash, except
+    that placeholders whose original child serializes the same as the
+    modified child are matched without hashing.
+    '''
+    # Check the root on its own.
+    if not _Nodes_Match(patched_node, modified_node):
+        return original_node
+
+    for patched_child, modified_child in zip(patched_node, modified_node):
+        original_child = placeholder_dict.get(patched_child)
+        if original_child != None:
+            # Unchanged children normally keep their node ids, so
+            # will serialize the same.
+            if (ET.tostring(original_child, with_tail = False) 
+            == ET.tostring(modified_child, with_tail = False)):
+                continue
+            patched_child = original_child
+
+        if _Get_Structure_Hash(patched_child) != _Get_Structure_Hash(modified_child):
+            # Find the specific node for the message.
+            mismatch_node = _Find_Mismatch(patched_child, modified_child)
+            return mismatch_node if mismatch_node != None else patched_child
+
+    # If one side has extra children, report the first extra patched
+    # child, or the root if the modified side has extras.
+    if len(patched_node) > len(modified_node):
+        extra_child = patched_node[len(modified_node)]
+        return placeholder_dict.get(extra_child, extra_child)
+    if len(patched_node) < len(modified_node):
+        return original_node
+    return None
+
+
 
 def Unit_Test(test_node, num_tests = 100, edits_per_test = 5, rand_seed = None):
     '''
@@ -260,15 +260,24 @@ class Display_Item(_Base_Item):
 class Edit_Item(_Base_Item):
     '''
     Container for a single editable item, eg. one field in the xml.
-    Initializor takes paths to the field, and fills in values automatically.
+    Initializor takes paths to the field. Values are filled in from
+    the xml on first use (or in batches with Resolve_Item_Values), so
+    that objects are cheap to create when only some are displayed.
 
     Init parameters:
     * game_file
-      - The Game_File object that holds the item being edited, in
-        its various versions, to be used for the initial init.
-      - This may be from a multiprocessing copy, and will not be
-        kept in case it gets out of sync with transformed xml
-        state.
+      - The Game_File object that holds the item being edited.
+      - Not stored; kept so builders can pass it. Values are looked
+        up lazily through the file system, or read from a specific
+        file (eg. a multiprocessing copy) with Get_Init_Values.
+    * xml_node_id
+      - Optional string, id of the xml node this item reads from, if
+        known at creation (eg. the node the xpath was built from).
+      - Used to look up the node directly, instead of by xpath.
+    * init_values
+      - Optional dict of initial values, keyed by version, along with
+        'xml_node_id' and 'current_stamp' entries, as returned by
+        Get_Init_Values.
 
     New attributes:
     * virtual_path
@@ -296,7 +305,13 @@ class Edit_Item(_Base_Item):
     * xml_node_id
       - String, the id of an xml element that the patched version of this
         item was initialized from.
-      - Used to aid in matching to live editor patches from a prior run.
+      - Used to aid in matching to live editor patches from a prior run,
+        and to find the node in each file version without the xpath.
+      - May be given at creation; filled in when the patched value is
+        read; use Get_XML_Node_ID.
+    * current_stamp
+      - The game file Get_Modified_Stamp result when the 'current' value
+        was read, used to skip refreshes when the file is unchanged.
     '''
     def __init__(
             self,
@@ -306,22 +321,27 @@ class Edit_Item(_Base_Item):
             attribute,
             is_reference = False,
             read_only = False, # Customized default.
+            xml_node_id = None,
+            init_values = None,
             **kwargs
         ):
         super().__init__(read_only = read_only, **kwargs)
         self.virtual_path       = virtual_path
         self.xpath              = xpath
         self.attribute          = attribute
-        self.xml_node_id        = None
+        self.xml_node_id        = xml_node_id
+        self.current_stamp      = None
         self.is_reference       = is_reference
         self.key                = '{},{},{},{}'.format(
             self.name, virtual_path, xpath, attribute)
         # Just to be safe, there should only be 3 commas, none from
         # the xpath or attribute.
         assert self.key.count(',') == 3
-        # Init the values right away after creation, to get xpath
-        # parsing out of the way.
-        self.Init_Values(game_file = game_file)
+        # Values otherwise wait until requested.
+        if init_values != None:
+            self.version_value_dict.update(init_values)
+            self.xml_node_id   = self.version_value_dict.pop('xml_node_id')
+            self.current_stamp = self.version_value_dict.pop('current_stamp')
         return
 
 
@@ -347,7 +367,11 @@ class Edit_Item(_Base_Item):
         #  such as a patched version adding a node missing from
         #  the vanilla version (eg. a ware with an added production
         #  formula).
-        nodes = game_file.Get_Xpath_Nodes(self.xpath, version = version)
+        # Go by node id when known, since xpaths with positional
+        #  predicates are slow in lxml; the xpath is the fallback
+        #  (eg. for vanilla nodes, which lack ids when patched).
+        nodes = game_file.Find_Nodes(self.xpath, node_id = self.xml_node_id,
+                                     version = version)
         if len(nodes) > 1:
             Print('Error: Found {} nodes for file "{}", xpath "{}".'
                 .format(len(nodes), self.virtual_path, self.xpath))
@@ -362,6 +386,8 @@ class Edit_Item(_Base_Item):
 
         # Record it.
         self.version_value_dict[version] = value
+        if version == 'current':
+            self.current_stamp = game_file.Get_Modified_Stamp()
 
         # Record the patched node for reference, to match up to
         # live_editor saved patches which may have had a different xpath.
@@ -376,15 +402,17 @@ class Edit_Item(_Base_Item):
         return
 
 
-    def Init_Values(self, game_file):
+    def Get_Init_Values(self, game_file = None):
         '''
-        Do an initial parsing for all values from the source xml.
-
-        * game_file
-          - The Game_File to pull initial values from.
+        Returns a dict of the values, keyed by version, plus the
+        'xml_node_id' and 'current_stamp', suitable for passing to a new
+        Edit_Item as init_values (eg. when items are made in another
+        process). Values not yet read are filled in from the given
+        game_file, else through the file system.
         '''
         for version in ['vanilla','patched','current']:
-            self.Refresh_Value_From_File(version, game_file = game_file)
+            if self.version_value_dict.get(version) == None:
+                self.Refresh_Value_From_File(version, game_file = game_file)
         # The edited value will copy from patched for now.
         # TODO: think about pre-edit transforms and how to capture
         #  their values, such that patch creation knows when this node
@@ -396,8 +424,12 @@ class Edit_Item(_Base_Item):
         # Consider adding a 5th version, partially transformed; the
         #  xml will need a way to track this (eg. forking xml game
         #  files when live editor patches are applied).
-        self.version_value_dict['edited'] = self.version_value_dict['patched']
-        return
+        if self.version_value_dict.get('edited') == None:
+            self.version_value_dict['edited'] = self.version_value_dict['patched']
+        init_values = dict(self.version_value_dict)
+        init_values['xml_node_id'] = self.xml_node_id
+        init_values['current_stamp'] = self.current_stamp
+        return init_values
 
 
     def Init_References(self):
@@ -407,13 +439,35 @@ class Edit_Item(_Base_Item):
         been added to the Live_Editor.
         '''
         # Update the parent object reference, if needed.
+        # (This reads values that haven't been yet.)
         if self.is_reference:
             for version in version_names:
-                value = self.version_value_dict[version]
+                value = self.Get_Value(version)
                 self.parent.Update_Reference(self.name, version, value)
         return
 
 
+    def Get_XML_Node_ID(self):
+        '''
+        Returns the xml_node_id, reading the patched value if needed.
+        May be None if the patched node was not found.
+        '''
+        if self.version_value_dict.get('patched') == None:
+            self.Get_Value('patched')
+        return self.xml_node_id
+
+
+    def Is_Current_Stale(self, stamp):
+        '''
+        Returns True if the 'current' value was read from a file version
+        other than that of the given Get_Modified_Stamp result, and so
+        may be out of date. Returns False if it was not read yet.
+        '''
+        if self.version_value_dict.get('current') == None:
+            return False
+        return self.current_stamp != stamp
+
+
     def Get_Value(self, version):
         '''
         Return the value from the given version.
@@ -502,3 +556,32 @@ class Edit_Item(_Base_Item):
             )
 
     
+
+
+def Resolve_Item_Values(items, versions = ('vanilla','patched','current')):
+    '''
+    Reads any unresolved values of the given items for the given file
+    versions, grouping items by their game file so each is loaded once.
+    Items other than Edit_Items are skipped; Display_Items compute
+    from these as requested.
+    Use this ahead of displaying many items together, eg. a table.
+    '''
+    # Group items needing a lookup by file.
+    path_items_dict = defaultdict(list)
+    for item in items:
+        if not isinstance(item, Edit_Item):
+            continue
+        if any(item.version_value_dict.get(x) == None for x in versions):
+            path_items_dict[item.virtual_path].append(item)
+
+    for virtual_path, path_items in path_items_dict.items():
+        game_file = Load_File(virtual_path)
+        for version in versions:
+            for item in path_items:
+                if item.version_value_dict.get(version) != None:
+                    continue
+                item.Refresh_Value_From_File(version, game_file = game_file)
+                if item.is_reference:
+                    item.parent.Update_Reference(
+                        item.name, version, item.version_value_dict[version])
+    return
@@ -477,6 +477,8 @@ class Edit_Object:
                         ))
                 else:
                     # Create the item.
+                    # The node id (from its tail, if it has one) lets
+                    # the item skip the xpath when reading values.
                     self.Add_Item( Edit_Item(
                         parent       = self,
                         game_file    = game_file,
@@ -489,6 +491,7 @@ class Edit_Object:
                         read_only    = macro.read_only,
                         is_reference = macro.is_reference,
                         hidden       = macro.hidden,
+                        xml_node_id  = nodes[0].tail,
                         ))
 
             else:                
@@ -514,6 +517,84 @@ class Edit_Object:
         return
 
 
+    def Get_Item_Specs(self, game_file = None):
+        '''
+        Returns a list of tuples describing this object's items, in
+        order, with plain values that are cheap to pickle. Used to
+        send items made in a worker process back to the main process.
+        See Make_Items_From_Specs.
+
+        * game_file
+          - Optional game file (or XML_Extract) to read any unresolved
+            item values from, instead of the file system.
+        '''
+        item_specs = []
+        for item in self.items_dict.values():
+            if isinstance(item, Placeholder_Item):
+                item_specs.append(('placeholder', item.name, item.display_name,
+                                   item.description, item.hidden))
+            elif isinstance(item, Edit_Item):
+                item_specs.append(('edit', item.name, item.display_name,
+                                   item.description, item.hidden,
+                                   item.xpath, item.attribute, item.read_only,
+                                   item.is_reference, item.Get_Init_Values(game_file)))
+            else:
+                # Display functions pickle by reference.
+                item_specs.append(('display', item.name, item.display_name,
+                                   item.description, item.hidden,
+                                   item.dependency_names, item.display_function,
+                                   item.read_only))
+        return item_specs
+
+
+    def Make_Items_From_Specs(self, virtual_path, item_specs):
+        '''
+        Creates and records items from the given Get_Item_Specs output.
+        Edit_Items take their values from the specs, and are bound to
+        the given virtual_path for later lookups.
+        '''
+        for spec in item_specs:
+            kind, name, display_name, description, hidden = spec[:5]
+            if kind == 'placeholder':
+                item = Placeholder_Item(
+                    parent       = self,
+                    name         = name,
+                    display_name = display_name,
+                    description  = description,
+                    hidden       = hidden,
+                    )
+            elif kind == 'edit':
+                xpath, attribute, read_only, is_reference, init_values = spec[5:]
+                item = Edit_Item(
+                    parent       = self,
+                    game_file    = None,
+                    virtual_path = virtual_path,
+                    name         = name,
+                    display_name = display_name,
+                    description  = description,
+                    xpath        = xpath,
+                    attribute    = attribute,
+                    read_only    = read_only,
+                    is_reference = is_reference,
+                    hidden       = hidden,
+                    init_values  = init_values,
+                    )
+            else:
+                dependency_names, display_function, read_only = spec[5:]
+                item = Display_Item(
+                    parent           = self,
+                    name             = name,
+                    display_name     = display_name,
+                    description      = description,
+                    dependency_names = dependency_names,
+                    display_function = display_function,
+                    read_only        = read_only,
+                    hidden           = hidden,
+                    )
+            self.Add_Item(item)
+        return
+
+
     def Get_Display_Version_Items_Dict(
             self, 
             skipped_item_names = None,
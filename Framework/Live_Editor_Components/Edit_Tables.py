@@ -3,7 +3,7 @@ from ..Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('Live_Editor')
 
 from collections import OrderedDict
-from .Edit_Items import Placeholder_Item
+from .Edit_Items import Placeholder_Item, Resolve_Item_Values
 
 class Edit_Table_Group:
     '''
@@ -49,12 +49,194 @@ class Edit_Table_Group:
         return None
 
 
+class _Table_Section:
+    '''
+    Column-major block of an Edit_Table, holding the items of one list
+    of objects (one per table row): either the table's own objects, or
+    the objects referenced through one item name.
+
+    Attributes:
+    * row_objects
+      - List of the Edit_Objects (or None) used for each row.
+    * fields
+      - List of item names, one per column.
+    * columns
+      - List of columns, one per field, each a list holding an item
+        (or None) per row.
+    * labels
+      - List of display names, one per column.
+    * column_counts
+      - List of ints, one per column, counting its cells that are
+        displayable (not None or non-separator Placeholder_Items).
+        Columns with a 0 count are pruned from the table.
+    '''
+    # Item names left out of tables.
+    # TODO: move this to an arg.
+    skipped_item_names = ['description']
+
+    def __init__(self, row_objects):
+        self.row_objects = list(row_objects)
+        self.fields = self._Get_Fields(self.row_objects)
+        self.columns = []
+        self.labels = []
+        self.column_counts = []
+
+        for field in self.fields:
+            column = [self._Get_Cell(x, field) for x in self.row_objects]
+            self.columns.append(column)
+
+            # Get the column label, verifying all items share it.
+            label_set = set(x.display_name for x in column if x != None)
+            # There should have been just one label found.
+            assert len(label_set) == 1
+            self.labels.append(label_set.pop())
+            self.column_counts.append(sum(_Is_Displayed(x) for x in column))
+
+        # Item values are read lazily; read them for the whole
+        # section at once, a file at a time, rather than per cell.
+        Resolve_Item_Values(x for column in self.columns for x in column)
+        return
+
+
+    @staticmethod
+    def _Get_Cell(object, field):
+        'Returns the item of the object for a field, or None.'
+        if object == None:
+            return None
+        # Make sure it comes from the object itself,
+        # not a ref (to be safe).
+        return object.Get_Item(field, allow_refs = False)
+
+
+    def _Get_Fields(self, object_list):
+        '''
+        From the given list of objects, select the item names to be
+        included, in display order, such that all objects can be
+        aligned to them.
+        '''
+        # If objects have different field amounts, they will be sync'd
+        # up here to pad them out so that all objects get entries
+        # as necessary (eg. wares with multiple production formulas
+        # may cause other wares to pad with None entries at those
+        # locations).
+        
+        # Start by gathering the fields, in some sort of order.
+        # This assumes they are all uniquely named.
+        item_fields = []
+        # Set of the above, for fast membership checks.
+        item_field_set = set()
+        # The best way to shuffle these together is unclear, but this
+        # will aim to do one object at a time, and do field insertions
+        # when a new field is encountered, placing it after the
+        # prior name (wherever it is).
+        prior_name = None
+        for object in object_list:
+            # Skip None entries.
+            if object == None:
+                continue
+
+            # Work through the object items.
+            for item in object.Get_Items():
+                name = item.name
+
+                # Skip names as requested.
+                if name in self.skipped_item_names:
+                    continue
+
+                # Skip if the name is known.
+                if name in item_field_set:
+                    continue
+
+                # If there is a prior name, look for it.
+                # (Note: this doesn't work so well when there is no
+                # prior but there are existing fields, in which case
+                # matching to the following name might be wanted,
+                # but that case is not currently expected.)
+                if prior_name != None:
+                    # Stick this name after the prior one.
+                    prior_index = item_fields.index(prior_name)
+                    item_fields.insert(prior_index+1, name)
+                else:
+                    # Stick this name at the end.
+                    item_fields.append(name)
+                item_field_set.add(name)
+
+                # Update the prior_name for next iteration.
+                prior_name = name
+        return item_fields
+
+
+    def Update_Rows(self, row_objects):
+        '''
+        Updates this section to use the given row objects, changing only
+        the cells of rows whose object changed. Returns True if any
+        cells changed, or None if the new objects have items that don't
+        fit the current columns (in which case the section should be
+        rebuilt).
+        '''
+        changed_rows = [index for index, (old, new) 
+                        in enumerate(zip(self.row_objects, row_objects))
+                        if old is not new]
+        if not changed_rows:
+            return False
+
+        # New objects can only be slotted in if they don't add fields.
+        field_set = set(self.fields)
+        for index in changed_rows:
+            object = row_objects[index]
+            if object == None:
+                continue
+            if any(x.name not in field_set 
+                   and x.name not in self.skipped_item_names
+                   for x in object.Get_Items()):
+                return None
+
+        new_items = []
+        for col, field in enumerate(self.fields):
+            column = self.columns[col]
+            for index in changed_rows:
+                item = self._Get_Cell(row_objects[index], field)
+                # Labels need to match the column.
+                if item != None and item.display_name != self.labels[col]:
+                    return None
+                new_items.append((col, index, item))
+
+        # Checks passed; apply the changes.
+        for col, index, item in new_items:
+            column = self.columns[col]
+            self.column_counts[col] += _Is_Displayed(item) - _Is_Displayed(column[index])
+            column[index] = item
+        for index in changed_rows:
+            self.row_objects[index] = row_objects[index]
+
+        Resolve_Item_Values(x[2] for x in new_items)
+        return True
+
+
+def _Is_Displayed(item):
+    '''
+    Returns 1 if the item has meaningful data for display in a table
+    cell, else 0. None and Placeholder_Items are not meaningful, except
+    for separators.
+    '''
+    if item == None:
+        return 0
+    if isinstance(item, Placeholder_Item) and not item.is_separator:
+        return 0
+    return 1
+
+
 class Edit_Table:
     '''
     A table of Edit_Object of the same or closely related type,
     which will be displayed together.  Initially this will deal
     ith inter-object references by collecting all items together.
 
+    Tables are built from column-major sections: one for the objects
+    themselves, shared by all versions, and one per reference item name
+    and version. On later Get_Table calls, only rows whose references
+    changed are updated.
+
     Attributes:
     * name
       - String, internal name for the table.
@@ -68,6 +250,14 @@ class Edit_Table:
       - Each row holds Edit_Item and Display_Item objects (or None) taken from
         the Edit_Object used for that row.
       - Intended for easing display code.
+    * base_section
+      - _Table_Section of the table objects, or None if not yet built.
+    * reference_item_names
+      - List of names of the object items that reference other objects,
+        in display order; filled in with the base_section.
+    * version_ref_sections
+      - Dict, keyed by version, holding a dict of _Table_Sections
+        keyed by reference item name.
     '''
     '''
     TODO: maybe split out headers.
@@ -79,6 +269,9 @@ class Edit_Table:
         self.name = name
         self.object_view_list = []
         self.version_table_dict = {}
+        self.base_section = None
+        self.reference_item_names = []
+        self.version_ref_sections = {}
         return
 
 
@@ -87,6 +280,7 @@ class Edit_Table:
         Attach an Object_View to this table.
         '''
         self.object_view_list.append(object_view)
+        self.Reset_Table()
         return
 
 
@@ -96,7 +290,11 @@ class Edit_Table:
         This may be useful as a way of dealing with changed object
         references.
         '''
-        self.table = None
+        self.version_table_dict = {}
+        self.base_section = None
+        self.reference_item_names = []
+        self.version_ref_sections = {}
+        return
 
 
     def Get_Table(self, version = 'current', rebuild = False):
@@ -106,221 +304,114 @@ class Edit_Table:
         Columns unused by any object will be pruned out.
         The 'description' field will be automatically skipped.
         Generated tables are cached; avoid editing the returned table.
+        Later calls update the table for changed object references,
+        returning a new list when anything changed.
 
         * version
           - String, version of the items to use for evaluating references.
           - Defaults to 'current'.
+        * rebuild
+          - Bool, if True then the table is fully reconstructed.
         '''
-        if version not in self.version_table_dict or rebuild:
-            
-            # This gets a little tricky to pick out what to print, and
-            # in what order, once references get involved. Some objects
-            # may have missing references, others may ref objects with
-            # differing fields, and there may be multiple refs for
-            # an object that have overlapping fields.
-            # Display of a single object is straightforward, but merging
-            # multiple displays onto the same table can be quirky.
-
-            # To get something working, just assume that all objects will
-            # have references of the same types, and hence will have
-            # matching fields.
-
-            #-Removed; this doesn't work well when objects have potentially
-            # differing items or multiple refs.
-            ## Collect lists of items from each object.
-            #for object in self.objects_dict.values():
-            #    # Grab the items for this version.
-            #    items = object.Get_Display_Version_Items_Dict(
-            #        version = version,
-            #        # The descriptions can be long, so skip them.
-            #        skipped_item_names = ['description']
-            #        )[version]
-            #    # Add to the table.
-            #    table.append(items)
-            #    
-            ## If for some reason tables are not the same size, pad them out,
-            ##  to catch cases where one object has a reference that another
-            ##  is missing.
-            ## Also sample the first full row to get labels.
-            ## TODO: maybe do something smarter; this will only work well
-            ## if there is a single reference that is sometimes missing.
-            #num_columns = max(len(x) for x in table)
-            #labels = None
-            #for row in table:
-            #    # Get labels from a full row.
-            #    if labels == None and len(row) == num_columns:
-            #        labels = [x.display_name for x in row]
-            #    # Pad out the row with a simple loop.
-            #    while len(row) < num_columns:
-            #        row.append(None)
-
-            # Unpack the object views to get edit objects.
-            # TODO: maybe always work with edit objects.
-            edit_objects = [x.edit_object for x in self.object_view_list]
+        if rebuild:
+            self.Reset_Table()
             
-            # Build up the table by working through the object in parallel.
-            # References will be unpacked in a matched order, with any
-            # object that is missing a ref having it filled with None
-            # entries.
-            table = self._Get_Object_Group_Items(edit_objects)
-
+        # This gets a little tricky to pick out what to print, and
+        # in what order, once references get involved. Some objects
+        # may have missing references, others may ref objects with
+        # differing fields, and there may be multiple refs for
+        # an object that have overlapping fields.
+        # Display of a single object is straightforward, but merging
+        # multiple displays onto the same table can be quirky.
+
+        # To get something working, just assume that all objects will
+        # have references of the same types, and hence will have
+        # matching fields.
+
+        # Unpack the object views to get edit objects.
+        # TODO: maybe always work with edit objects.
+        edit_objects = [x.edit_object for x in self.object_view_list]
+        changed = False
+
+        # Build up the table by working through the object in parallel.
+        # References will be unpacked in a matched order, with any
+        # object that is missing a ref having it filled with None
+        # entries.
+        if self.base_section == None:
+            self.base_section = _Table_Section(edit_objects)
+            changed = True
 
             # Find all inter-object references.
             # Note: this will order the refs according to object search
             # order, then its item order, so it could be out of sync
             # with the original reference items if some objects are
             # missing those ref items.
-            reference_item_names = []
+            self.reference_item_names = []
             for object in edit_objects:
                 for item in object.Get_Items():
                     name = item.name
-                    if item.Is_Reference() and name not in reference_item_names:
-                        reference_item_names.append(name)
-                        
-            # Set up padding between refs.
-            padding = Placeholder_Item(display_name = '', is_separator = True)
-
-            # Go through them, in order.
-            for ref_name in reference_item_names:
-
-                # Collect the referenced objects.
-                ref_objects = []
-                for object in edit_objects:
-                    ref_objects.append( object.Get_Reference(ref_name, version))
-
-                # Collect items from the objects.
-                ref_table = self._Get_Object_Group_Items(ref_objects)
-
-                # Add to the base table.
-                # Note: these rows extend the base rows.
-                for base_item_row, ref_item_row in zip(table, ref_table):
-                    # Create a padding column.
-                    base_item_row.append(padding)
-                    base_item_row += ref_item_row
-                     
-                
-            # Collect the column labels, for convenience.
-            # These are display names, so differ from field names.
-            # Since some column entries can be None, this will search
-            # each column to find a non-None and get its label.
-            # Also, to verify, this will ensure all the column labels
-            # match across items.
-            labels = []
-            for col in range(len(table[0])):
-                label_set = set()
-                for row_items in table:
-                    item = row_items[col]
-                    if item != None:
-                        label_set.add(item.display_name)
-                # There should have been just one label found.
-                assert len(label_set) == 1
-                labels.append(label_set.pop())
-
-
-            # Go through the constructed table and find columns that
-            # don't have meaningful data, to prune them.
-            # Note: this comes up when there are Placeholder items present.
-            indices_to_remove = []
-            for index in range(len(labels)):
-
-                # Consider it unused if all items are Placeholder_Items
-                # or None. Leave other items in place, even if they
-                # are valueless, in case this table is ever used for
-                # display and editing. Leave placeholder separators in place.
-                if all(row[index] == None 
-                       or (isinstance(row[index], Placeholder_Item)
-                           and not row[index].is_separator)
-                       for row in table):
-                    indices_to_remove.append(index)
-
-            # Removal done on second pass.
-            # Go from last to first, so the earlier indexes aren't
-            # getting shifted.
-            for index in reversed(indices_to_remove):
-                for row in table:
-                    del(row[index])
-                del(labels[index])
-                       
-            # Insert labels to be the new first row.
-            table.insert(0, labels)
-
-            # Store the table.
-            self.version_table_dict[version] = table
+                    if item.Is_Reference() and name not in self.reference_item_names:
+                        self.reference_item_names.append(name)
+
+        # Go through the refs, in order, bringing their sections up
+        # to date with the current referenced objects.
+        ref_sections = self.version_ref_sections.setdefault(version, {})
+        for ref_name in self.reference_item_names:
+
+            # Collect the referenced objects.
+            ref_objects = [x.Get_Reference(ref_name, version) for x in edit_objects]
+
+            section = ref_sections.get(ref_name)
+            section_changed = None
+            if section != None:
+                section_changed = section.Update_Rows(ref_objects)
+            # Make a new section if needed.
+            if section_changed == None:
+                ref_sections[ref_name] = _Table_Section(ref_objects)
+                section_changed = True
+            if section_changed:
+                changed = True
+
+        if changed or version not in self.version_table_dict:
+            self.version_table_dict[version] = self._Assemble_Table(version)
         return self.version_table_dict[version]
 
 
-    def _Get_Object_Group_Items(self, object_list):
+    def _Assemble_Table(self, version):
         '''
-        From the given list of objects, select the items to be included,
-        and align them so that names match.
-        Returns a list of lists of items, or None entries for padding.
-        All items in a column will be from the same field name.
+        Returns a new row-major table (list of lists, with a first row
+        of labels) from the current sections for the given version.
+        Columns without meaningful data are skipped (this comes up when
+        there are Placeholder items present); padding placeholder
+        separators are placed before each reference section.
         '''
-        # If objects have different field amounts, they will be sync'd
-        # up here to pad them out so that all objects get entries
-        # as necessary (eg. wares with multiple production formulas
-        # may cause other wares to pad with None entries at those
-        # locations).
-
-        # TODO: move this to an arg.
-        skipped_item_names = ['description']
-        
-        # Start by gathering the fields, in some sort of order.
-        # This assumes they are all uniquely named.
-        item_fields = []
-        # The best way to shuffle these together is unclear, but this
-        # will aim to do one object at a time, and do field insertions
-        # when a new field is encountered, placing it after the
-        # prior name (wherever it is).
-        prior_name = None
-        for object in object_list:
-            # Skip None entries.
-            if object == None:
-                continue
-
-            # Work through the object items.
-            for item in object.Get_Items():
-                name = item.name
-
-                # Skip names as requested.
-                if name in skipped_item_names:
-                    continue
-
-                # Skip if the name is known.
-                if name in item_fields:
-                    continue
-
-                # If there is a prior name, look for it.
-                # (Note: this doesn't work so well when there is no
-                # prior but there are existing fields, in which case
-                # matching to the following name might be wanted,
-                # but that case is not currently expected.)
-                if prior_name != None:
-                    # Stick this name after the prior one.
-                    prior_index = item_fields.index(prior_name)
-                    item_fields.insert(prior_index+1, name)
-                else:
-                    # Stick this name at the end.
-                    item_fields.append(name)
-
-                # Update the prior_name for next iteration.
-                prior_name = name
-
-
-        # With the item names sorted out, can now do a pass to fill
-        # in the items.
-        table = []
-        for object in object_list:
-            row = []
-            table.append(row)
-
-            for field in item_fields:
-                if object == None:
-                    item = None
-                else:
-                    # Make sure it comes from the object itself,
-                    # not a ref (to be safe).
-                    item = object.Get_Item(field, allow_refs = False)
-                row.append(item)
-
-        return table
\ No newline at end of file
+        # Set up padding between refs.
+        padding = Placeholder_Item(display_name = '', is_separator = True)
+
+        sections = [self.base_section] + [
+            self.version_ref_sections[version][x] 
+            for x in self.reference_item_names]
+
+        # Gather the kept columns, and their labels.
+        # Leave other items in place, even if they are valueless, in
+        # case this table is ever used for display and editing.
+        num_rows = len(self.base_section.row_objects)
+        columns = []
+        labels = []
+        for index, section in enumerate(sections):
+            # Create a padding column.
+            # Note: these columns extend the base columns.
+            if index > 0:
+                columns.append([padding] * num_rows)
+                labels.append(padding.display_name)
+            for column, label, count in zip(section.columns, section.labels,
+                                            section.column_counts):
+                if count:
+                    columns.append(column)
+                    labels.append(label)
+
+        # Transpose into rows, with labels to be the first row.
+        table = [labels]
+        for row in range(num_rows):
+            table.append([x[row] for x in columns])
+        return table
@@ -5,9 +5,11 @@ _doc_category = Doc_Category_Default('Live_Editor')
 from collections import namedtuple, defaultdict
 import json
 
-from ..Common import Settings, Print, Plugin_Log
+from ..Common import Settings, Print, Plugin_Log, Worker_Pool
 from .Edit_Items import Edit_Item, Display_Item
-from ..File_Manager import Load_File
+from .Edit_Object import Edit_Object
+from .XML_Extract import XML_Extract
+from ..File_Manager import Load_File, File_System
 
 
 from functools import wraps
@@ -127,6 +129,10 @@ class Live_Editor_class:
         patches and similar), but any such discrepencies should be
         harmless as long as the patches_key_dict is checked first.
     '''
+    # Minimum number of objects in a Build_Objects call before the
+    # worker pool is used; smaller builds aren't worth the overhead.
+    min_pool_objects = 64
+
     def __init__(self):
         self.category_objects_dict = defaultdict(dict)
         self.category_objects_builders = {}
@@ -218,6 +224,11 @@ class Live_Editor_class:
         # Note: for robustness against changes to base item names or
         # xpaths, support matching based on one or the other of those
         # terms.
+        # Node id checks need the item's patched value, so limit them to
+        # files and attributes that have node id patches, to leave other
+        # item values unread until needed.
+        node_id_patch_fields = set((x.virtual_path, x.attribute)
+                                   for x in self.patches_node_id_dict.values())
         for item in edit_object.Get_Items():
             # Skip if not an Edit_Item.
             if not isinstance(item, Edit_Item):
@@ -227,15 +238,16 @@ class Live_Editor_class:
             # Do this two ways, first using the item key as a primary check,
             # then do a backup check for node ids (for protection against
             # version changes).
-            node_id_key = '{},{},{}'.format(item.virtual_path, 
-                                            item.xml_node_id, 
-                                            item.attribute)
-
             patch = None
             if item.key in self.patches_key_dict:
                 patch = self.patches_key_dict[item.key]
 
-            elif node_id_key in self.patches_node_id_dict:
+            elif ((item.virtual_path, item.attribute) in node_id_patch_fields
+            and '{},{},{}'.format(item.virtual_path, item.Get_XML_Node_ID(),
+                                  item.attribute) in self.patches_node_id_dict):
+                node_id_key = '{},{},{}'.format(item.virtual_path, 
+                                                item.xml_node_id, 
+                                                item.attribute)
                 Print('Updating a live editor patch format to: "{}"'.format(item.key))
                 patch = self.patches_node_id_dict[node_id_key]
                 # If here, the patch is from an older version of the tool
@@ -251,6 +263,56 @@ class Live_Editor_class:
         return
 
 
+    def Build_Objects(self, build_function, game_file, keys):
+        '''
+        Returns a list of Edit_Objects, one per key, made by calling
+        build_function(game_file, key). 
+
+        For larger builds, this is done in the shared Worker_Pool, passing
+        each call an XML_Extract of the keyed child in place of the
+        full game file, and the items made are sent back as plain specs
+        and rebuilt here, bound to the original file.
+
+        Only keyed file objects (wares) are built this way. Asset objects
+        (ships, weapons, components) are built serially: each pulls items
+        from both its macro file and the matching component file, found
+        through the File_System that workers lack, while item specs bind
+        to a single file; and each asset file holds just one small object,
+        so pool overhead would outweigh the work.
+
+        * build_function
+          - Function taking (game_file, key) and returning an Edit_Object
+            with its items made. Should only read the game_file through
+            Get_Root_Readonly and Get_Xpath_Nodes, and the child it is
+            keyed to. Must be defined at module level, for pickling.
+        * game_file
+          - XML_Keyed_File holding the children to build from.
+        * keys
+          - List of child keys, eg. ware ids.
+        '''
+        pool = None
+        if len(keys) >= self.min_pool_objects:
+            pool = Worker_Pool.Get_Pool()
+        if pool == None:
+            return [build_function(game_file, key) for key in keys]
+
+        # Split into a few chunks per worker, to balance out uneven
+        # objects without too much per-call overhead.
+        chunksize = max(1, len(keys) // (4 * Worker_Pool.num_workers))
+        results = pool.starmap(
+            _Build_Object_Specs, 
+            [(build_function, XML_Extract.From_Keyed_File(game_file, key), key)
+             for key in keys],
+            chunksize)
+
+        edit_objects = []
+        for name, item_specs in results:
+            edit_object = Edit_Object(name)
+            edit_object.Make_Items_From_Specs(game_file.virtual_path, item_specs)
+            edit_objects.append(edit_object)
+        return edit_objects
+
+
     def Get_Object(self, name):
         '''
         Returns an Edit_Object of the given name, or None if not found.
@@ -338,8 +400,22 @@ class Live_Editor_class:
         '''
         For all items, resets their 'current' value to force an update.
         For use when plugins have run since the items were gathered.
+        Edit_Items are skipped when their file's 'current' xml has not
+        changed since they were read (or they were never read).
         '''
+        # Modified stamps of loaded files, by virtual_path.
+        # Files not loaded since a file system reset hold their patched
+        # version, giving a None stamp.
+        path_stamp_dict = {}
         for item in self.Gen_Items():
+            if isinstance(item, Edit_Item):
+                if item.virtual_path not in path_stamp_dict:
+                    stamp = None
+                    if File_System.File_Is_Loaded(item.virtual_path):
+                        stamp = Load_File(item.virtual_path).Get_Modified_Stamp()
+                    path_stamp_dict[item.virtual_path] = stamp
+                if not item.Is_Current_Stale(path_stamp_dict[item.virtual_path]):
+                    continue
             item.Reset_Value('current')
             #-This shouldn't be needed...
             #item.Get_Value('current')
@@ -378,7 +454,7 @@ class Live_Editor_class:
                         xpath        = item.xpath,
                         attribute    = item.attribute,
                         value        = item.Get_Edited_Value(),
-                        xml_node_id  = item.xml_node_id,
+                        xml_node_id  = item.Get_XML_Node_ID(),
                         )                                       
 
             # When not modified, delete any old patch for this item.
@@ -474,8 +550,9 @@ class Live_Editor_class:
             else:
                 # Search for the node, patched version.
                 # Note: this should sync up with what the Edit_Items
-                # use for their xml_node_id.
-                nodes = game_file.Get_Xpath_Nodes(xpath, version = 'patched')
+                # use for their xml_node_id; go through the same file
+                # node index, which keeps the result for the items.
+                nodes = game_file.Find_Nodes(xpath, version = 'patched')
                 # It is possible a node won't be found.
                 if not nodes:
                     xml_node_id = None
@@ -514,6 +591,15 @@ class Live_Editor_class:
             
     
 
+def _Build_Object_Specs(build_function, xml_extract, key):
+    '''
+    Worker process function: builds an Edit_Object from an XML_Extract,
+    returning its (name, item specs).
+    '''
+    edit_object = build_function(xml_extract, key)
+    return edit_object.name, edit_object.Get_Item_Specs(xml_extract)
+
+
 # Global version.
 Live_Editor = Live_Editor_class()
     
@@ -0,0 +1,156 @@
+'''
+Support for building Edit_Objects in worker processes.
+
+Sending a whole XML_File to a worker means pickling all of its roots
+(as xml strings), once per worker, and the worker only needs a small
+part of it. An XML_Extract instead holds just one child node of the
+file root (eg. a single ware), serialized for each file version, and
+acts like the game file for Edit_Object.Make_Items.
+'''
+from ..Documentation import Doc_Category_Default
+_doc_category = Doc_Category_Default('Live_Editor')
+
+from lxml import etree as ET
+from ..File_Manager import XML_Diff
+
+# Versions held by game files, that items read from.
+_file_versions = ['vanilla','patched','current']
+
+
+class XML_Extract:
+    '''
+    Compact, picklable copy of one child node of an xml game file,
+    for each of its versions. Supports the read functions used when
+    making items: Get_Root_Readonly and Get_Xpath_Nodes, where roots
+    will hold only the extracted child, and Find_Nodes.
+
+    Attributes:
+    * virtual_path
+      - String, virtual path of the source game file.
+    * root_tag
+      - String, tag of the source file root.
+    * version_data_dict
+      - Dict, keyed by version, holding a tuple of (xml bytes, node id),
+        or None if the node is missing from that version.
+      - Versions with identical nodes share the same tuple, so that
+        pickling only includes it once.
+    * version_root_dict
+      - Dict, keyed by version, of the rebuilt roots; filled in
+        on first use and not pickled.
+    * version_node_id_dict
+      - Dict, keyed by version, of node id lookup dicts for the
+        rebuilt roots; filled in on first use and not pickled.
+    * modified_stamp
+      - The Get_Modified_Stamp result of the source file.
+    '''
+    def __init__(self, game_file, version_node_dict):
+        '''
+        * game_file
+          - The XML_File the nodes are taken from.
+        * version_node_dict
+          - Dict, keyed by version, holding the child node of that
+            version's root, or None if missing.
+        '''
+        self.virtual_path = game_file.virtual_path
+        self.root_tag = game_file.Get_Root_Readonly().tag
+        self.modified_stamp = game_file.Get_Modified_Stamp()
+        self.version_data_dict = {}
+        self.version_root_dict = {}
+        self.version_node_id_dict = {}
+
+        for version in _file_versions:
+            node = version_node_dict.get(version)
+            if node == None:
+                self.version_data_dict[version] = None
+                continue
+            # Node ids are held in tails; the top one is split off
+            # since a top level tail doesn't parse.
+            data = (ET.tostring(node, with_tail = False), node.tail)
+            # Share with an earlier version if the same.
+            for prior_data in self.version_data_dict.values():
+                if prior_data == data:
+                    data = prior_data
+                    break
+            self.version_data_dict[version] = data
+        return
+
+
+    @staticmethod
+    def From_Keyed_File(game_file, key):
+        '''
+        Returns an XML_Extract of the child with the given key from an
+        XML_Keyed_File, eg. a ware by id.
+        '''
+        return XML_Extract(game_file, {
+            version : game_file.Get_Keyed_Child(key, version)
+            for version in _file_versions})
+
+
+    def __getstate__(self):
+        # Skip rebuilt roots, which are easy to remake.
+        state = dict(self.__dict__)
+        state['version_root_dict'] = {}
+        state['version_node_id_dict'] = {}
+        return state
+
+
+    def Get_Modified_Stamp(self):
+        '''
+        Returns the modified stamp of the source file when extracted.
+        '''
+        return self.modified_stamp
+
+
+    def Get_Root_Readonly(self, version = None):
+        '''
+        Returns a root Element holding just the extracted node
+        (if present) for the given version, defaulting to 'current'.
+        '''
+        if not version:
+            version = 'current'
+        root = self.version_root_dict.get(version)
+        if root == None:
+            root = ET.Element(self.root_tag)
+            data = self.version_data_dict[version]
+            if data != None:
+                xml_bytes, node_id = data
+                node = ET.fromstring(xml_bytes)
+                node.tail = node_id
+                root.append(node)
+            self.version_root_dict[version] = root
+        return root
+
+
+    def Get_Node(self, version = None):
+        '''
+        Returns the extracted node for the given version, or None if
+        it is missing.
+        '''
+        root = self.Get_Root_Readonly(version)
+        return root[0] if len(root) else None
+
+
+    def Get_Xpath_Nodes(self, xpath, version = None):
+        '''
+        Returns a list of nodes found using the given xpath on the given
+        version of the root, as XML_File.Get_Xpath_Nodes.
+        '''
+        return self.Get_Root_Readonly(version).xpath(xpath)
+
+
+    def Find_Nodes(self, xpath, node_id = None, version = None):
+        '''
+        Returns a list of nodes for the given version, looked up by
+        node id if given and found, else by xpath, as XML_File.Find_Nodes.
+        '''
+        if not version:
+            version = 'current'
+        if node_id != None:
+            node_id_dict = self.version_node_id_dict.get(version)
+            if node_id_dict == None:
+                node_id_dict = self.version_node_id_dict[version] = (
+                    XML_Diff.Make_Node_ID_Dict(self.Get_Root_Readonly(version)))
+            node = node_id_dict.get(node_id)
+            if node != None:
+                return [node]
+        return self.Get_Xpath_Nodes(xpath, version)
@@ -9,4 +9,5 @@ from .Live_Editor_class import Live_Editor_Tree_View_Builder
 from .Edit_Items import Edit_Item, Display_Item, Placeholder_Item
 from .Edit_Object import Edit_Object, Edit_Item_Macro, Display_Item_Macro, Item_Group_Macro
 from .Edit_Tables import Edit_Table, Edit_Table_Group
-from .Edit_Tree_View import Edit_Tree_View, Object_View
\ No newline at end of file
+from .Edit_Tree_View import Edit_Tree_View, Object_View
+from .XML_Extract import XML_Extract
\ No newline at end of file
@@ -203,6 +203,7 @@ from .Common import home_path
 from .Common import Change_Log, Plugin_Log, Print
 from .Common import Get_Version
 from .Common import Settings
+from .Common import Worker_Pool
 from .Common import Analysis_Wrapper
 from .Common import Transform_Wrapper
 from .Common import Utility_Wrapper
@@ -100,6 +100,8 @@ def Create_Objects_From_Asset_Files(
     '''
     Returns a list of Edit_Objects for the given asset style game_file,
     applying a set of custom Item building macros.
+    Runs serially; see Live_Editor.Build_Objects for why these are not
+    sent to the worker pool.
     '''
     object_list = []
     for game_file in game_files:
@@ -8,7 +8,6 @@ from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('Live_Editor')
 
 
-from multiprocessing import Pool, cpu_count
 import time
 
 from Framework import File_System, Load_File, Print
@@ -29,103 +28,81 @@ def _Build_Ware_Objects():
     #t_file = Load_File('t/0001-L044.xml')
     # Look up the ware file.
     wares_file = Load_File('libraries/wares.xml')
-    xml_root = wares_file.Get_Root_Readonly()
     
-    # Get the ware nodes; only first level children.
-    ware_nodes = wares_file.Get_Root_Readonly().findall('./ware')
+    # Get the ware ids; only first level children.
+    ware_ids = [x.get('id') for x in 
+                wares_file.Get_Root_Readonly().findall('./ware')]
         
     start_time = time.time()
 
-    # TODO: maybe condition this on if Settings.disable_threading is
-    # set or not.
-    if 1:
-        '''
-        Try out multiprocessing to speed this up.
-
-        Observations, letting python split up ware nodes"
-        - Time goes from ~20 to ~30 seconds with 1 worker.
-        - Down to ~10 seconds with 6 workers; not much gain.
-
-        To possibly reduce data copy overhead, split up the ware nodes
-        manually into lists, and send a single full list to each worker.
-        - Down to 7-8 seconds from doing this.
-        - Still not great, but more than 2x speedup, so it's something.
-        - Note: for different process counts, best was at system
-          max threads, with higher counts not losing much time.
-        - Can let the Pool handle the thread counting automatically,
-          and it does get close, though that doesn't help with picking
-          the work unit size.
-        - Update: after making production nodes conditional, normal
-          runs went 20 to ~4.5 seconds, and this went down to ~2.5.
-        
-        Later observations:
-        - The node ids tagged onto xml element tails seem to be
-          transferred okay through pickling, except the one on the
-          root node that has to be pruned.
-
-        - The file system appears to get completely replicated for
-          every thread, such that the wares file gets node ids
-          applied once globally and once per thread.
-          The global node ids are higher than the threads since they
-          are offset somewhat by any prior loaded xml, while the threads
-          all start from 0.
-
-        - This node id discrepency means the loaded elements mess up
-          the live editor patch matching, where editing maja snails
-          ends up changing marines.
-
-        - How can the stupid python threading be prevented from making
-          such a dumb complete system copy that doesn't even catch
-          everything? Eg. it should at least be copying the original
-          node ids, not starting from scratch.
-          - It seems like it goes:
-            - Item gets created with paths
-            - Item runs value init
-            - Value init calls Load_File, expecting it to be a quick
-              dict lookup.
-            - Multiprocessing barfs on itself and makes a new copy
-              of the file system that does not have the wanted
-              file loaded, and has to reload it from disk (with
-              diff patching).
-
-        - Workaround: change how object building works, such that
-          items are linked directly to their source game file and
-          do not have to do a file system load.
-          Further, tweak the pickler to keep the tag on the top
-          element copied.
-          Result: things seem to work okay now.
-        '''
-
-        # Pick the process runs needed to do all the work.
-        # Leave 1 thread free for system stuff.
-        num_processes = max(1, cpu_count() -1)
-        max_nodes_per_worker = len(ware_nodes) // num_processes +1
-        slices = []
-        start = 0
-        while start < len(ware_nodes):
-            # Compute the end point, limiting to the last node.
-            end = start + max_nodes_per_worker
-            if end > len(ware_nodes):
-                end = len(ware_nodes)
-            # Get the slice and store it.
-            slices.append( ware_nodes[start : end] )
-            # Update the start.
-            start = end
-
-        # Use a starmap for this, since it needs to pass both the
-        # wares file and the ware node. Starmap will splat out
-        # the iterables.
-        inputs = [(slice, wares_file) for slice in slices]
+    '''
+    Try out multiprocessing to speed this up.
+
+    Observations, letting python split up ware nodes"
+    - Time goes from ~20 to ~30 seconds with 1 worker.
+    - Down to ~10 seconds with 6 workers; not much gain.
+
+    To possibly reduce data copy overhead, split up the ware nodes
+    manually into lists, and send a single full list to each worker.
+    - Down to 7-8 seconds from doing this.
+    - Still not great, but more than 2x speedup, so it's something.
+    - Note: for different process counts, best was at system
+      max threads, with higher counts not losing much time.
+    - Can let the Pool handle the thread counting automatically,
+      and it does get close, though that doesn't help with picking
+      the work unit size.
+    - Update: after making production nodes conditional, normal
+      runs went 20 to ~4.5 seconds, and this went down to ~2.5.
+    
+    Later observations:
+    - The node ids tagged onto xml element tails seem to be
+      transferred okay through pickling, except the one on the
+      root node that has to be pruned.
+
+    - The file system appears to get completely replicated for
+      every thread, such that the wares file gets node ids
+      applied once globally and once per thread.
+      The global node ids are higher than the threads since they
+      are offset somewhat by any prior loaded xml, while the threads
+      all start from 0.
+
+    - This node id discrepency means the loaded elements mess up
+      the live editor patch matching, where editing maja snails
+      ends up changing marines.
+
+    - How can the stupid python threading be prevented from making
+      such a dumb complete system copy that doesn't even catch
+      everything? Eg. it should at least be copying the original
+      node ids, not starting from scratch.
+      - It seems like it goes:
+        - Item gets created with paths
+        - Item runs value init
+        - Value init calls Load_File, expecting it to be a quick
+          dict lookup.
+        - Multiprocessing barfs on itself and makes a new copy
+          of the file system that does not have the wanted
+          file loaded, and has to reload it from disk (with
+          diff patching).
+
+    - Workaround: change how object building works, such that
+      items are linked directly to their source game file and
+      do not have to do a file system load.
+      Further, tweak the pickler to keep the tag on the top
+      element copied.
+      Result: things seem to work okay now.
+
+    - Update: rather than pickling the full wares file (all three
+      roots) for every worker, workers now get an XML_Extract of
+      just their ware, and send back plain item specs, through the
+      Live_Editor worker pool shared with other categories.
+      The file system is never touched in the workers, and node ids
+      come across unchanged in the extracted tails.
+    '''
 
-        pool = Pool()#processes = num_processes)
-        ware_edit_objects = sum(pool.starmap(
-            _Create_Objects, 
-            inputs,
-            ), [])
-        
-    else:
-        # Single thread style.
-        ware_edit_objects = _Create_Objects(ware_nodes, wares_file)
+    # Multiprocessing is handled by the Live_Editor, unless
+    # Settings.disable_threading is set.
+    ware_edit_objects = Live_Editor.Build_Objects(
+        _Create_Object, wares_file, ware_ids)
             
     Print('Ware Edit_Objects creation took {:0.2f} seconds'.format(
         time.time() - start_time))
@@ -133,42 +110,40 @@ def _Build_Ware_Objects():
     return ware_edit_objects
 
 
-def _Create_Objects(ware_nodes, wares_file):
+def _Create_Object(wares_file, name):
     '''
-    Returns a list of objects for the given ware nodes.
+    Returns an Edit_Object for the ware of the given id.
+    The wares_file may be an XML_Extract holding just this ware.
     '''
-    ret_list = []
-    for ware_node in ware_nodes:
-        # Use the id attribute as the base name.
-        name = ware_node.get('id')
-        assert name != None
-        ware_edit_object = Edit_Object(name)
-        
-        # Do an xpath partial replacement to fill in the path
-        # to the node from the file base.
-        xpath_prefix = './ware[@id="{}"]'.format(name)
-                    
-        # Find production nodes, get their macros (can be multiple).
-        # Note: doing this conditionally instead of using pre-created
-        # macros reduced run time from 20 to 4 seconds. Most nodes
-        # do not have the full 3 production subnodes, nor 3 wares
-        # per production.
-        extra_macros = []
-        for prod_index, prod_node in enumerate(ware_node.findall('./production')):
-            # Offset indices by 1, for display names and for xpaths.
-            extra_macros += Get_Production_Macros(xpath_prefix, prod_index +1)            
-            # Loop over wares.
-            for ware_index, prod_ware_node in enumerate(prod_node.findall('./primary/ware')):
-                extra_macros += Get_Production_Ware_Macros(xpath_prefix, prod_index +1, ware_index +1)
-
-        # Fill in the edit items from macros.
-        ware_edit_object.Make_Items(
-            wares_file, 
-            ware_item_macros + extra_macros,
-            xpath_replacements = {'PREFIX': xpath_prefix}
-            )
-        ret_list.append(ware_edit_object)
-    return ret_list
+    # Use the id attribute as the base name.
+    assert name != None
+    ware_edit_object = Edit_Object(name)
+    
+    # Do an xpath partial replacement to fill in the path
+    # to the node from the file base.
+    xpath_prefix = './ware[@id="{}"]'.format(name)
+    ware_node = wares_file.Get_Xpath_Nodes(xpath_prefix)[0]
+                
+    # Find production nodes, get their macros (can be multiple).
+    # Note: doing this conditionally instead of using pre-created
+    # macros reduced run time from 20 to 4 seconds. Most nodes
+    # do not have the full 3 production subnodes, nor 3 wares
+    # per production.
+    extra_macros = []
+    for prod_index, prod_node in enumerate(ware_node.findall('./production')):
+        # Offset indices by 1, for display names and for xpaths.
+        extra_macros += Get_Production_Macros(xpath_prefix, prod_index +1)            
+        # Loop over wares.
+        for ware_index, prod_ware_node in enumerate(prod_node.findall('./primary/ware')):
+            extra_macros += Get_Production_Ware_Macros(xpath_prefix, prod_index +1, ware_index +1)
+
+    # Fill in the edit items from macros.
+    ware_edit_object.Make_Items(
+        wares_file, 
+        ware_item_macros + extra_macros,
+        xpath_replacements = {'PREFIX': xpath_prefix}
+        )
+    return ware_edit_object
 
 
 
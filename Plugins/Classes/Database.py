@@ -3,11 +3,15 @@ from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('Classes')
 
 from Framework import Load_File, File_System, Plugin_Log, File_Manager
+from Framework import Settings, Print
+from Framework.File_Manager import XML_Diff
+from Framework.File_Manager.File_Types import Estimate_XML_Bytes
+from Framework.File_Manager.Path_Index import Path_Index, Has_Wildcards
 
 from collections import defaultdict
+import weakref
 from lxml import etree
 from lxml.etree import Element
-import fnmatch
 
 
 from .Macro import *
@@ -46,6 +50,92 @@ class_name_to_macro = {
     'mine'    : Mine,
     }
 
+class _File_Snapshot:
+    '''
+    Macros and components parsed from the readonly xml of one game file,
+    kept as templates across Databases (normally one per transform),
+    so that later Databases can clone them instead of reparsing.
+    Templates are never handed out or edited themselves.
+
+    * root
+      - The readonly xml root the templates were parsed from. The
+        snapshot is stale once the game file root differs, eg. after
+        an Update_Root.
+    * templates
+      - List of Macros and Components, in xml order, with no database.
+    '''
+    def __init__(self, root, objects):
+        self.root = root
+        self.templates = [_Clone_Object(x, None) for x in objects]
+        return
+
+
+def _Clone_Object(object, database):
+    '''
+    Returns a copy of a Macro or Component, and its Connections, linked
+    to the given database. Lists, sets, and dicts attributes are copied,
+    so that lazily filled links (eg. parent_conns) are not shared.
+    Xml nodes are shared.
+    '''
+    # Note: copy.copy is notably slower than this direct copy.
+    clone = _Copy_Instance(object)
+    clone.database = database
+    for key, conn in clone.conns.items():
+        conn = clone.conns[key] = _Copy_Instance(conn)
+        conn.parent = clone
+    return clone
+
+
+def _Copy_Instance(object):
+    '''
+    Returns a shallow copy of an instance, with any list, set, or dict
+    attributes also shallow copied.
+    '''
+    clone = object.__class__.__new__(object.__class__)
+    clone.__dict__ = {
+        key : value.copy() if isinstance(value, (list, set, dict)) else value
+        for key, value in object.__dict__.items()}
+    return clone
+
+
+class _Node_Remap:
+    '''
+    Maps nodes of a readonly xml root to the matching nodes of a
+    writable copy (from Get_Root), for use by Replace_XML. Lookups use
+    the node ids held in tails, indexed once for the copy. Nodes
+    without a unique id (eg. added or copied by an earlier transform)
+    fall back to matching by tree position, indexed on first need.
+
+    * orig_root, new_root
+      - The readonly root and its writable copy.
+    * node_id_dict
+      - Dict of new_root nodes keyed by node id.
+    * position_dict
+      - Dict matching orig_root nodes to new_root nodes by iteration
+        order, or None until needed.
+    '''
+    def __init__(self, orig_root, new_root):
+        self.orig_root = orig_root
+        self.new_root = new_root
+        self.node_id_dict = XML_Diff.Make_Node_ID_Dict(new_root)
+        self.position_dict = None
+        return
+
+    def __getitem__(self, node):
+        new_node = self.node_id_dict.get(node.tail) if node.tail else None
+        if new_node == None:
+            if self.position_dict == None:
+                self.position_dict = {x:y for x,y in zip(
+                    self.orig_root.iter(), self.new_root.iter())}
+            new_node = self.position_dict[node]
+        return new_node
+
+
+# Snapshots of parsed game files, keyed by Game_File. Files dropped
+# by the file system (eg. on a reset) are dropped from here.
+_file_snapshots = weakref.WeakKeyDictionary()
+
+
 # TODO: directly track connections.
 class Database:
     '''
@@ -54,11 +144,20 @@ class Database:
     update xml links properly. This focuses on macros, which will look
     up their own components dynamically. Components are read only for now.
 
+    Parsed objects of each game file are snapshotted, and later Databases
+    start from clean copies of them while the file's xml root is
+    unchanged, to avoid reparsing between transforms.
+
     * gamefile_roots
       - Dict matching Game_Files to their xml root nodes (to be edited).
     * writable_gamefiles
-      - List of Game_Files that have been set as writable, and have a
+      - Set of Game_Files that have been set as writable, and have a
         non-readonly root stored in gamefile_roots.
+    * writable_copy_stats
+      - Dict with running totals of xml copied for writable roots,
+        with 'files', 'nodes', and estimated 'bytes'. Nodes and bytes
+        are only counted when Settings.profile is set, and are
+        printed by Update_XML.
     * class_macros
       - Dict, keyed by macro class (eg. 'engine'), holding a subdict of
         macros keyed by name.
@@ -75,19 +174,32 @@ class Database:
       - Used to control which game files will have their xml updated.
     * gamefile_objects_dict
       - Dict pairing Game_File keys to lists of objects sourced from them.
+    * macro_name_index, component_name_index
+      - Path_Index objects holding the keys of macros and components,
+        for fast wildcard name matching.
+    * use_snapshots
+      - Bool, if True (default) then objects are cloned from file
+        snapshots when available.
     '''
-    def __init__(self):
+    def __init__(self, use_snapshots = True):
+        self.use_snapshots = use_snapshots
         self.gamefile_roots = {}
-        self.writable_gamefiles = []
+        self.writable_gamefiles = set()
+        self.writable_copy_stats = {'files' : 0, 'nodes' : 0, 'bytes' : 0}
         self.macros = {}
         self.class_macros = defaultdict(dict)
         self.components = {}
         self.class_components = defaultdict(dict)
         self.object_gamefile_dict = {}
         self.gamefile_objects_dict = defaultdict(list)
+        self.macro_name_index = Path_Index()
+        self.component_name_index = Path_Index()
 
         self._get_macros_cache = set()
         self._get_components_cache = set()
+        # Filter results by lowercase pattern, cleared as objects are added.
+        self._macro_pattern_names = {}
+        self._component_pattern_names = {}
 
         # TODO: the below as needed; for now let macro classes fill refs
         # as needed.
@@ -122,41 +234,56 @@ class Database:
         # Record the root.
         self.gamefile_roots[game_file] = xml_root
 
-        # Search it.
-        for macro in xml_root.xpath("./macro"):
-            class_name = macro.get('class')
-            # Skip unsupported classes for now. TODO: maybe print a warning.
-            if class_name not in class_name_to_macro:
-                continue
-            object = class_name_to_macro[class_name](macro, self)
-
-            self.class_macros[class_name][object.name] = object
-            self.macros[object.name.lower()] = object
-            self.object_gamefile_dict[object] = game_file
-            self.gamefile_objects_dict[game_file].append(object)
-
-        for component in xml_root.xpath("./component"):
-            class_name = component.get('class')
-            object = Component(component, self)
-                
-            self.class_components[class_name][object.name] = object
-            self.components[object.name.lower()] = object
+        # Reuse a snapshot of this root if available.
+        snapshot = _file_snapshots.get(game_file) if self.use_snapshots else None
+        if snapshot != None and snapshot.root is xml_root:
+            objects = [_Clone_Object(x, self) for x in snapshot.templates]
+
+        else:
+            # Search it.
+            objects = []
+            for macro in xml_root.xpath("./macro"):
+                class_name = macro.get('class')
+                # Skip unsupported classes for now. TODO: maybe print a warning.
+                if class_name not in class_name_to_macro:
+                    continue
+                objects.append(class_name_to_macro[class_name](macro, self))
+
+            for component in xml_root.xpath("./component"):
+                objects.append(Component(component, self))
+
+            if self.use_snapshots:
+                _file_snapshots[game_file] = _File_Snapshot(xml_root, objects)
+
+        for object in objects:
+            if isinstance(object, Component):
+                self.class_components[object.class_name][object.name] = object
+                self.components[object.name.lower()] = object
+                self.component_name_index.Add(object.name.lower())
+            else:
+                self.class_macros[object.class_name][object.name] = object
+                self.macros[object.name.lower()] = object
+                self.macro_name_index.Add(object.name.lower())
             self.object_gamefile_dict[object] = game_file
             self.gamefile_objects_dict[game_file].append(object)
 
+        if objects:
+            self._macro_pattern_names.clear()
+            self._component_pattern_names.clear()
         return
 
     # TODO: add support for connections.
     def Set_Object_Writable(self, object):
         '''
         Sets a macro or component's game_file xml as writable.
+        The writable root is made once per file.
         '''
         game_file = self.object_gamefile_dict[object]
 
         # Skip if already writable.
         if game_file in self.writable_gamefiles:
             return
-        self.writable_gamefiles.append(game_file)
+        self.writable_gamefiles.add(game_file)
 
         # Get a new xml root for this game file.
         orig_root = self.gamefile_roots[game_file]
@@ -167,12 +294,20 @@ class Database:
         # xml, for macros, components, and nested connections.
 
         # Start by maching original nodes to writable nodes.
-        replacements = {x:y for x,y in zip(orig_root.iter(), new_root.iter())}
+        # -Removed; zipping whole trees is slow for files with many
+        #  assets; match by node id instead.
+        #replacements = {x:y for x,y in zip(orig_root.iter(), new_root.iter())}
+        replacements = _Node_Remap(orig_root, new_root)
 
         # Update all macros and components (since the given object may
         # just be one of several sourced from the file).
         for other_object in self.gamefile_objects_dict[game_file]:
-            object.Replace_XML(replacements)
+            other_object.Replace_XML(replacements)
+
+        self.writable_copy_stats['files'] += 1
+        if Settings.profile:
+            self.writable_copy_stats['nodes'] += sum(1 for _ in new_root.iter())
+            self.writable_copy_stats['bytes'] += Estimate_XML_Bytes(new_root)
         return
 
 
@@ -206,6 +341,12 @@ class Database:
         * class_names
           - Optional list of class names to include.
         '''
+        # Exact names that are already loaded (eg. refs between macros)
+        # can skip the index lookups.
+        key = pattern.lower()
+        if key in self.macros and not Has_Wildcards(key):
+            self._get_macros_cache.add(pattern)
+
         # Cache patterns seen, to skip index lookup.
         if pattern not in self._get_macros_cache:
             self._get_macros_cache.add(pattern)
@@ -220,7 +361,8 @@ class Database:
                 self.Load_File(game_file)
 
         # Now pick out the actual macros.
-        macro_names = fnmatch.filter(self.macros.keys(), pattern.lower())
+        macro_names = self._Filter_Names(
+            self.macros, self.macro_name_index, self._macro_pattern_names, key)
         # Filter for wanted classes, if a list was given.
         return [self.macros[x] for x in macro_names 
                 if ((not class_names or self.macros[x].class_name in class_names) 
@@ -251,6 +393,11 @@ class Database:
         '''
         Returns a list of Components with names matching the given pattern.
         '''
+        # Exact names that are already loaded can skip the index lookups.
+        key = pattern.lower()
+        if key in self.components and not Has_Wildcards(key):
+            self._get_components_cache.add(pattern)
+
         # Cache patterns seen, to skip index lookup.
         if pattern not in self._get_components_cache:
             self._get_components_cache.add(pattern)
@@ -265,10 +412,27 @@ class Database:
                 self.Load_File(game_file)
 
         # Now pick out the actual components.
-        component_names = fnmatch.filter(self.components.keys(), pattern.lower())
+        component_names = self._Filter_Names(
+            self.components, self.component_name_index, 
+            self._component_pattern_names, key)
         return [self.components[x] for x in component_names]
 
 
+    def _Filter_Names(self, object_dict, name_index, pattern_names, pattern):
+        '''
+        Returns a list of names from the object_dict matching the given
+        lowercase pattern, going directly to the dict for exact names,
+        else filtering the name_index, with results cached in the
+        pattern_names dict.
+        '''
+        if not Has_Wildcards(pattern):
+            return [pattern] if pattern in object_dict else []
+        names = pattern_names.get(pattern)
+        if names == None:
+            names = pattern_names[pattern] = name_index.Filter(pattern)
+        return names
+
+
 
     def Update_XML(self):
         '''
@@ -287,4 +451,10 @@ class Database:
             # Verify this was set as writable.
             assert game_file in self.writable_gamefiles
             game_file.Update_Root(self.gamefile_roots[game_file])
+
+        if Settings.profile and self.writable_copy_stats['files']:
+            Print('Database writable xml copies: {} files, {} nodes, {:.2f} MB'.format(
+                self.writable_copy_stats['files'],
+                self.writable_copy_stats['nodes'],
+                self.writable_copy_stats['bytes'] / 1e6))
         return
\ No newline at end of file
@@ -2,7 +2,6 @@
 from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('Classes')
 
-from copy import copy
 import math
 
 __all__ = [
@@ -69,43 +68,49 @@ class Position:
         Update this position to match a given other position.
         The xml_node link is retained.
         '''
-        for attr in ['x','y','z']:
-            setattr(self, attr, getattr(other, attr))
+        self.x = other.x
+        self.y = other.y
+        self.z = other.z
         return
+
+    def Copy_With(self, x, y, z):
+        '''
+        Returns a shallow copy of this position (keeping the xml_node
+        and any subclass fields), with new coordinates.
+        '''
+        # Equivalent to copy(), but skips its generic dispatch, since
+        # this is called heavily during map scaling.
+        ret_pos = self.__class__.__new__(self.__class__)
+        ret_pos.__dict__.update(self.__dict__)
+        ret_pos.x = x
+        ret_pos.y = y
+        ret_pos.z = z
+        return ret_pos
     
     def __add__(self, other):
         assert isinstance(other, Position)
-        ret_pos = copy(self)
-        for attr in ['x','y','z']:
-            setattr(ret_pos, attr, getattr(self, attr) + getattr(other, attr))
-        return ret_pos
+        return self.Copy_With(self.x + other.x, self.y + other.y, self.z + other.z)
 
     def __sub__(self, other):
         assert isinstance(other, Position)
-        ret_pos = copy(self)
-        for attr in ['x','y','z']:
-            setattr(ret_pos, attr, getattr(self, attr) - getattr(other, attr))
-        return ret_pos
+        return self.Copy_With(self.x - other.x, self.y - other.y, self.z - other.z)
         
     def __mul__(self, other):
         assert isinstance(other, (int, float))
-        ret_pos = copy(self)
-        for attr in ['x','y','z']:
-            setattr(ret_pos, attr, getattr(self, attr) * other)
-        return ret_pos
+        return self.Copy_With(self.x * other, self.y * other, self.z * other)
     
     def __truediv__(self, other):
         assert isinstance(other, (int, float))
-        ret_pos = copy(self)
-        for attr in ['x','y','z']:
-            setattr(ret_pos, attr, getattr(self, attr) / other)
-        return ret_pos
+        return self.Copy_With(self.x / other, self.y / other, self.z / other)
     
+    # Note: squares below use multiplication and math.sqrt rather than
+    # "**", since those are exactly rounded and match the vectorized
+    # versions in map scaling.
     def Get_Distance(self, other = None):
         '''
         Returns the distance to 0,0,0.
         '''
-        return math.sqrt((self.x ** 2) + (self.y ** 2) + (self.z ** 2))
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
     
     def Get_Distance_To(self, other):
         '''
@@ -122,16 +127,19 @@ class Position:
         '''
         # This is checked often, so will use some fancier logic to fast
         # fail on distance objects.
-        squared_sum = 0
-        for attr in ['x','y','z']:
-            offset = abs(getattr(self, attr) - getattr(other, attr))
-            # If any single dim is greater than the distance, then this
-            # will always be False.
-            if offset > distance:
-                return False
-            squared_sum += offset ** 2
+        # If any single dim is greater than the distance, then this
+        # will always be False.
+        dx = abs(self.x - other.x)
+        if dx > distance:
+            return False
+        dy = abs(self.y - other.y)
+        if dy > distance:
+            return False
+        dz = abs(self.z - other.z)
+        if dz > distance:
+            return False
 
-        this_distance = squared_sum ** 0.5
+        this_distance = math.sqrt(dx * dx + dy * dy + dz * dz)
         if this_distance <= distance:
             return True
         return False
@@ -6,6 +6,7 @@ from PyQt5 import QtWidgets, QtCore, QtGui
 #from .Edit_Item import Widget_Edit_Item
 from PyQt5.QtGui import QStandardItemModel, QStandardItem, QBrush
 from .Q_Item_Group import Q_Item_Group
+from Framework.Live_Editor_Components import Display_Item
 
 class Edit_Table_Model(QStandardItemModel):
     '''
@@ -25,6 +26,12 @@ class Edit_Table_Model(QStandardItemModel):
       - The Object_View currently displayed.
     * current_edit_table
       - The Edit_Table currently displayed, or None if not in group_mode.
+    * drawn_table
+      - List of lists of items (or None) displayed in group mode, after
+        any flip and header removal, or None in object mode.
+      - Used on redraws of the same table to only replace changed cells.
+    * drawn_headers
+      - Tuple of (horizontal, vertical) header lists for drawn_table.
     * button_group
       - QButtonGroup holding the mode buttons; used to create
         a single changed signal.
@@ -40,6 +47,8 @@ class Edit_Table_Model(QStandardItemModel):
         self.window = window
         self.current_object_view = None
         self.current_edit_table = None
+        self.drawn_table = None
+        self.drawn_headers = None
         self.qt_view = qt_view
         
         # Set the column default headers.
@@ -165,6 +174,8 @@ class Edit_Table_Model(QStandardItemModel):
 
             # Clear any old edit table.
             self.current_edit_table = None
+            self.drawn_table = None
+            self.drawn_headers = None
 
             # Set this to None while drawing, to prevent spurious redraws.
             self.current_object_view = None
@@ -267,15 +278,16 @@ class Edit_Table_Model(QStandardItemModel):
                     self.current_object_view = object_view
                     return
 
+            # Redraws of the same table (eg. after a reference edit)
+            # can update just the changed cells, checked below.
+            same_table = edit_table is self.current_edit_table
+
             # Update the table ref.
             self.current_edit_table = edit_table
 
             # Set object to None while drawing, to prevent spurious redraws.
             self.current_object_view = None
 
-            # Release prior q items safely.
-            self.Release_Items()
-
 
             # The table contains a row with column labels, and then
             # rows with the items (one object per row).
@@ -368,7 +380,26 @@ class Edit_Table_Model(QStandardItemModel):
                                         for x in table[0]]
                 else:
                     horizontal_headers = ['']*num_cols
-                
+
+
+            # If the shape and headers are unchanged from the drawn
+            # table, swap out just the cells with new items.
+            headers = (horizontal_headers, vertical_headers)
+            if (same_table and self.drawn_table != None
+            and headers == self.drawn_headers
+            and len(table) == len(self.drawn_table)
+            and all(len(x) == len(y) for x,y in zip(table, self.drawn_table))):
+                self.Update_Changed_Cells(table, version)
+                self.drawn_table = table
+                self.Update_Column_Visibilities()
+                self.current_object_view = object_view
+                self.Resize_Cells()
+                return
+
+            # Release prior q items safely.
+            self.Release_Items()
+            self.drawn_table = table
+            self.drawn_headers = headers
 
             # Resize this model.
             self.setRowCount   (num_rows)
@@ -439,6 +470,37 @@ class Edit_Table_Model(QStandardItemModel):
         return
 
     
+    def Update_Changed_Cells(self, table, version):
+        '''
+        Updates a group mode display to the given table, which should
+        be shaped like the drawn_table, replacing only the cells whose
+        items changed. Display_Items in unchanged cells are refreshed,
+        since their values may follow other items.
+        '''
+        for row, (row_items, old_row_items) in enumerate(zip(table, self.drawn_table)):
+            for col, (item, old_item) in enumerate(zip(row_items, old_row_items)):
+
+                if item is old_item:
+                    if item != None and item.q_item_group and isinstance(item, Display_Item):
+                        item.q_item_group.Update(version)
+                    continue
+
+                # Detach the old q item, so it can be reused elsewhere.
+                q_item = self.item(row, col)
+                if q_item != None and hasattr(q_item, 'q_item_group'):
+                    self.takeItem(row, col)
+
+                if item == None:
+                    self.setItem(row, col, QStandardItem())
+                    continue
+
+                # If the item has no q_item_group, make one.
+                if not item.q_item_group:
+                    item.q_item_group = Q_Item_Group(item)
+                self.setItem(row, col, item.q_item_group.New_Q_Item(version))
+        return
+
+
     def Redraw(self):
         '''
         Redraw this model from the current_object_view.  To be used
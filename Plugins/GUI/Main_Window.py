@@ -28,6 +28,7 @@ from Framework import Print
 from Framework import Change_Log
 from Framework import Live_Editor
 from Framework import File_System
+from Framework import Worker_Pool
 
 from .Worker_Thread_Handler import Worker_Thread_Handler
 from .Shared import Styles, Set_Icon
@@ -1020,6 +1021,8 @@ class GUI_Main_Window(qt_base_class, generated_class):
         except AssertionError:
             # Ignore for now.
             pass
+        # Stop any worker processes.
+        Worker_Pool.Close()
 
         super().close()
         return True
@@ -0,0 +1,151 @@
+'''
+Index of virtual paths for the VFS window, sorted by file suffix and
+folder. This is built in a worker thread, so that the gui only has
+to look up the folders it is displaying.
+'''
+from Framework.Documentation import Doc_Category_Default
+_doc_category = Doc_Category_Default('GUI')
+
+from time import time
+from Framework import File_System
+
+
+def _Get_Parent_Path(virtual_path):
+    'Returns the parent folder path of a virtual_path, or "" at the top.'
+    return virtual_path.rsplit('/',1)[0] if '/' in virtual_path else ''
+
+
+class VFS_Folder_Index:
+    '''
+    Folder layout of a group of virtual paths.
+
+    Attributes:
+    * folder_dict
+      - Dict, keyed by folder virtual_path (with '' for the top),
+        holding a tuple of (list of child folder paths, list of
+        file paths) for that folder.
+    * path_set
+      - Set of all file virtual_paths in this group.
+    '''
+    def __init__(self, virtual_paths):
+        self.folder_dict = {'' : ([], [])}
+        self.path_set = set(virtual_paths)
+
+        folder_dict = self.folder_dict
+        for virtual_path in virtual_paths:
+            parent_path = _Get_Parent_Path(virtual_path)
+            entry = folder_dict.get(parent_path)
+            if entry == None:
+                entry = folder_dict[parent_path] = ([], [])
+                # Record any other new folders, until reaching a
+                # known one (at worst, the top).
+                child_path = parent_path
+                while True:
+                    up_path = _Get_Parent_Path(child_path)
+                    up_entry = folder_dict.get(up_path)
+                    if up_entry != None:
+                        up_entry[0].append(child_path)
+                        break
+                    folder_dict[up_path] = ([child_path], [])
+                    child_path = up_path
+            entry[1].append(virtual_path)
+        return
+
+
+    def Get_Folder_Paths(self, folder_path):
+        '''
+        Returns a list of paths of the folders directly inside the
+        given folder.
+        '''
+        return self.folder_dict[folder_path][0]
+
+
+    def Get_File_Paths(self, folder_path):
+        '''
+        Returns a list of virtual_paths of the files directly inside
+        the given folder.
+        '''
+        return self.folder_dict[folder_path][1]
+
+
+    def Filter_Paths(self, virtual_paths, folder_path):
+        '''
+        Returns a list of those virtual_paths that are in this group,
+        and inside the given folder at any depth. Meant for picking
+        out a few loaded files, without walking the folder contents.
+        '''
+        prefix = folder_path + '/' if folder_path else ''
+        return [x for x in virtual_paths
+                if x.startswith(prefix) and x in self.path_set]
+
+
+class VFS_Index:
+    '''
+    Virtual paths sorted by suffix, with a folder index for each.
+
+    Attributes:
+    * suffix_paths_dict
+      - Dict of lists of virtual_paths, keyed by extension (as "*.ext").
+      - A path is expected to show up under * and it's specific extension.
+    * suffix_folder_index_dict
+      - Dict of VFS_Folder_Index, keyed as above.
+    * build_time
+      - Float, seconds taken to build this index.
+    '''
+    def __init__(self, virtual_paths):
+        start = time()
+        self.suffix_paths_dict = {'*.*' : []}
+        all_paths = self.suffix_paths_dict['*.*']
+
+        for path in virtual_paths:
+
+            # Ignore the top level exe files, which are a special case
+            # and not pulled from cat/dat files.
+            if path.endswith('.exe'):
+                continue
+
+            all_paths.append(path)
+            # Look for an extension, with safety if it's missing.
+            name = path.rsplit('/',1)[-1]
+            if '.' in name:
+                suffix = '*.' + name.rsplit('.',1)[1]
+                suffix_paths = self.suffix_paths_dict.get(suffix)
+                if suffix_paths == None:
+                    suffix_paths = self.suffix_paths_dict[suffix] = []
+                suffix_paths.append(path)
+
+        self.suffix_folder_index_dict = {
+            suffix : VFS_Folder_Index(paths)
+            for suffix, paths in self.suffix_paths_dict.items()}
+        self.build_time = time() - start
+        return
+
+
+    def Get_Suffixes(self):
+        '''
+        Returns a sorted list of the suffix patterns, with '*.*' last.
+        '''
+        suffixes = sorted(self.suffix_paths_dict.keys())
+        suffixes.remove('*.*')
+        suffixes.append('*.*')
+        return suffixes
+
+
+    def Get_Folder_Index(self, suffix):
+        '''
+        Returns the VFS_Folder_Index for the given suffix pattern,
+        or an empty one if no paths have that suffix.
+        '''
+        folder_index = self.suffix_folder_index_dict.get(suffix)
+        if folder_index == None:
+            folder_index = VFS_Folder_Index([])
+        return folder_index
+
+
+def Build_VFS_Index():
+    '''
+    Returns a VFS_Index of all virtual paths in the File_System.
+    Meant to be run in a worker thread.
+    '''
+    # Get all paths, no pattern, since fnmatch is slow.
+    return VFS_Index(File_System.Gen_All_Virtual_Paths(pattern = None))
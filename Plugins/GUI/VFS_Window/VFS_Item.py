@@ -33,13 +33,14 @@ class VFS_Item:
       - At the top level, this is just 'root'.
     * folders
       - List of VFS_Item objects that are folders under this one.
-      - Empty if this is a file.
+      - None until built by Get_Folders.
+      - Not present if this is a file.
     * files
       - List of VFS_Item objects that are files under this one.
       - Empty if this is a file.
     * file_paths
       - List of strings, virtual_paths of files that are at this folder level.
-      - Empty if this is a file.
+      - Not present if this is a file.
     * is_folder
       - Bool, True if this is a folder, else it is a file.
     * shared_file_info_dict
@@ -52,6 +53,10 @@ class VFS_Item:
         remade).
     * window
       - The gui window holding this item. Used for Print lookup.
+    * folder_index
+      - VFS_Folder_Index of the listing this folder is from, used to
+        build child folders as they are needed.
+      - None if this is a file.
     '''
     def __init__(
             self,
@@ -59,12 +64,14 @@ class VFS_Item:
             is_folder,
             shared_file_info_dict,
             window,
+            folder_index = None,
         ):
         self.virtual_path = virtual_path
         self.is_folder = is_folder
         self.shared_file_info_dict = shared_file_info_dict
         self.parent = None
         self.window = window
+        self.folder_index = folder_index
 
         # Split on the last '/', though it may not be present.
         *parent, self.name = virtual_path.rsplit('/',1)
@@ -78,9 +85,9 @@ class VFS_Item:
 
         # To reduce weight, only make these lists for folders.
         if is_folder:
-            self.folders = []
+            self.folders = None
             self.files = []
-            self.file_paths = []
+            self.file_paths = folder_index.Get_File_Paths(virtual_path)
         return
     
 
@@ -99,8 +106,19 @@ class VFS_Item:
 
     def Get_Folders(self):
         '''
-        Returns all child folders.
+        Returns all child folders, building their items on the
+        first call.
         '''
+        if self.folders == None:
+            self.folders = []
+            for folder_path in self.folder_index.Get_Folder_Paths(self.virtual_path):
+                self.Add_Item(VFS_Item(
+                    folder_path,
+                    is_folder = True,
+                    shared_file_info_dict = self.shared_file_info_dict,
+                    window = self.window,
+                    folder_index = self.folder_index,
+                    ))
         return self.folders
     
 
@@ -226,7 +244,7 @@ class VFS_Item:
 
         ret_list = []
         if include_folders:
-            for subitem in sorted(self.folders, key = lambda x : x.name):
+            for subitem in sorted(self.Get_Folders(), key = lambda x : x.name):
                 ret_list.append( subitem.Get_Q_Item())
 
         if include_files:
@@ -290,14 +308,13 @@ class VFS_Item:
         else:
             # First pass collects the values; second pass joins them.
             values = []
-            # Try file names (the files may not be created yet).
-            for path in self.file_paths:
-                if path in self.shared_file_info_dict:
-                    values.append(self.shared_file_info_dict[path].get(field, None))
-
-            # Also get subfolders.
-            for folder in self.folders:
-                values.append(folder.Lookup_File_Info(field))
+            # Check files at any depth, by name (the files and
+            # subfolders may not be created yet). Only the files with
+            # info need checking, which are normally far fewer than
+            # those in the folder.
+            for path in self.folder_index.Filter_Paths(
+                    self.shared_file_info_dict, self.virtual_path):
+                values.append(self.shared_file_info_dict[path].get(field, None))
 
             # Join all values together.
             # This is a little clumsy, skipping None and checking for
@@ -364,7 +381,7 @@ class VFS_Item:
         lines =['name      : {}'.format(self.name)]
         if self.is_folder:
             lines += [
-                'dirs      : {}'.format(len(self.folders)),
+                'dirs      : {}'.format(len(self.Get_Folders())),
                 'files     : {}'.format(len(self.file_paths)),
                 ]
         else:
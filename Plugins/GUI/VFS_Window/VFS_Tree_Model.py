@@ -3,8 +3,6 @@ from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('GUI')
 
 from collections import OrderedDict
-from time import time
-from Framework import Settings
 from PyQt5 import QtWidgets
 from PyQt5.QtGui import QStandardItemModel, QStandardItem
 from PyQt5.QtCore import QItemSelectionModel
@@ -16,9 +14,9 @@ class VFS_Tree_Model(QStandardItemModel):
     Model to represent a tree layout of the VFS.
 
     Attributes:
-    * path_item_dict
-      - Dict, keyed by virtual_path, holding all VFS_Items, including
-        directories, with a top node at ''.
+    * top_vfs_item
+      - VFS_Item of the top folder, with path ''. Other folder items
+        are built from it as they are expanded.
     * path_q_item_dict
       - As above, but holding the generated QTreeWidgetItems.
     * q_expanded_vfs_items
@@ -37,7 +35,7 @@ class VFS_Tree_Model(QStandardItemModel):
     '''
     def __init__(self, window, qt_view):
         super().__init__(window)
-        self.path_item_dict = None
+        self.top_vfs_item = None
         self.path_q_item_dict = {}
         self.q_expanded_vfs_items = []
         self.last_selected_virtual_path = None
@@ -93,17 +91,18 @@ class VFS_Tree_Model(QStandardItemModel):
         return child_q_items
     
 
-    def Set_File_Listing(self, virtual_paths, file_info_dict):
+    def Set_File_Listing(self, folder_index, file_info_dict):
         '''
         Fill in the tree with the given file system contents.
 
-        * virtual_paths
-          - List of strings, virtual paths to be included.
+        * folder_index
+          - VFS_Folder_Index of the virtual paths to be included.
         * file_info_dict
           - Dict of dicts, info on loaded files.
         '''        
-        # TODO: time this and improve if a problem; this has some
-        # issue locking up the gui for a few seconds.
+        # Note: this used to lock up the gui for a few seconds when
+        # building items for every folder; folders are now indexed in
+        # a thread, and items made only for those being shown.
 
         ## Record the expansion state of items.
         ## The goal is that all labels currently expanded will get
@@ -119,15 +118,18 @@ class VFS_Tree_Model(QStandardItemModel):
         #self.item_dict  .clear()
         #self.branch_dict.clear()        
 
-        # Convert to vfs items.
-        self.Convert_Paths_To_VFS_Items(virtual_paths, file_info_dict)
-        
         # Clear old q_item tracking stuff.
         self.path_q_item_dict.clear()
         self.q_expanded_vfs_items.clear()
 
-        # Grab the top node.
-        top_vfs_item = self.path_item_dict['']
+        # Make the top node.
+        top_vfs_item = self.top_vfs_item = VFS_Item(
+            virtual_path = '',
+            is_folder = True,
+            shared_file_info_dict = file_info_dict,
+            window = self.window,
+            folder_index = folder_index,
+            )
 
         # Note: the top node is root.  It could either be set to have
         # a q_item, the top level for the menu which needs to be expanded
@@ -215,108 +217,6 @@ class VFS_Tree_Model(QStandardItemModel):
         # TODO: tell the list view to open the top level, maybe.
         return
 
-    # TODO: speed this up somehow; kinda slow.
-    def Convert_Paths_To_VFS_Items(self, virtual_paths, file_info_dict):
-        '''
-        Generate VFS_Items for the given virtual_paths.
-        Returns a dict, keyed by virtual_path (partials for folders),
-        holding the items. There will be more entries in this dict
-        than there are original file virtual_paths due to the extra
-        for directories.
-        The top level node will have an empty path string.
-        '''
-        if Settings.profile:
-            start = time()
-
-        path_item_dict = {}
-        def Record_Parents(vfs_item):
-            '''
-            Recursive function to record parent folders for a given
-            item, adding this item to its parent.
-            '''
-            # If this vfs_item is root, return early.
-            if vfs_item.virtual_path == '':
-                return
-            # Look up the parent folders to reach this file.
-            parent_path = vfs_item.parent_path
-
-            # If it is not yet seen, record it as a folder.
-            if parent_path not in path_item_dict:
-
-                # Create the item.
-                parent = VFS_Item(
-                    virtual_path = parent_path,
-                    is_folder = True,
-                    shared_file_info_dict = file_info_dict,
-                    window = self.window,
-                    )
-
-                # Record it, and its parents recursively.
-                path_item_dict[parent_path] = parent
-                Record_Parents(parent)
-
-            # Add this item to its parent.
-            path_item_dict[parent_path].Add_Item(vfs_item)
-            return
-
-
-        # Note: this can take excessive time if the full file
-        #  system contents are given; maybe look into it again
-        #  if that is ever wanted, but for now rely on the input
-        #  paths having been filtered down to text items or maybe some
-        #  select binary.
-        # Update: removing the VFS_Item creation for files sped this
-        #  up a lot, and the file type filter even more so.
-
-        for virtual_path in virtual_paths:
-
-            *parent, name = virtual_path.rsplit('/',1)
-            if parent:
-                parent_path = parent[0]
-            else:
-                parent_path = ''
-
-            # Set up the first parent.
-            # TODO: this has some code repetition with the Record_Parents
-            # function; a rewrite can clean it up a bit.
-            if parent_path not in path_item_dict:
-
-                # Create the item.
-                parent = VFS_Item(
-                    virtual_path = parent_path,
-                    is_folder = True,
-                    shared_file_info_dict = file_info_dict,
-                    window = self.window,
-                    )
-                
-                # Record it, and its parents recursively.
-                path_item_dict[parent_path] = parent
-                Record_Parents(parent)
-                
-            # Add this virtual_path to its parent.
-            path_item_dict[parent_path].file_paths.append(virtual_path)
-
-            ## Create its item.
-            ## TODO: skip file item creation, and just record them
-            ## as lists of names, to save tree building time (these
-            ## won't display anyway, if placed in the list view instead).
-            #vfs_item = VFS_Item(
-            #    virtual_path = virtual_path,
-            #    is_folder = False )
-            #path_item_dict[virtual_path] = vfs_item
-
-            # Fill in its parents.
-            #Record_Parents(vfs_item)
-
-        self.path_item_dict = path_item_dict
-
-        if Settings.profile:
-            self.window.Print('VFS Tree build time: {:.3f} s'.format(
-                time() - start
-                ))
-        return
-
-
     #def _Categorize_Virtual_Paths(self, virtual_paths):
     #    '''
     #    Transform a list of virtual paths into a dict of dicts of ...
@@ -2,7 +2,6 @@
 from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('GUI')
 
-from collections import defaultdict
 from pathlib import Path
 from PyQt5.uic import loadUiType
 
@@ -11,7 +10,8 @@ from PyQt5.QtGui import QStandardItemModel, QStandardItem
 from PyQt5.QtCore import QItemSelectionModel
 
 from ..Shared import Tab_Page_Widget
-from Framework import File_System
+from Framework import File_System, Settings
+from .VFS_Index import Build_VFS_Index
 from .VFS_Tree_Model import VFS_Tree_Model
 from .VFS_List_Model import VFS_List_Model
 
@@ -58,9 +58,9 @@ class VFS_Window(Tab_Page_Widget, generated_class):
       - Hardcoded initially.
     * last_dialog_path
       - Path last used in the Save dialog box, to be reused.
-    * paths_by_suffix
-      - Dict of lists of virtual_paths, keyed by extension (as "*.ext").
-      - A path is expected to show up under * and it's specific extension.
+    * vfs_index
+      - VFS_Index of the virtual paths, by extension and folder.
+      - None until gathered.
     * combobox_updating
       - Bool, set True temporarily when rebuilding the combo box items,
         to suppress its signals.
@@ -73,8 +73,8 @@ class VFS_Window(Tab_Page_Widget, generated_class):
         self.pattern = '.xml'
         self.combobox_updating = False
 
-        # Paths by suffix are filled in below with a threaded call.
-        self.paths_by_suffix = defaultdict(list)
+        # Path index is filled in below with a threaded call.
+        self.vfs_index = None
         
         # Set up initial, blank models.
         self.tree_model = VFS_Tree_Model(self, self.widget_treeView)
@@ -140,39 +140,24 @@ class VFS_Window(Tab_Page_Widget, generated_class):
     def Threaded_Gather_Virtual_Paths(self):
         '''
         Starts thread that accesses the file system and gathers all
-        virtual paths, and some file summary info for loaded files.
+        virtual paths, indexed by suffix and folder.
         '''
-        # Get all paths, no pattern, since fnmatch is slow.
-        self.Queue_Thread(File_System.Gen_All_Virtual_Paths,
-                          pattern = None,
+        # Note: the path splitting was moved into the thread, since it
+        # could stall the gui with the full file system.
+        self.Queue_Thread(Build_VFS_Index,
                           callback_function = self._Threaded_Gather_Virtual_Paths_pt2)
         return
 
-    def _Threaded_Gather_Virtual_Paths_pt2(self, virtual_paths):
+    def _Threaded_Gather_Virtual_Paths_pt2(self, vfs_index):
         'Threaded_Gather_Virtual_Paths part 2, post-thread'
-
-        # Clear old info.
-        self.paths_by_suffix.clear()
-
-        for path in virtual_paths:
-
-            # Ignore the top level exe files, which are a special case
-            # and not pulled from cat/dat files.
-            if path.endswith('.exe'):
-                continue
-
-            self.paths_by_suffix['*.*'].append(path)
-            # Look for an extension, with safety if it's missing.
-            parts = path.split('/')[-1].rsplit('.')
-            if len(parts) > 1:
-                self.paths_by_suffix[f'*.{parts[-1]}'].append(path)
-
-
-        # Build a list of suffixes to stick in the combo box.
-        suffixes = sorted(self.paths_by_suffix.keys())
-        # Set *.* to go last.
-        suffixes.remove('*.*')
-        suffixes.append('*.*')
+        self.vfs_index = vfs_index
+        if Settings.profile:
+            self.Print('VFS index build time: {:.3f} s'.format(
+                vfs_index.build_time))
+
+        # Build a list of suffixes to stick in the combo box,
+        # with *.* last.
+        suffixes = vfs_index.Get_Suffixes()
         
         # Clear out old items. Suppress callback handling during this.
         self.combobox_updating = True
@@ -189,7 +174,8 @@ class VFS_Window(Tab_Page_Widget, generated_class):
         self.combobox_updating = False
         
         # Update the tree, sending over the stuff in this pattern.
-        self.tree_model.Set_File_Listing(self.paths_by_suffix[self.pattern], self.file_info_dict)
+        self.tree_model.Set_File_Listing(
+            self.vfs_index.Get_Folder_Index(self.pattern), self.file_info_dict)
         return
 
 
@@ -246,9 +232,10 @@ class VFS_Window(Tab_Page_Widget, generated_class):
         # Note: this could be called during Load"_Session_Settings
         # before this window has been gathered the file info.
         # If called later, update the tree view.
-        if self.paths_by_suffix:
+        if self.vfs_index != None:
             # At this point, the file paths should already be loaded.
-            self.tree_model.Set_File_Listing(self.paths_by_suffix[self.pattern], self.file_info_dict)
+            self.tree_model.Set_File_Listing(
+                self.vfs_index.Get_Folder_Index(self.pattern), self.file_info_dict)
             self.tree_model.Soft_Refresh()
         return
 
@@ -2,8 +2,16 @@
 from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('Map_Transforms')
 
-from itertools import combinations
+from itertools import combinations, product
 from copy import copy
+import math
+
+# Numpy is optional (it is left out of the compiled executable); when
+# missing, scaling falls back to the Object_Group based code.
+try:
+    import numpy
+except Exception:
+    numpy = None
 
 from ....Classes import *
 from .Macros import *
@@ -13,6 +21,8 @@ from .Misc import *
 __all__ = [
     'Object',
     'Object_Group',
+    'Object_Grid',
+    'Object_Arrays',
     ]
 
 class Object:
@@ -49,6 +59,10 @@ class Object:
         already present will be allowed to move.
     * contains_gate
       - Flag, True if the object is a zone with a gate or sec highway entry/exit.
+    * is_ring_spline
+      - Flag, True if the object is a spline of a ring highway.
+    * is_damage_region
+      - Flag, True if the object is a region that does damage.
     '''
     def __init__(self, name, type, connection = None, 
                  cluster_pos = None, sector_pos = None, md_object = None,
@@ -98,9 +112,65 @@ class Object:
             
         elif god_object:
             self.radius = god_object.radius
+
+        # These need the connected macro; objects without one (eg. those
+        # rebuilt by From_Plan) get the flags filled in afterward.
+        self.is_ring_spline = bool(connection and spline_pos 
+                                   and issubclass(type, Highway)
+                                   and connection.macro.is_ring_piece)
+        self.is_damage_region = bool(connection and type == Region_Macro
+                                     and connection.macro.Is_Damage_Region())
         return
 
 
+    def Get_Plan(self):
+        '''
+        Returns a compact, picklable tuple of the fields used by the
+        scaling steps, for sending to worker processes.
+        See From_Plan.
+        '''
+        return (
+            self.name,
+            self.type,
+            self.sector_pos.x, self.sector_pos.y, self.sector_pos.z,
+            self.radius,
+            self.inner_radius,
+            self.contains_gate,
+            # Spline dummy flag, or None if not a spline.
+            self.spline_pos.dummy if self.spline_pos else None,
+            self.is_ring_spline,
+            self.is_damage_region,
+            )
+
+
+    @staticmethod
+    def From_Plan(plan):
+        '''
+        Returns a detached Object built from a Get_Plan tuple, with no
+        connection or xml. Only suitable for running scaling steps,
+        after which its sector_pos can be copied back to the original.
+        '''
+        (name, type, x, y, z, radius, inner_radius, contains_gate, 
+         dummy, is_ring_spline, is_damage_region) = plan
+
+        # Note: coordinates are set directly, since the Position init
+        # would swap float 0s (and -0s) for int 0.
+        object = Object(
+            name = name, 
+            type = type, 
+            sector_pos = Position().Copy_With(x, y, z))
+        if dummy != None:
+            # Stand-in spline_pos, only needed for its dummy flag.
+            object.spline_pos = Position()
+            object.spline_pos.dummy = dummy
+        object.radius = radius
+        object.inner_radius = inner_radius
+        object.contains_gate = contains_gate
+        object.is_ring_spline = is_ring_spline
+        object.is_damage_region = is_damage_region
+        return object
+
+
     def Should_Merge_With(self, other, sector_size = 200000, scaling = 1):
         '''
         Returns True if this object should merge with another object that
@@ -184,9 +254,7 @@ class Object_Group:
         self.objects = objects
 
         self.has_regions = any(x.type == Region_Macro for x in objects)
-        self.has_damage_regions = any(x.type == Region_Macro 
-                               and x.connection.macro.Is_Damage_Region() 
-                               for x in objects)
+        self.has_damage_regions = any(x.is_damage_region for x in objects)
         self.has_non_regions = any(x.type != Region_Macro for x in objects)
 
         # Compute average sector position.
@@ -196,9 +264,7 @@ class Object_Group:
         # a half circle, which tends to get grouped with and throw off the
         # main ring highways. As such, this will favor ring highway splines,
         # then general highways, then everything.
-        ring_splines = [x for x in objects 
-                        if x.spline_pos and issubclass(x.type, Highway)
-                        and x.connection.macro.is_ring_piece]
+        ring_splines = [x for x in objects if x.is_ring_spline]
         splines = [x for x in objects if x.spline_pos]
         if ring_splines:
             centering_objects = ring_splines
@@ -293,3 +359,320 @@ class Object_Group:
         return False
 
 
+class Object_Grid:
+    '''
+    Spatial index of objects by sector position, a uniform grid of
+    cubic cells. Used to find which objects are close enough that
+    they might merge, without checking every pair.
+    Positions are read when the grid is built, so it should be rebuilt
+    after objects move.
+
+    * cell_size
+      - Float, edge length of the cells. Objects with a radius larger
+        than this are kept in large_objects instead of the cells.
+    * cells
+      - Dict, keyed by (x,y,z) cell index tuple, holding lists of objects.
+    * large_objects
+      - List of objects with a radius over cell_size; these are
+        checked individually.
+    * gate_objects
+      - List of objects with contains_gate, returned as candidates for
+        other gate objects when scaling down, since their allowed
+        distance then depends on sector size rather than radius.
+    * check_gates
+      - Bool, True when gate_objects are to be included.
+    '''
+    # Most objects have radii of 5-15 km, with some regions and
+    # zones much larger.
+    cell_size = 20000
+
+    def __init__(self, objects, scaling = 1):
+        self.cells = {}
+        self.large_objects = []
+        self.gate_objects = []
+        self.check_gates = scaling < 1
+
+        for object in objects:
+            if object.radius > self.cell_size:
+                self.large_objects.append(object)
+            else:
+                key = self._Get_Cell(object.sector_pos)
+                if key in self.cells:
+                    self.cells[key].append(object)
+                else:
+                    self.cells[key] = [object]
+            if object.contains_gate:
+                self.gate_objects.append(object)
+        return
+
+
+    def _Get_Cell(self, pos, offset = 0):
+        '''
+        Returns the cell index tuple holding the given position, after
+        adding offset to each coordinate.
+        '''
+        return (math.floor((pos.x + offset) / self.cell_size),
+                math.floor((pos.y + offset) / self.cell_size),
+                math.floor((pos.z + offset) / self.cell_size))
+
+
+    def Get_Candidates(self, object):
+        '''
+        Returns a list of objects that might merge with the given object,
+        possibly including the object itself. Any object that could
+        pass Object.Should_Merge_With is included.
+        '''
+        pos = object.sector_pos
+        candidates = []
+        if self.check_gates and object.contains_gate:
+            candidates += self.gate_objects
+
+        # Large objects are checked against their own radius; pad a
+        # little for float rounding.
+        for other in self.large_objects:
+            reach = (object.radius + other.radius) * 1.000001 + 1
+            other_pos = other.sector_pos
+            if (abs(pos.x - other_pos.x) <= reach
+            and abs(pos.y - other_pos.y) <= reach
+            and abs(pos.z - other_pos.z) <= reach):
+                candidates.append(other)
+
+        # Objects in cells have at most cell_size radius, so anything
+        # further than this can't touch the object.
+        reach = (object.radius + self.cell_size) * 1.000001 + 1
+        low  = self._Get_Cell(pos, -reach)
+        high = self._Get_Cell(pos, reach)
+
+        # Visit whichever is fewer: the cells in range, or the
+        # occupied cells (for objects with huge radii).
+        num_cells = 1
+        for l, h in zip(low, high):
+            num_cells *= h - l + 1
+        if num_cells <= len(self.cells):
+            for key in product(*[range(l, h+1) for l, h in zip(low, high)]):
+                cell = self.cells.get(key)
+                if cell:
+                    candidates += cell
+        else:
+            for key, cell in self.cells.items():
+                if all(l <= k <= h for k, l, h in zip(key, low, high)):
+                    candidates += cell
+        return candidates
+
+
+class Object_Arrays:
+    '''
+    Array based version of a sector's objects and their groups, used
+    to run the scaling steps with vectorized numpy math. Requires numpy.
+
+    This follows the same rules as Object.Should_Merge_With,
+    Object_Group, and the group merging loop, with operations in the
+    same order, so that the results are identical. Objects are only
+    updated when Write_Positions is called.
+
+    * objects
+      - List of Objects, in their original order.
+    * coords
+      - N x 3 array of object sector positions.
+    * radius, inner_radius
+      - Arrays of object radii; missing inner radii are 0.
+    * is_gate, is_spline, is_dummy, is_ring_spline
+      - Bool arrays of object flags.
+    * object_groups
+      - Dict, keyed by group id, holding lists of object indices, for
+        live groups. Ids increase as groups are made, so id order
+        matches the order of the group list in the original loop.
+    * object_group_ids
+      - Int array holding the group id of each object.
+    * centers
+      - Array of group weighted center positions, indexed by group id.
+    '''
+    # Number of objects per block when building the merge matrix.
+    block_size = 32
+
+    def __init__(self, objects):
+        self.objects = objects
+        num_objects = len(objects)
+        self.coords = numpy.array(
+            [(x.sector_pos.x, x.sector_pos.y, x.sector_pos.z) for x in objects],
+            dtype = numpy.float64).reshape(num_objects, 3)
+        self.radius = numpy.array([x.radius for x in objects], dtype = numpy.float64)
+        self.inner_radius = numpy.array([x.inner_radius if x.inner_radius else 0 
+                                         for x in objects], dtype = numpy.float64)
+        self.is_gate   = numpy.array([bool(x.contains_gate) for x in objects], dtype = bool)
+        self.is_spline = numpy.array([bool(x.spline_pos) for x in objects], dtype = bool)
+        self.is_dummy  = numpy.array([bool(x.spline_pos and x.spline_pos.dummy) 
+                                      for x in objects], dtype = bool)
+        self.is_ring_spline = numpy.array([x.is_ring_spline for x in objects], dtype = bool)
+
+        # Groups start with one object each.
+        self.object_groups = {i : [i] for i in range(num_objects)}
+        self.object_group_ids = numpy.arange(num_objects)
+        # Groups are at most doubled by merging.
+        self.centers = numpy.zeros((max(1, 2 * num_objects), 3))
+        self.next_group_id = num_objects
+        for group_id, indices in self.object_groups.items():
+            self.centers[group_id] = self.Get_Center(indices)
+        return
+
+
+    def Get_Center(self, indices):
+        '''
+        Returns the weighted center of the objects at the given indices,
+        matching Object_Group.
+        '''
+        indices = numpy.array(indices)
+        # Favor ring highway splines, then other splines, then everything.
+        ring_splines = indices[self.is_ring_spline[indices]]
+        splines = indices[self.is_spline[indices]]
+        if ring_splines.size:
+            indices = ring_splines
+        elif splines.size:
+            indices = splines
+
+        coords = self.coords[indices]
+        distances = numpy.sqrt(coords[:,0] * coords[:,0] 
+                               + coords[:,1] * coords[:,1] 
+                               + coords[:,2] * coords[:,2])
+        weights = 1 / (distances + 1)
+        # Sum in order, starting from 0, as the loop in Object_Group does
+        # (cumsum is sequential, where sum is not).
+        terms = numpy.zeros((len(indices) + 1, 4))
+        terms[1:,:3] = coords * weights[:,None]
+        terms[1:,3] = weights
+        totals = numpy.cumsum(terms, axis = 0)[-1]
+        return totals[:3] / totals[3]
+
+
+    def Get_Merge_Matrix(self, sector_size, scaling):
+        '''
+        Returns an N x N bool array, True where object [i] should merge
+        with object [j] according to Object.Should_Merge_With.
+        '''
+        num_objects = len(self.objects)
+        matrix = numpy.zeros((num_objects, num_objects), dtype = bool)
+        if not num_objects:
+            return matrix
+
+        # Most pairs are far apart. To skip them, work on blocks of
+        # objects sorted by x, pairing each block only with objects
+        # whose x is within reach of it.
+        order = numpy.argsort(self.coords[:,0], kind = 'stable')
+        sorted_x = self.coords[order, 0]
+        max_radius = self.radius.max()
+        gate_extra = sector_size / 2 if scaling < 1 else 0
+
+        for start in range(0, num_objects, self.block_size):
+            rows = order[start : start + self.block_size]
+
+            # Furthest any pair in this block can be and still merge,
+            # padded a little for float rounding.
+            reach = self.radius[rows].max() + max_radius
+            if self.is_gate[rows].any():
+                reach += gate_extra
+            reach = reach * 1.000001 + 1
+            col_start = numpy.searchsorted(sorted_x, self.coords[rows, 0].min() - reach, 'left')
+            col_end   = numpy.searchsorted(sorted_x, self.coords[rows, 0].max() + reach, 'right')
+            cols = order[col_start : col_end]
+            
+            # Dummy splines don't merge with other splines.
+            skip = (self.is_spline[rows,None] & self.is_spline[None,cols]
+                    & (self.is_dummy[rows,None] | self.is_dummy[None,cols]))
+
+            # Allowed distance is the radii, plus extra between gates
+            # when scaling down.
+            allowed = self.radius[rows,None] + self.radius[None,cols]
+            if scaling < 1:
+                allowed = allowed + numpy.where(
+                    self.is_gate[rows,None] & self.is_gate[None,cols], gate_extra, 0)
+
+            # Per dimension offsets and distances.
+            offsets = numpy.abs(self.coords[rows,None,:] - self.coords[None,cols,:])
+            distance = numpy.sqrt(offsets[...,0] * offsets[...,0] 
+                                  + offsets[...,1] * offsets[...,1] 
+                                  + offsets[...,2] * offsets[...,2])
+
+            def Is_Within(allowed):
+                return ((offsets <= allowed[...,None]).all(axis = -1)
+                        & (distance <= allowed))
+
+            # Objects already inside a larger one's inner radius don't
+            # merge. When equal in radius, the other object is the smaller.
+            self_smaller = self.radius[rows,None] < self.radius[None,cols]
+            larger_inner = numpy.where(self_smaller, 
+                                       self.inner_radius[None,cols],
+                                       self.inner_radius[rows,None])
+            smaller_radius = numpy.where(self_smaller, 
+                                         self.radius[rows,None],
+                                         self.radius[None,cols])
+            has_inner = larger_inner != 0
+            block = ~skip & Is_Within(allowed)
+            if has_inner.any():
+                block &= ~(has_inner & Is_Within(larger_inner - smaller_radius))
+            matrix[rows[:,None], cols[None,:]] = block
+        return matrix
+
+
+    def Merge_Groups(self, sector_size, scaling):
+        '''
+        Merge any groups whose objects are too close together, chaining
+        merges until none remain, matching Merge_Object_Groups.
+        '''
+        matrix = self.Get_Merge_Matrix(sector_size, scaling)
+
+        # Dict used as an ordered set of group ids to check.
+        groups_to_check = dict.fromkeys(self.object_groups)
+        while groups_to_check:
+            this_id = next(iter(groups_to_check))
+            del groups_to_check[this_id]
+            this_indices = self.object_groups[this_id]
+
+            # Find objects of other groups that any object in this group
+            # should merge with; the first group in order is merged.
+            mergeable = matrix[this_indices].any(axis = 0)
+            mergeable[this_indices] = False
+            mergeable_ids = self.object_group_ids[mergeable]
+            if not mergeable_ids.size:
+                continue
+            other_id = int(mergeable_ids.min())
+
+            # Prune both original groups out, and add the merged group.
+            indices = this_indices + self.object_groups.pop(other_id)
+            del self.object_groups[this_id]
+            groups_to_check.pop(other_id, None)
+
+            new_id = self.next_group_id
+            self.next_group_id += 1
+            self.object_groups[new_id] = indices
+            self.object_group_ids[indices] = new_id
+            self.centers[new_id] = self.Get_Center(indices)
+            groups_to_check[new_id] = None
+        return
+
+
+    def Scale_Pos(self, scaling):
+        '''
+        Adjust the positions of all groups to be multiplied by scaling,
+        matching Object_Group.Scale_Pos.
+        '''
+        group_ids = numpy.fromiter(self.object_groups, dtype = int, 
+                                   count = len(self.object_groups))
+        centers = self.centers[group_ids]
+        offsets = centers * scaling - centers
+        self.centers[group_ids] = centers + offsets
+        # Apply each group's offset to its objects.
+        offset_array = numpy.zeros_like(self.centers)
+        offset_array[group_ids] = offsets
+        self.coords += offset_array[self.object_group_ids]
+        return
+
+
+    def Write_Positions(self):
+        '''
+        Update the objects' sector positions with the array coordinates.
+        Positions are replaced with copies, as the Position arithmetic
+        of Object_Group.Scale_Pos would do.
+        '''
+        for object, (x, y, z) in zip(self.objects, self.coords.tolist()):
+            object.sector_pos = object.sector_pos.Copy_With(x, y, z)
+        return
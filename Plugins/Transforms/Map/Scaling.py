@@ -3,11 +3,12 @@ from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('Map_Transforms')
 
 import random
-from collections import defaultdict
+from collections import defaultdict, deque
 
-from Framework import Plugin_Log, Print
+from Framework import Plugin_Log, Print, Worker_Pool
 from ...Classes import *
 from .Classes import *
+from .Classes.Objects import numpy
 
 
 def Scale_Regions(galaxy, sector_scaling_factors, debug):
@@ -59,13 +60,19 @@ def Scale_Sectors(galaxy, sector_scaling_factors, debug, precision_steps):
     #    Print(name)
 
     # Apply to all sectors individually.
-    for sector in galaxy.class_macros['sectors'].values():
-        # Testing, pick a sector.
-        #if sector.name != 'Cluster_416_Sector002_macro':
-        #    continue
-        Scale_Sector(galaxy, sector, sector_scaling_factors[sector], debug, precision_steps)
-        # In testing, skip after first sector.
-        #break
+    sectors = list(galaxy.class_macros['sectors'].values())
+    # Testing, pick a sector.
+    #sectors = [x for x in sectors if x.name == 'Cluster_416_Sector002_macro']
+
+    # The scaling steps of different sectors can run in parallel, with
+    # all xml/galaxy reads and updates kept in this process.
+    pool, num_workers = _Get_Sector_Pool(len(sectors), debug)
+    if pool == None:
+        for sector in sectors:
+            Scale_Sector(galaxy, sector, sector_scaling_factors[sector], debug, precision_steps)
+    else:
+        _Scale_Sectors_Parallel(galaxy, sectors, sector_scaling_factors,
+                                precision_steps, pool, num_workers)
         
     # For debug, print out ending sector attributes.
     if debug:
@@ -157,6 +164,84 @@ def Scale_Sectors(galaxy, sector_scaling_factors, debug, precision_steps):
     return
 
 
+# Minimum number of sectors before scaling steps are sent to the worker
+# pool; below this, pickling overhead outweighs the gains.
+min_pool_sectors = 8
+
+def _Get_Sector_Pool(num_sectors, debug):
+    '''
+    Returns a tuple of (Worker_Pool pool, number of workers) for
+    running sector scaling steps, or (None, 0) if threading is disabled,
+    debugging (which prints each step), or there are too few sectors.
+    '''
+    if debug or num_sectors < min_pool_sectors:
+        return None, 0
+    pool = Worker_Pool.Get_Pool()
+    if pool == None:
+        return None, 0
+    return pool, Worker_Pool.num_workers
+
+
+def _Get_Shared_Keys(sector):
+    '''
+    Returns a set of ids of the macros, regions, and other objects that
+    a sector reads while planning and updates while finishing. Sectors
+    with overlapping keys (eg. regions shared between sectors) need to
+    be handled one after the other.
+    '''
+    keys = set()
+    for conn in sector.conns.values():
+        keys.add(id(conn.macro))
+    for macro in sector.cluster_connected_macros:
+        keys.add(id(macro))
+        keys.add(id(macro.region))
+    for object in sector.md_objects + sector.god_objects:
+        keys.add(id(object))
+    return keys
+
+
+def _Scale_Sectors_Parallel(galaxy, sectors, sector_scaling_factors, 
+                            precision_steps, pool, num_workers):
+    '''
+    Scale the given sectors, running their scaling steps in the pool.
+    Results match scaling the sectors one at a time, in order.
+
+    Planning and finishing stay in this process, with sectors finished
+    in their original order (new zone creation relies on it). A sector
+    that shares state with one still in flight is not planned until
+    that one is finished, so it sees the same positions it would have
+    when run serially.
+    '''
+    # Queue of (sector_plan, shared keys, async_result) started but not
+    # yet finished.
+    pending = deque()
+    max_pending = 2 * num_workers
+
+    def Finish_Next():
+        sector_plan, _, result = pending.popleft()
+        sector_plan.Record_Step_Results(result.get())
+        Finish_Sector_Scaling(galaxy, sector_plan, debug = False)
+
+    for sector in sectors:
+        keys = _Get_Shared_Keys(sector)
+        # Finish anything this sector depends on, and anything past the
+        # in-flight limit.
+        while pending and len(pending) >= max_pending:
+            Finish_Next()
+        while any(keys & x[1] for x in pending):
+            Finish_Next()
+
+        sector_plan = Plan_Sector_Scaling(
+            galaxy, sector, sector_scaling_factors[sector], 
+            debug = False, precision_steps = precision_steps)
+        result = pool.apply_async(_Run_Scaling_Steps_Job, sector_plan.Get_Step_Args())
+        pending.append((sector_plan, keys, result))
+
+    while pending:
+        Finish_Next()
+    return
+
+
 def Scale_Sector(galaxy, sector, scaling_factor, debug, precision_steps):
     '''
     Scale a single sector to roughly match the scaling factor.
@@ -176,6 +261,86 @@ def Scale_Sector(galaxy, sector, scaling_factor, debug, precision_steps):
     # in some way (eg. cluster-level objects will need to know their
     # final cluster-level position).
 
+    # The work is split into planning (collecting objects), the scaling
+    # steps, and finishing (pushing positions back). The steps only
+    # touch the objects, so can be run in a separate process.
+    sector_plan = Plan_Sector_Scaling(galaxy, sector, scaling_factor, debug, precision_steps)
+    Run_Scaling_Steps(
+        sector_plan.objects, 
+        sector_plan.target_sector_size,
+        sector_plan.step_scaling, 
+        precision_steps, 
+        debug)
+    Finish_Sector_Scaling(galaxy, sector_plan, debug)
+    return
+
+
+class Sector_Plan:
+    '''
+    Objects and sizing for scaling one sector, gathered before the
+    scaling steps and used afterward to push the results back.
+
+    * sector
+      - The Sector being scaled.
+    * scaling_factor
+      - Float, the sector scaling factor.
+    * objects
+      - List of Objects to be moved.
+    * sector_center
+      - Position of the sector center, before scaling.
+    * sector_size
+      - Float, sector size before scaling.
+    * target_sector_size
+      - Float, sector size aimed for.
+    * step_scaling
+      - Float, scaling applied at each step.
+    * precision_steps
+      - Int, number of scaling steps.
+    '''
+    def __init__(self, sector, scaling_factor, objects, sector_center, 
+                 sector_size, target_sector_size, step_scaling, precision_steps):
+        self.sector = sector
+        self.scaling_factor = scaling_factor
+        self.objects = objects
+        self.sector_center = sector_center
+        self.sector_size = sector_size
+        self.target_sector_size = target_sector_size
+        self.step_scaling = step_scaling
+        self.precision_steps = precision_steps
+        return
+
+
+    def Get_Step_Args(self):
+        '''
+        Returns a tuple of picklable args for _Run_Scaling_Steps_Job.
+        '''
+        return (
+            [x.Get_Plan() for x in self.objects],
+            self.target_sector_size,
+            self.step_scaling,
+            self.precision_steps,
+            )
+
+
+    def Record_Step_Results(self, coords):
+        '''
+        Update object sector positions with the (x,y,z) tuples returned
+        by _Run_Scaling_Steps_Job, matching what Run_Scaling_Steps
+        would have done to them.
+        '''
+        if not self.precision_steps:
+            return
+        for object, (x, y, z) in zip(self.objects, coords):
+            object.sector_pos = object.sector_pos.Copy_With(x, y, z)
+        return
+
+
+def Plan_Sector_Scaling(galaxy, sector, scaling_factor, debug, precision_steps):
+    '''
+    Collect the objects of a sector to be scaled, and work out its
+    sizing, returning a Sector_Plan. God objects with randomized
+    positions are scaled here directly.
+    '''
     # Attach the scaling factor to the sector. Used in sector Size()
     # calculations to select a minimum.
     sector.Set_Scaling_Factor(scaling_factor)
@@ -333,10 +498,10 @@ def Scale_Sector(galaxy, sector, scaling_factor, debug, precision_steps):
         Plugin_Log.Print('\n'.join(lines))
 
     
-    # Put all objects into groups, starting with one per group.
+    # Put all objects into groups, starting with one per group (done
+    # below, for the non-array path).
     # Do this after sector center adjustment, to avoid the group
     # sector_pos being off.
-    object_groups = [Object_Group([x]) for x in objects]
 
     # TODO: any special case forced groupings.
     # - Spline endpoints with their highway entry/exit zones (maybe handled by radius).
@@ -357,63 +522,74 @@ def Scale_Sector(galaxy, sector, scaling_factor, debug, precision_steps):
     # smaller during testing.
     step_scaling = scaling_factor ** (1 / precision_steps)
 
-    for step in range(precision_steps):
-        # Start by looking for groups that can/should be merged (since this
-        # may occur on the first iteration for objects that are already
-        # at or below the min allowed distance).
+    return Sector_Plan(
+        sector             = sector,
+        scaling_factor     = scaling_factor,
+        objects            = objects,
+        sector_center      = sector_center,
+        sector_size        = sector_size,
+        target_sector_size = target_sector_size,
+        step_scaling       = step_scaling,
+        precision_steps    = precision_steps,
+        )
+
+
+def Run_Scaling_Steps(objects, target_sector_size, step_scaling, 
+                      precision_steps, debug = False):
+    '''
+    Run the scaling steps on a sector's objects, moving them toward
+    the center and merging groups that get too close. Only the
+    object sector positions are changed.
+    '''
+    # When numpy is available, run the steps on arrays instead, which
+    # gives the same results faster. Debug mode sticks with the below,
+    # for its step by step printouts.
+    if numpy != None and not debug:
+        object_arrays = Object_Arrays(objects)
+        for step in range(precision_steps):
+            object_arrays.Merge_Groups(target_sector_size, step_scaling)
+            object_arrays.Scale_Pos(step_scaling)
+        if precision_steps:
+            object_arrays.Write_Positions()
+    else:
+        object_groups = [Object_Group([x]) for x in objects]
+        for step in range(precision_steps):
+            # Start by looking for groups that can/should be merged (since this
+            # may occur on the first iteration for objects that are already
+            # at or below the min allowed distance).
         
-        if debug:
-            Plugin_Log.Print('Starting step {} of {}'.format(step+1, precision_steps))
-
-        # Each loop may do a merge of two groups, but to allow chain merging,
-        # the loops will keep checking until no changes occur.
-        groups_to_check = [x for x in object_groups]
-        while groups_to_check:
-            this_group = groups_to_check.pop(0)
-
-            # Check against all existing groups.
-            for other_group in object_groups:
-                # Skip self.
-                if this_group is other_group:
-                    continue
-
-                # TODO: tweak merging rules when expanding the sector,
-                # since only highway splines need to be kept together.
-
-                # Are they close enough that they should merge?
-                # TODO: force merging of region and object on first pass
-                # if they are at the same position.
-                if this_group.Should_Merge_With(other_group, target_sector_size, step_scaling):
-                    
-                    # Prune both original groups out.
-                    object_groups.remove(this_group)
-                    object_groups.remove(other_group)
-                    if other_group in groups_to_check:
-                        groups_to_check.remove(other_group)
-
-                    # Add in the merged group.
-                    new_group = Object_Group(
-                        objects = this_group.objects + other_group.objects)
-                    object_groups.append(new_group)
-                    # Set the new_group to be checked.
-                    groups_to_check.append(new_group)
-                    
-                    if debug:
-                        lines = ['', 'merging: ']
-                        for object in this_group.objects:
-                            lines.append('  '+str(object))
-                        lines.append('with:')
-                        for object in other_group.objects:
-                            lines.append('  '+str(object))
-                        lines.append('center: {}'.format(new_group.sector_pos))
-                        lines.append('')
-                        Plugin_Log.Print('\n'.join(lines))
-                    break
-                
-        # Increment everything to be closer (apply change).
-        for group in object_groups:
-            group.Scale_Pos(step_scaling)
-            
+            if debug:
+                Plugin_Log.Print('Starting step {} of {}'.format(step+1, precision_steps))
+
+            object_groups = Merge_Object_Groups(
+                object_groups, target_sector_size, step_scaling, debug)
+
+            # Increment everything to be closer (apply change).
+            for group in object_groups:
+                group.Scale_Pos(step_scaling)
+    return
+
+
+def _Run_Scaling_Steps_Job(plans, target_sector_size, step_scaling, precision_steps):
+    '''
+    Worker process function: run the scaling steps on objects rebuilt
+    from their Get_Plan tuples, returning a list of final (x,y,z).
+    '''
+    objects = [Object.From_Plan(x) for x in plans]
+    Run_Scaling_Steps(objects, target_sector_size, step_scaling, precision_steps)
+    return [(x.sector_pos.x, x.sector_pos.y, x.sector_pos.z) for x in objects]
+
+
+def Finish_Sector_Scaling(galaxy, sector_plan, debug):
+    '''
+    Push the scaled object positions of a Sector_Plan back to the
+    galaxy, after adding any new zones.
+    '''
+    sector         = sector_plan.sector
+    objects        = sector_plan.objects
+    sector_center  = sector_plan.sector_center
+    sector_size    = sector_plan.sector_size
+    scaling_factor = sector_plan.scaling_factor
 
     if debug:
         lines = [
@@ -520,6 +696,95 @@ def Scale_Sector(galaxy, sector, scaling_factor, debug, precision_steps):
     return
 
 
+def Merge_Object_Groups(object_groups, sector_size, scaling, debug = False):
+    '''
+    Merge any groups whose objects are too close together, chaining
+    merges until none remain. Returns a new list of groups, in the
+    order they would be in if merged groups were removed from
+    object_groups and new groups appended.
+
+    To avoid checking every pair of groups and objects, a spatial grid
+    proposes nearby candidate objects; their groups are then checked
+    in list order, using only the candidate object pairs, so that the
+    merges are the same as checking everything.
+    '''
+    # Objects don't move during merging, so one grid serves all checks,
+    # and the candidates of each object can be reused.
+    objects = [x for group in object_groups for x in group.objects]
+    grid = Object_Grid(objects, scaling)
+    object_candidates_dict = {id(x) : grid.Get_Candidates(x) for x in objects}
+
+    # Dict of live groups in list order, holding their order index;
+    # also a dict mapping (by object id) each object to its group.
+    group_order_dict = {}
+    object_group_dict = {}
+    for group in object_groups:
+        group_order_dict[group] = len(group_order_dict)
+        for object in group.objects:
+            object_group_dict[id(object)] = group
+    next_order = len(group_order_dict)
+
+    # Each loop may do a merge of two groups, but to allow chain merging,
+    # the loops will keep checking until no changes occur.
+    # This is a dict used as an ordered set.
+    groups_to_check = dict.fromkeys(object_groups)
+    while groups_to_check:
+        this_group = next(iter(groups_to_check))
+        del groups_to_check[this_group]
+
+        # Gather nearby groups, with the object pairs that might merge.
+        group_pairs_dict = defaultdict(list)
+        for object in this_group.objects:
+            for other_object in object_candidates_dict[id(object)]:
+                other_group = object_group_dict[id(other_object)]
+                if other_group is not this_group:
+                    group_pairs_dict[other_group].append((object, other_object))
+        # Check in list order.
+        other_groups = sorted(group_pairs_dict, key = group_order_dict.__getitem__)
+
+        for other_group in other_groups:
+
+            # TODO: tweak merging rules when expanding the sector,
+            # since only highway splines need to be kept together.
+
+            # Are they close enough that they should merge?
+            # TODO: force merging of region and object on first pass
+            # if they are at the same position.
+            # (This matches Object_Group.Should_Merge_With, limited
+            # to pairs that are near enough.)
+            if any(x.Should_Merge_With(y, sector_size, scaling)
+                   for x, y in group_pairs_dict[other_group]):
+
+                # Prune both original groups out.
+                del group_order_dict[this_group]
+                del group_order_dict[other_group]
+                groups_to_check.pop(other_group, None)
+
+                # Add in the merged group.
+                new_group = Object_Group(
+                    objects = this_group.objects + other_group.objects)
+                group_order_dict[new_group] = next_order
+                next_order += 1
+                for object in new_group.objects:
+                    object_group_dict[id(object)] = new_group
+                # Set the new_group to be checked.
+                groups_to_check[new_group] = None
+                    
+                if debug:
+                    lines = ['', 'merging: ']
+                    for object in this_group.objects:
+                        lines.append('  '+str(object))
+                    lines.append('with:')
+                    for object in other_group.objects:
+                        lines.append('  '+str(object))
+                    lines.append('center: {}'.format(new_group.sector_pos))
+                    lines.append('')
+                    Plugin_Log.Print('\n'.join(lines))
+                break
+
+    return list(group_order_dict)
+
+
 def Create_Zones(galaxy, sector, objects, scaling_factor):
     '''
     Create additional zones in this sector. New zones are packed into
@@ -3,12 +3,17 @@ from Framework.Documentation import Doc_Category_Default
 _doc_category = Doc_Category_Default('Utilities')
 
 from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import json
+from time import time
 # Note: re was looked at, but deemed overkill when just regular
 # wildcard expressions are good enough for all expected uses.
 #import re
 from fnmatch import fnmatch
 
 from Framework import Utility_Wrapper, File_Manager, Cat_Hash_Exception, Print
+from Framework import Settings
 
 
 @Utility_Wrapper(uses_paths_from_settings = False)
@@ -17,7 +22,9 @@ def Cat_Unpack(
         dest_dir_path,
         include_pattern  = None,
         exclude_pattern  = None,
-        allow_md5_errors = False
+        allow_md5_errors = False,
+        use_manifest     = True,
+        max_workers      = None,
     ):
     '''
     Unpack a single catalog file, or a group if a folder given.
@@ -44,6 +51,18 @@ def Cat_Unpack(
       - Bool, if True then files with md5 errors will be unpacked, otherwise
         they are skipped.
       - Such errors may arise from poorly constructed catalog files.
+    * use_manifest
+      - Bool, if True then a record of the hash, size, and modification
+        time of every extracted file is kept in a json file next to the
+        dest folder (named after it), so that unchanged files can be
+        skipped on later unpacks without rehashing them.
+      - The file is kept outside the dest folder so that packing that
+        folder back up does not include it.
+      - Defaults True.
+    * max_workers
+      - Int, optional, number of threads used to extract and hash files.
+      - Defaults to a count based on the cpu count; 1 extracts serially,
+        as does enabling Settings.disable_threading.
     '''
     # Do some error checking on the paths.
     try:
@@ -101,66 +120,90 @@ def Cat_Unpack(
     num_pattern_skips = 0
     num_hash_skips    = 0
     num_md5_skips     = 0
-    
+    num_bytes_written = 0
 
-    # TODO:
-    # Record a json record of already extracted file hashes, for fast
-    # checking them instead of re-hashing every time.
+    if Settings.profile:
+        start = time()
 
-    # TODO:
-    # Switch to pulling out all virtual_paths first, then use fnmatch.filter
-    # on them for each pattern, then use some set operations to merge the
-    # results down to the desired set of paths.
-    # This would mostly be useful if switching to storing hashes from
-    # prior extractions for fast comparison, as currently the hashing
-    # takes far more time than the fnmatching.
+    # Load the record of prior extractions, if any.
+    manifest = _Unpack_Manifest(dest_dir_path) if use_manifest else None
 
-    # Loop over the Cat_Entry objects; the reader takes care of
-    #  cat priorities.
+    # Pick out the catalog reader providing each file, taking the highest
+    # priority one when a file is repeated (matching Get_Cat_Entries),
+    # and group the files by dat file for the workers.
     # Note: virtual_path is lowercase, but cat_entry.cat_path has
     #  original case.
-    for virtual_path, cat_entry in source_reader.Get_Cat_Entries().items():
-
-        # Skip if a pattern given and this doesn't match.
-        if not _Pattern_Match(virtual_path, include_pattern, exclude_pattern):
-            num_pattern_skips += 1
-            continue
-
-        dest_path = dest_dir_path / cat_entry.cat_path
-
-        # To save some effort, check if the file already exists at
-        #  the dest, and if so, get its md5 hash.
-        if dest_path.exists():
-            existing_binary = dest_path.read_bytes()
-            dest_hash = File_Manager.Cat_Reader.Get_Hash_String(existing_binary)
-            # If hashes match, skip.
-            # Ego uses 0's instead of a proper hash for empty files, so also
-            # check that case.
-            if (dest_hash == cat_entry.hash_str 
-            or (not existing_binary and cat_entry.hash_str == '00000000000000000000000000000000')):
-                num_hash_skips += 1
+    dat_groups = defaultdict(list)
+    virtual_paths_seen = set()
+    for cat_path in source_reader.catalog_file_dict:
+        cat_reader = source_reader.Get_Catalog_Reader(cat_path)
+        for virtual_path, cat_entry in cat_reader.Get_Cat_Entries().items():
+            if virtual_path in virtual_paths_seen:
                 continue
+            virtual_paths_seen.add(virtual_path)
 
-        # Make a folder for the dest if needed.
-        dest_path.parent.mkdir(parents = True, exist_ok = True)
-
-        # Get the file binary, catching any md5 error.
-        # This will only throw the exception if allow_md5_errors is False.
-        try:
-            cat_path, file_binary = source_reader.Read_Catalog_File(
-                virtual_path,
-                allow_md5_error = allow_md5_errors)
-        except Cat_Hash_Exception:
-            num_md5_skips += 1
-            continue
-        
-        # Write it back out to the destination.
-        with open(dest_path, 'wb') as file:
-            file.write(file_binary)
+            # Skip if a pattern given and this doesn't match.
+            if not _Pattern_Match(virtual_path, include_pattern, exclude_pattern):
+                num_pattern_skips += 1
+                continue
+            dat_groups[cat_reader].append((virtual_path, cat_entry))
+
+    # Split the groups into jobs of files in dat offset order, so each
+    # worker reads mostly sequentially. Big dats get split across
+    # several jobs to balance the load.
+    jobs = []
+    for cat_reader, entries in dat_groups.items():
+        entries.sort(key = lambda x: x[1].start_byte)
+        job = []
+        job_bytes = 0
+        for entry in entries:
+            job.append(entry)
+            job_bytes += entry[1].num_bytes
+            if len(job) >= _unpack_job_max_files or job_bytes >= _unpack_job_max_bytes:
+                jobs.append((cat_reader, job))
+                job = []
+                job_bytes = 0
+        if job:
+            jobs.append((cat_reader, job))
+
+    def Run_Job(job_args):
+        cat_reader, entries = job_args
+        return [_Unpack_Entry(cat_reader, virtual_path, cat_entry, 
+                              dest_dir_path, manifest, allow_md5_errors)
+                for virtual_path, cat_entry in entries]
+
+    # Run the jobs, in a thread pool unless disabled.
+    # Hashing and file io release the gil, so threads work well here,
+    # and avoid having to send cat readers to other processes.
+    if max_workers == 1 or Settings.disable_threading:
+        job_results = map(Run_Job, jobs)
+        executor = None
+    else:
+        executor = ThreadPoolExecutor(max_workers = max_workers)
+        job_results = executor.map(Run_Job, jobs)
 
-        # Be verbose for now.
-        num_writes += 1
-        Print('Extracted {}'.format(virtual_path))
+    try:
+        # Handle results in the main thread, in job order.
+        for results in job_results:
+            for virtual_path, status, record in results:
+                if status == 'written':
+                    num_writes += 1
+                    num_bytes_written += record['size']
+                    # Be verbose for now.
+                    Print('Extracted {}'.format(virtual_path))
+                elif status == 'skipped':
+                    num_hash_skips += 1
+                elif status == 'md5_error':
+                    num_md5_skips += 1
+
+                if manifest != None and record != None:
+                    manifest.Record(virtual_path, record)
+    finally:
+        if executor != None:
+            executor.shutdown()
+        # Save progress even if something failed partway.
+        if manifest != None:
+            manifest.Store()
 
         
     Print('Files written                    : {}'.format(num_writes))
@@ -168,9 +211,173 @@ def Cat_Unpack(
     Print('Files skipped (hash match)       : {}'.format(num_hash_skips))
     Print('Files skipped (md5 hash failure) : {}'.format(num_md5_skips))    
 
+    # Done with the dat files.
+    if Settings.profile:
+        Print('Cat_Unpack time: {:.2f} s, {:.1f} MB written'.format(
+            time() - start, num_bytes_written / 1e6))
+        File_Manager.Cat_Reader.Dat_File_Pool.Print_Stats()
+    File_Manager.Cat_Reader.Dat_File_Pool.Close_All()
     return
 
 
+# Limits on how much work goes in one Cat_Unpack job.
+_unpack_job_max_files = 500
+_unpack_job_max_bytes = 64 * 1024 * 1024
+
+# Ego uses 0's instead of a proper hash for empty files.
+_empty_file_cat_hash = '00000000000000000000000000000000'
+
+
+def _Unpack_Entry(
+        cat_reader,
+        virtual_path,
+        cat_entry,
+        dest_dir_path,
+        manifest,
+        allow_md5_errors,
+    ):
+    '''
+    Extract a single catalog entry to the dest folder, unless an
+    identical file is already there.
+    Returns a tuple of (virtual_path, status, manifest record), where
+    status is one of 'written', 'skipped', or 'md5_error', and the
+    record is a dict for the manifest or None.
+    Safe to call from worker threads; the manifest is only read.
+    '''
+    dest_path = dest_dir_path / cat_entry.cat_path
+
+    # To save some effort, check if the file already exists at
+    #  the dest. If it matches the manifest record, it can be skipped
+    #  without reading; otherwise get its md5 hash.
+    if dest_path.exists():
+        if manifest != None and manifest.Is_Unchanged(
+                virtual_path, dest_path, cat_entry.hash_str):
+            return (virtual_path, 'skipped', None)
+
+        existing_binary = dest_path.read_bytes()
+        dest_hash = File_Manager.Cat_Reader.Get_Hash_String(existing_binary)
+        # If hashes match, skip.
+        # Also check the empty file case.
+        if (dest_hash == cat_entry.hash_str 
+        or (not existing_binary and cat_entry.hash_str == _empty_file_cat_hash)):
+            return (virtual_path, 'skipped', 
+                    _Unpack_Manifest.Make_Record(dest_path, cat_entry.hash_str))
+
+    # Get the file binary, catching any md5 error.
+    # This will only throw the exception if allow_md5_errors is False.
+    try:
+        file_binary = cat_reader.Read(
+            virtual_path,
+            allow_md5_error = allow_md5_errors,
+            as_memoryview = True)
+    except Cat_Hash_Exception:
+        return (virtual_path, 'md5_error', None)
+
+    # When md5 errors are allowed, the data may not match the cat hash,
+    # so record what was actually written.
+    if allow_md5_errors:
+        hash_str = File_Manager.Cat_Reader.Get_Hash_String(file_binary)
+    else:
+        hash_str = cat_entry.hash_str
+
+    # Make a folder for the dest if needed.
+    dest_path.parent.mkdir(parents = True, exist_ok = True)
+
+    # Write it back out to the destination.
+    # When dats are pooled, this writes straight from the mapped
+    # dat without an intermediate copy.
+    with open(dest_path, 'wb') as file:
+        file.write(file_binary)
+    if isinstance(file_binary, memoryview):
+        file_binary.release()
+
+    return (virtual_path, 'written', 
+            _Unpack_Manifest.Make_Record(dest_path, hash_str))
+
+
+class _Unpack_Manifest:
+    '''
+    Record of files extracted by Cat_Unpack into a dest folder, saved as
+    json, used to skip unchanged files without rehashing them.
+
+    The json is stored beside the dest folder, eg. "unpacked" gets
+    "unpacked.cat_unpack_manifest.json", so it isn't mistaken for
+    game content; Cat_Pack also skips any such files it finds.
+
+    Attributes:
+    * path
+      - Path to the manifest json file.
+    * records
+      - Dict, keyed by virtual_path, holding dicts with the 'hash',
+        'size', and 'mtime_ns' of the extracted file.
+    * modified
+      - Bool, True if records changed since loading.
+    '''
+    file_name = 'cat_unpack_manifest.json'
+
+    def __init__(self, dest_dir_path):
+        self.path = dest_dir_path.parent / (dest_dir_path.name + '.' + self.file_name)
+        self.records = {}
+        self.modified = False
+
+        # Load in a try/except; a bad manifest just gets rebuilt.
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as file:
+                    self.records = json.load(file)
+            except Exception:
+                self.records = {}
+        return
+
+
+    @staticmethod
+    def Make_Record(dest_path, hash_str):
+        '''
+        Returns a record dict for the file at dest_path with the given hash.
+        '''
+        stat = dest_path.stat()
+        return {'hash'     : hash_str,
+                'size'     : stat.st_size,
+                'mtime_ns' : stat.st_mtime_ns}
+
+
+    def Is_Unchanged(self, virtual_path, dest_path, hash_str):
+        '''
+        Returns True if the file at dest_path matches its record, by
+        size and modification time, and the recorded hash matches
+        the given catalog hash.
+        '''
+        record = self.records.get(virtual_path)
+        if record == None or record['hash'] != hash_str:
+            return False
+        stat = dest_path.stat()
+        return (stat.st_size == record['size'] 
+                and stat.st_mtime_ns == record['mtime_ns'])
+
+
+    def Record(self, virtual_path, record):
+        '''
+        Record a file as extracted or verified.
+        '''
+        if self.records.get(virtual_path) != record:
+            self.records[virtual_path] = record
+            self.modified = True
+        return
+
+
+    def Store(self):
+        '''
+        Write the manifest, if anything changed.
+        '''
+        if not self.modified:
+            return
+        self.path.parent.mkdir(parents = True, exist_ok = True)
+        with open(self.path, 'w') as file:
+            json.dump(self.records, file, indent = 2, sort_keys = True)
+        self.modified = False
+        return
+
+
 
 @Utility_Wrapper(uses_paths_from_settings = False)
 def Cat_Pack(
@@ -262,6 +469,12 @@ def Cat_Pack(
             num_pattern_skips += 1
             continue
 
+        # Skip Cat_Unpack manifests, which are not game content. (Older
+        # versions stored these inside the unpacked folder.)
+        if virtual_path.endswith(_Unpack_Manifest.file_name):
+            num_pattern_skips += 1
+            continue
+
         # Skip all that do not match an expected X4 subfolder.
         if not any(virtual_path.startswith(x) for x in subfolder_names):
             num_folder_skips += 1
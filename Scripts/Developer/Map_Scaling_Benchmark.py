@@ -0,0 +1,240 @@
+'''
+Benchmark of the sector scaling group merge loop, comparing the
+grid accelerated Merge_Object_Groups and the numpy Object_Arrays
+(if numpy is available) against the original check of every group
+pair, on a seeded synthetic galaxy. Verifies that all produce
+identical groups and final object positions.
+
+Also runs the scaling steps in a process pool, on objects sent as
+Get_Plan tuples (as done for sectors scaled in parallel), and checks
+the final positions match Run_Scaling_Steps in this process.
+'''
+import sys
+import random
+import pickle
+from multiprocessing import Pool
+from copy import copy, deepcopy
+from time import time
+from types import SimpleNamespace
+from pathlib import Path
+
+# Allow running this directly, without the customizer launcher.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from Plugins.Classes import Position
+from Plugins.Transforms.Map.Classes import Object, Object_Group, Object_Arrays, Region_Macro
+from Plugins.Transforms.Map.Classes.Objects import numpy
+from Plugins.Transforms.Map.Scaling import Merge_Object_Groups, Run_Scaling_Steps
+from Plugins.Transforms.Map.Scaling import _Run_Scaling_Steps_Job
+
+# Galaxy shape, and seed for repeatable runs.
+num_sectors = 8
+zones_per_sector = 150
+regions_per_sector = 6
+highways_per_sector = 6
+splines_per_highway = 30
+seed = 0
+# Scaling setup, similar to Scale_Sector_Size defaults.
+scaling_factor = 0.4
+precision_steps = 10
+
+
+def Make_Sector_Objects(rand):
+    '''
+    Returns a list of synthetic Objects for one sector.
+    '''
+    objects = []
+    def Rand_Pos(spread, y_spread = 10000):
+        return Position(
+            x = rand.uniform(-spread, spread),
+            y = rand.uniform(-y_spread, y_spread),
+            z = rand.uniform(-spread, spread))
+
+    for i in range(zones_per_sector):
+        object = Object(
+            name = f'zone_{i}',
+            type = Object,
+            sector_pos = Rand_Pos(250000),
+            md_object = SimpleNamespace(radius = rand.choice([5000, 6000, 8000])))
+        # A few gates per sector.
+        if i < 3:
+            object.contains_gate = True
+            object.radius += 5000
+        objects.append(object)
+
+    for i in range(regions_per_sector):
+        radius = rand.uniform(10000, 80000)
+        # Some regions do damage, which changes how they merge.
+        is_damage = rand.random() < 0.3
+        region = SimpleNamespace(
+            radius = radius,
+            inner_radius = radius * 0.8 if rand.random() < 0.5 else None,
+            Is_Damage_Region = lambda x = is_damage: x)
+        objects.append(Object(
+            name = f'region_{i}',
+            type = Region_Macro,
+            sector_pos = Rand_Pos(200000),
+            connection = SimpleNamespace(macro = region)))
+
+    for h in range(highways_per_sector):
+        start = Rand_Pos(250000, 2000)
+        end = Rand_Pos(250000, 2000)
+        for i in range(splines_per_highway):
+            ratio = i / (splines_per_highway - 1)
+            spline_pos = start + (end - start) * ratio
+            # Every other spline is a dummy.
+            spline_pos.dummy = i % 2 == 1
+            objects.append(Object(
+                name = f'highway_{h}_spline[{i}]',
+                type = Object,
+                sector_pos = copy(spline_pos),
+                spline_pos = spline_pos))
+    return objects
+
+
+def Merge_Object_Groups_Brute(object_groups, sector_size, scaling):
+    '''
+    Reference merge, checking every group pair, matching the original
+    Scale_Sector loop.
+    '''
+    object_groups = list(object_groups)
+    groups_to_check = [x for x in object_groups]
+    while groups_to_check:
+        this_group = groups_to_check.pop(0)
+        for other_group in object_groups:
+            if this_group is other_group:
+                continue
+            if this_group.Should_Merge_With(other_group, sector_size, scaling):
+                object_groups.remove(this_group)
+                object_groups.remove(other_group)
+                if other_group in groups_to_check:
+                    groups_to_check.remove(other_group)
+                new_group = Object_Group(
+                    objects = this_group.objects + other_group.objects)
+                object_groups.append(new_group)
+                groups_to_check.append(new_group)
+                break
+    return object_groups
+
+
+def Scale(sectors, merge_func):
+    '''
+    Runs the scaling steps over all sectors, returning a summary of
+    the final groups and object positions per sector.
+    '''
+    results = []
+    step_scaling = scaling_factor ** (1 / precision_steps)
+    for objects in sectors:
+        # Rough sector size, as would be found from gate distances.
+        target_sector_size = 400000 * scaling_factor
+        object_groups = [Object_Group([x]) for x in objects]
+        for step in range(precision_steps):
+            object_groups = merge_func(object_groups, target_sector_size, step_scaling)
+            for group in object_groups:
+                group.Scale_Pos(step_scaling)
+        results.append((
+            [[x.name for x in group.objects] for group in object_groups],
+            [(x.name, x.sector_pos.x, x.sector_pos.y, x.sector_pos.z) for x in objects],
+            ))
+    return results
+
+
+def Scale_Arrays(sectors):
+    '''
+    As Scale, but using Object_Arrays.
+    '''
+    results = []
+    step_scaling = scaling_factor ** (1 / precision_steps)
+    for objects in sectors:
+        target_sector_size = 400000 * scaling_factor
+        object_arrays = Object_Arrays(objects)
+        for step in range(precision_steps):
+            object_arrays.Merge_Groups(target_sector_size, step_scaling)
+            object_arrays.Scale_Pos(step_scaling)
+        object_arrays.Write_Positions()
+        results.append((
+            [[objects[i].name for i in group] 
+             for group in object_arrays.object_groups.values()],
+            [(x.name, x.sector_pos.x, x.sector_pos.y, x.sector_pos.z) for x in objects],
+            ))
+    return results
+
+
+def Scale_Serial(sectors):
+    '''
+    Runs Run_Scaling_Steps on each sector, returning the final object
+    positions per sector.
+    '''
+    step_scaling = scaling_factor ** (1 / precision_steps)
+    results = []
+    for objects in sectors:
+        Run_Scaling_Steps(objects, 400000 * scaling_factor, step_scaling, precision_steps)
+        results.append([(x.sector_pos.x, x.sector_pos.y, x.sector_pos.z) for x in objects])
+    return results
+
+
+def Scale_Pool(sectors):
+    '''
+    As Scale_Serial, but sending Get_Plan tuples of each sector's
+    objects to _Run_Scaling_Steps_Job in a process pool.
+    '''
+    step_scaling = scaling_factor ** (1 / precision_steps)
+    with Pool() as pool:
+        jobs = []
+        for objects in sectors:
+            args = ([x.Get_Plan() for x in objects],
+                    400000 * scaling_factor, step_scaling, precision_steps)
+            # Make sure the args survive pickling, as the pool requires.
+            pickle.loads(pickle.dumps(args))
+            jobs.append(pool.apply_async(_Run_Scaling_Steps_Job, args))
+        results = [x.get() for x in jobs]
+    return results
+
+
+def Run():
+    rand = random.Random(seed)
+    sectors = [Make_Sector_Objects(rand) for _ in range(num_sectors)]
+    num_objects = sum(len(x) for x in sectors)
+    print('Synthetic galaxy: {} sectors, {} objects, {} steps'.format(
+        num_sectors, num_objects, precision_steps))
+
+    timings = {}
+    results = {}
+    engines = [
+        ('brute', lambda x: Scale(x, Merge_Object_Groups_Brute)),
+        ('grid' , lambda x: Scale(x, Merge_Object_Groups)),
+        ]
+    if numpy != None:
+        engines.append(('arrays', Scale_Arrays))
+    else:
+        print('numpy not found; skipping Object_Arrays')
+
+    for label, func in engines:
+        this_sectors = deepcopy(sectors)
+        start = time()
+        results[label] = func(this_sectors)
+        timings[label] = time() - start
+        print('{:<6}: {:.3f} s ({:.1f}x)'.format(
+            label, timings[label], 
+            timings['brute'] / timings[label] if timings[label] else 0))
+
+        if results[label] != results['brute']:
+            raise AssertionError('{} results differ from brute force'.format(label))
+    print('Results identical')
+
+    # Compare the worker job against the in-process steps.
+    pool_timings = {}
+    pool_results = {}
+    for label, func in [('serial', Scale_Serial), ('pool', Scale_Pool)]:
+        this_sectors = deepcopy(sectors)
+        start = time()
+        pool_results[label] = func(this_sectors)
+        pool_timings[label] = time() - start
+        print('{:<6}: {:.3f} s'.format(label, pool_timings[label]))
+    if pool_results['pool'] != pool_results['serial']:
+        raise AssertionError('pool results differ from serial')
+    print('Pool results identical')
+    return
+
+
+if __name__ == '__main__':
+    Run()
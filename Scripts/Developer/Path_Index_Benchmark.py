@@ -0,0 +1,120 @@
+'''
+Benchmark of Path_Index wildcard filtering against fnmatch.filter,
+using a synthetic set of virtual paths shaped like the game's.
+Verifies that both return the same results for each pattern.
+'''
+import sys
+import random
+import fnmatch
+from time import time
+from pathlib import Path
+
+# Allow running this directly, without the customizer launcher.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from Framework.File_Manager.Path_Index import Path_Index
+
+# Number of paths to generate, and seed for repeatable runs.
+num_paths = 200000
+seed = 0
+# How many times to repeat each pattern, for steadier timings.
+repeats = 5
+
+patterns = [
+    'assets/units/size_s/macros/*.xml',
+    'assets/units/size_*/macros/ship_*.xml',
+    'assets/props/*',
+    '*.xsd',
+    '*weapon*',
+    'libraries/wares.xml',
+    'md/?ob_*.xml',
+    'extensions/*/libraries/*.xml',
+    ]
+
+
+def Gen_Paths(count, seed):
+    '''
+    Returns a list of unique synthetic virtual paths.
+    '''
+    rand = random.Random(seed)
+    top_dirs = {
+        'assets' : ['units', 'props', 'fx', 'interiors', 'environments',
+                    'characters', 'wares', 'cutscenes', 'structures'],
+        'libraries' : [],
+        'md'        : [],
+        'aiscripts' : [],
+        'index'     : [],
+        'maps'      : ['xu_ep2_universe', 'dlc4_universe'],
+        'extensions': ['ego_dlc_split', 'ego_dlc_terran', 'ego_dlc_pirate'],
+        }
+    sub_dirs = ['size_xs', 'size_s', 'size_m', 'size_l', 'size_xl',
+                'weapons', 'engines', 'shields', 'turrets', 'storage']
+    leaf_dirs = ['macros', '', 'effects', 'textures']
+    name_parts = ['ship', 'weapon', 'engine', 'shield', 'turret', 'storage',
+                  'arg', 'par', 'tel', 'spl', 'bor', 'xen', 'kha', 'ter']
+    suffixes = ['.xml', '.xml', '.xml', '.xmf', '.xsd', '.lua', '.dds', '.ogg']
+
+    paths = set()
+    while len(paths) < count:
+        top = rand.choice(list(top_dirs))
+        folders = [top]
+        if top_dirs[top]:
+            folders.append(rand.choice(top_dirs[top]))
+            if top in ('assets', 'extensions'):
+                folders.append(rand.choice(sub_dirs))
+                leaf = rand.choice(leaf_dirs)
+                if leaf:
+                    folders.append(leaf)
+        name = '_'.join(rand.choice(name_parts)
+                        for _ in range(rand.randint(1, 3)))
+        name += '_{:02}'.format(rand.randint(0, 99))
+        if top == 'md' and rand.random() < 0.2:
+            name = rand.choice('gj') + 'ob_' + name
+        folders.append(name + rand.choice(suffixes))
+        paths.add('/'.join(folders))
+    # Return in a random but repeatable order.
+    paths = sorted(paths)
+    rand.shuffle(paths)
+    return paths
+
+
+def Run():
+    paths = Gen_Paths(num_paths, seed)
+
+    start = time()
+    index = Path_Index(paths)
+    print('Built index of {} paths in {:.3f} s'.format(len(index), time() - start))
+    print()
+    print('{:<42} {:>8} {:>12} {:>12} {:>8}'.format(
+        'pattern', 'matches', 'fnmatch ms', 'index ms', 'speedup'))
+
+    total_fn = 0
+    total_index = 0
+    for pattern in patterns:
+        start = time()
+        for _ in range(repeats):
+            fn_result = fnmatch.filter(paths, pattern)
+        fn_time = (time() - start) / repeats
+
+        start = time()
+        for _ in range(repeats):
+            index_result = index.Filter(pattern)
+        index_time = (time() - start) / repeats
+
+        if fn_result != index_result:
+            raise AssertionError('Result mismatch on pattern {}'.format(pattern))
+
+        total_fn += fn_time
+        total_index += index_time
+        print('{:<42} {:>8} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            pattern, len(fn_result), fn_time * 1000, index_time * 1000,
+            fn_time / index_time if index_time else 0))
+
+    print()
+    print('Total: fnmatch {:.2f} ms, index {:.2f} ms ({:.1f}x)'.format(
+        total_fn * 1000, total_index * 1000,
+        total_fn / total_index if total_index else 0))
+    return
+
+
+if __name__ == '__main__':
+    Run()
@@ -0,0 +1,116 @@
+'''
+Benchmark of XML_Diff.Verify_Patch, comparing verification on a full
+copy of the original xml against the default that only copies and
+patches the root children reached by patch ops, on a seeded synthetic
+wares file. Verifies that both agree on good patches, and on patches
+broken on purpose.
+'''
+import sys
+import random
+from copy import deepcopy
+from time import time
+from pathlib import Path
+
+# Allow running this directly, without the customizer launcher.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from Framework.File_Manager import XML_Diff
+# Share the wares generator of the XML_Diff benchmark suite.
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import XML_Diff_Benchmark
+
+# Wares file size, edits per patch, number of patches, and seed for
+# repeatable runs.
+num_wares = 3000
+edits_per_patch = 20
+num_patches = 10
+seed = 0
+
+
+def Make_Wares(rand):
+    '''
+    Returns a synthetic wares root, annotated with node ids.
+    '''
+    return XML_Diff.Fill_Node_IDs(XML_Diff_Benchmark.Make_Wares(rand, num_wares))
+
+
+def Edit_Wares(original, rand):
+    '''
+    Returns a copy of the wares root with random edits, similar to
+    what transforms do.
+    '''
+    modified = deepcopy(original)
+    wares = list(modified)
+    for _ in range(edits_per_patch):
+        ware = rand.choice(wares)
+        if ware.getparent() == None:
+            continue
+        edit = rand.randint(0, 5)
+        if edit <= 1:
+            # Price change.
+            price = ware.find('price')
+            price.set('max', str(int(price.get('max')) + rand.randint(1,100)))
+        elif edit == 2:
+            # New attribute.
+            ware.set('restriction', 'licence')
+        elif edit == 3:
+            # New production method, copied from an existing one.
+            ware.append(deepcopy(ware.find('production')))
+            ware[-1].set('method', 'split')
+        elif edit == 4:
+            # Remove a ware.
+            modified.remove(ware)
+        else:
+            # Add a new ware.
+            new_ware = deepcopy(ware)
+            new_ware.set('id', new_ware.get('id') + '_new')
+            modified.append(new_ware)
+    return modified
+
+
+def Break_Patch(patch, rand):
+    '''
+    Returns a copy of the patch with one op changed, so it should no
+    longer recreate the modified xml.
+    '''
+    patch = deepcopy(patch)
+    op = rand.choice(list(patch))
+    if op.tag == 'replace' and op.text != None:
+        op.text = op.text + '_broken'
+    else:
+        patch.remove(op)
+    return patch
+
+
+def Run():
+    rand = random.Random(seed)
+    original = Make_Wares(rand)
+    print('Synthetic wares: {} wares, {} nodes'.format(
+        num_wares, sum(1 for _ in original.iter())))
+
+    cases = []
+    for i in range(num_patches):
+        modified = Edit_Wares(original, rand)
+        patch = XML_Diff.Make_Patch(original, modified, maximal = False, verify = False)
+        cases.append((modified, patch, True))
+        cases.append((modified, Break_Patch(patch, rand), False))
+
+    timings = {}
+    for label, full_copy in [('full', True), ('shallow', False)]:
+        start = time()
+        results = [XML_Diff.Verify_Patch(original, modified, patch, full_copy = full_copy)
+                   for modified, patch, expected in cases]
+        timings[label] = time() - start
+        print('{:<7}: {:.3f} s ({:.1f}x)'.format(
+            label, timings[label],
+            timings['full'] / timings[label] if timings[label] else 0))
+
+        expected_results = [x[2] for x in cases]
+        if results != expected_results:
+            raise AssertionError('{} results differ from expected: {}'.format(
+                label, results))
+    print('Results identical')
+    return
+
+
+if __name__ == '__main__':
+    Run()
@@ -0,0 +1,389 @@
+'''
+Benchmark of the XML_Diff engine: Make_Patch, Apply_Patch and
+Verify_Patch, on seeded synthetic xml shaped like game files, with
+controlled mixes of edits. Records timings, peak memory and patch
+sizes to a json file, so that runs from different versions of the
+diff code can be compared.
+
+Usage:
+    python XML_Diff_Benchmark.py [output.json] [baseline.json]
+
+Results go to XML_Diff_Benchmark.json in the current folder by default.
+If a baseline json (from an earlier run) is given, timings are printed
+as ratios against it.
+
+Tree shapes:
+* wares
+  - Flat list of wares, each with a few levels of children, similar
+    to libraries/wares.xml.
+* components
+  - Deeper component trees of connections, parts and lods, similar
+    to asset component files, with some comments.
+* text
+  - Text pages holding many id'd text lines, similar to t files.
+
+Edit kinds, mixed by weight per edit mix:
+* insert
+  - Copy of an existing element, as a new node, added next to it.
+* delete
+  - Removal of an element.
+* attribute
+  - Change, addition or removal of an attribute, or a text change
+    for elements with text.
+* move
+  - Element moved to a random spot under a parent of the same tag.
+
+Peak memory is measured in a separate pass using tracemalloc, since
+it slows things down; it covers python allocations only, not the
+memory held by lxml itself.
+'''
+import sys
+import json
+import random
+import platform
+import tracemalloc
+from copy import deepcopy
+from time import time, strftime
+from pathlib import Path
+from lxml import etree as ET
+
+# Allow running this directly, without the customizer launcher.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from Framework.File_Manager import XML_Diff
+
+# Tree sizes, edits per patch, patches per case, and seed for
+# repeatable runs.
+num_wares = 1000
+num_components = 40
+connections_per_component = 30
+num_pages = 10
+lines_per_page = 400
+edits_per_patch = 30
+num_patches = 3
+seed = 0
+
+# Edit mixes, as dicts of edit kind weights.
+edit_mixes = {
+    'attributes' : {'attribute' : 1},
+    'inserts'    : {'insert' : 1},
+    'deletes'    : {'delete' : 1},
+    'moves'      : {'move' : 1},
+    'mixed'      : {'insert' : 1, 'delete' : 1, 'attribute' : 3, 'move' : 1},
+    }
+
+default_output = 'XML_Diff_Benchmark.json'
+
+
+def Make_Wares(rand, count = None):
+    '''
+    Returns a synthetic wares root, with count wares (defaulting to
+    num_wares). Also used by Verify_Patch_Benchmark.
+    '''
+    if count == None:
+        count = num_wares
+    root = ET.Element('wares')
+    for i in range(count):
+        ware = ET.SubElement(root, 'ware', id = f'ware_{i}',
+            name = f'{{20201,{i}}}', group = rand.choice(['ship','weapons','food']),
+            transport = 'container', volume = str(rand.randint(1,50)),
+            tags = 'container economy')
+        ET.SubElement(ware, 'price', min = str(i), average = str(i*2), max = str(i*3))
+        for method in rand.sample(['default','teladi','paranid','xenon'], 2):
+            production = ET.SubElement(ware, 'production', time = str(rand.randint(10,600)),
+                amount = str(rand.randint(1,100)), method = method, name = '{20206,101}')
+            primary = ET.SubElement(production, 'primary')
+            for j in range(rand.randint(1,4)):
+                ET.SubElement(primary, 'ware', ware = f'ware_{rand.randrange(count)}',
+                              amount = str(rand.randint(1,50)))
+        ET.SubElement(ware, 'icon', active = f'ware_{i}', video = f'ware_noise_{i}')
+        ET.SubElement(ware, 'owner', faction = rand.choice(['argon','teladi','paranid']))
+    return root
+
+
+def Make_Components(rand):
+    '''
+    Returns a synthetic components root, with deeper nesting.
+    '''
+    def Rand_Coord():
+        return str(round(rand.uniform(-500, 500), 3))
+
+    root = ET.Element('components')
+    for i in range(num_components):
+        # Note: 'class' is a python keyword, so pass attributes as a dict.
+        component = ET.SubElement(root, 'component', {
+            'name' : f'ship_{i}',
+            'class' : rand.choice(['ship_s', 'ship_m', 'ship_l'])})
+        ET.SubElement(component, 'source', geometry = f'assets/units/ship_{i}_data')
+        component.append(ET.Comment(f' connections for ship_{i} '))
+        connections = ET.SubElement(component, 'connections')
+        for j in range(connections_per_component):
+            connection = ET.SubElement(connections, 'connection', name = f'con_{j}',
+                tags = rand.choice(['part', 'weapon medium', 'engine', 'shield small']))
+            offset = ET.SubElement(connection, 'offset')
+            ET.SubElement(offset, 'position', x = Rand_Coord(), y = Rand_Coord(), z = Rand_Coord())
+            if rand.random() < 0.5:
+                ET.SubElement(offset, 'quaternion', qx = '0', qy = '0.7071', qz = '0', qw = '0.7071')
+            parts = ET.SubElement(connection, 'parts')
+            for k in range(rand.randint(1,3)):
+                part = ET.SubElement(parts, 'part', name = f'part_{j}_{k}')
+                lods = ET.SubElement(part, 'lods')
+                for lod_index in range(rand.randint(1,3)):
+                    lod = ET.SubElement(lods, 'lod', index = str(lod_index))
+                    materials = ET.SubElement(lod, 'materials')
+                    for m in range(rand.randint(1,2)):
+                        ET.SubElement(materials, 'material', id = str(m+1),
+                            ref = rand.choice(['p1.metal', 'p1.glass', 'p1.hull']))
+                size = ET.SubElement(part, 'size')
+                ET.SubElement(size, 'max', x = Rand_Coord(), y = Rand_Coord(), z = Rand_Coord())
+                ET.SubElement(size, 'center', x = Rand_Coord(), y = Rand_Coord(), z = Rand_Coord())
+    return root
+
+
+def Make_Text(rand):
+    '''
+    Returns a synthetic text root, with pages of id'd lines.
+    '''
+    words = ['argon', 'trade', 'station', 'sector', 'hull', 'shield',
+             'engine', 'pirate', 'mission', 'credits', 'gate', 'xenon']
+    root = ET.Element('language', id = '44')
+    for i in range(num_pages):
+        page = ET.SubElement(root, 'page', id = str(1001 + i),
+                             title = f'Page {i}', descr = '', voice = 'no')
+        for j in range(lines_per_page):
+            line = ET.SubElement(page, 't', id = str(j + 1))
+            line.text = ' '.join(rand.choice(words) for _ in range(rand.randint(1,12)))
+    return root
+
+
+tree_makers = {
+    'wares'      : Make_Wares,
+    'components' : Make_Components,
+    'text'       : Make_Text,
+    }
+
+
+def Get_Elements(root):
+    '''
+    Returns a list of the elements under the root, excluding the root
+    and comments.
+    '''
+    return [x for x in root.iter() if x is not root and isinstance(x.tag, str)]
+
+
+def Edit_Tree(original, edit_mix, rand):
+    '''
+    Returns a copy of the original root with edits_per_patch random
+    edits picked using the edit_mix weights, and a dict of counts of
+    the edit kinds applied.
+    '''
+    modified = deepcopy(original)
+    kinds = list(edit_mix.keys())
+    weights = [edit_mix[x] for x in kinds]
+    edit_counts = {x : 0 for x in kinds}
+
+    elements = Get_Elements(modified)
+    for _ in range(edits_per_patch):
+        kind = rand.choices(kinds, weights)[0]
+        # Pick an element still in the tree, skipping those deleted
+        # directly or along with an ancestor.
+        # Note: lxml keeps removed elements in the same document, so
+        # check the top ancestor instead of the root tree.
+        while True:
+            node = rand.choice(elements)
+            ancestors = list(node.iterancestors())
+            if ancestors and ancestors[-1] is modified:
+                break
+        parent = node.getparent()
+
+        if kind == 'insert':
+            # Copy without node ids, so it is treated as a new node.
+            new_node = deepcopy(node)
+            for subnode in new_node.iter():
+                subnode.tail = None
+            for attr in ['id', 'name']:
+                if attr in new_node.attrib:
+                    new_node.set(attr, new_node.get(attr) + '_new')
+            parent.insert(parent.index(node) + rand.randint(0,1), new_node)
+            elements.append(new_node)
+
+        elif kind == 'delete':
+            parent.remove(node)
+
+        elif kind == 'attribute':
+            if node.text and rand.random() < 0.5:
+                node.text = node.text + ' edited'
+            elif node.attrib and rand.random() < 0.8:
+                attr = rand.choice(sorted(node.attrib.keys()))
+                if rand.random() < 0.8:
+                    node.set(attr, node.get(attr) + '_edited')
+                else:
+                    del node.attrib[attr]
+            else:
+                node.set('edited', str(rand.randint(0,100)))
+
+        elif kind == 'move':
+            new_parent = rand.choice([x for x in modified.iter(parent.tag)
+                                      if x is not node and node not in x.iterancestors()])
+            parent.remove(node)
+            new_parent.insert(rand.randint(0, len(new_parent)), node)
+
+        edit_counts[kind] += 1
+    return modified, edit_counts
+
+
+def Measure(func, *args, memory = False):
+    '''
+    Calls func with the args, returning a tuple of (result, seconds,
+    peak kB). Peak kB is None unless memory is True, in which case
+    the timing includes tracemalloc overhead.
+    '''
+    if memory:
+        tracemalloc.start()
+    start = time()
+    result = func(*args)
+    seconds = time() - start
+    peak_kb = None
+    if memory:
+        peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result, seconds, peak_kb
+
+
+def Make_Patch(original, modified):
+    'Make_Patch as used for generating diff files, without verification.'
+    return XML_Diff.Make_Patch(original, modified, maximal = False, verify = False)
+
+
+def Run_Case(original, cases, memory = False):
+    '''
+    Runs the diff functions over the given list of (modified, edit_counts)
+    cases, returning a dict of totals.
+    '''
+    totals = {
+        'make_patch'   : 0,
+        'apply_patch'  : 0,
+        'verify_patch' : 0,
+        }
+    peaks = {x : 0 for x in totals}
+    patch_ops = 0
+    patch_bytes = 0
+    verified = True
+
+    for modified, edit_counts in cases:
+        patch, seconds, peak_kb = Measure(Make_Patch, original, modified, memory = memory)
+        totals['make_patch'] += seconds
+        peaks['make_patch'] = max(peaks['make_patch'], peak_kb or 0)
+
+        # Apply_Patch edits in place, so give it a copy.
+        original_copy = deepcopy(original)
+        _, seconds, peak_kb = Measure(XML_Diff.Apply_Patch, original_copy, patch, memory = memory)
+        totals['apply_patch'] += seconds
+        peaks['apply_patch'] = max(peaks['apply_patch'], peak_kb or 0)
+
+        success, seconds, peak_kb = Measure(XML_Diff.Verify_Patch, original, modified, patch, memory = memory)
+        totals['verify_patch'] += seconds
+        peaks['verify_patch'] = max(peaks['verify_patch'], peak_kb or 0)
+        verified &= success
+
+        patch_ops += len(patch)
+        patch_bytes += len(XML_Diff.Print(patch, encoding = 'utf-8'))
+
+    if memory:
+        return {f'{x}_peak_kb' : peaks[x] for x in peaks}
+    result = {f'{x}_s' : round(totals[x], 4) for x in totals}
+    result.update({
+        'patch_ops'   : patch_ops,
+        'patch_bytes' : patch_bytes,
+        'verified'    : verified,
+        })
+    return result
+
+
+def Compare(results, baseline):
+    '''
+    Prints timing ratios of the results against a baseline, matching
+    cases by shape and edit mix. Ratios above 1 are slower.
+    '''
+    baseline_dict = {(x['shape'], x['mix']) : x for x in baseline['cases']}
+    print('Against baseline from {}:'.format(baseline.get('date')))
+    for case in results['cases']:
+        base = baseline_dict.get((case['shape'], case['mix']))
+        if base == None:
+            continue
+        ratios = []
+        for field in ['make_patch_s', 'apply_patch_s', 'verify_patch_s']:
+            ratios.append('{:.2f}'.format(case[field] / base[field])
+                          if base.get(field) else '-')
+        print('  {:<11} {:<11} make {:>5}, apply {:>5}, verify {:>5}'.format(
+            case['shape'], case['mix'], *ratios))
+    return
+
+
+def Run(output_path = default_output, baseline_path = None):
+    rand = random.Random(seed)
+    results = {
+        'date'     : strftime('%Y-%m-%d %H:%M:%S'),
+        'python'   : platform.python_version(),
+        'lxml'     : '.'.join(str(x) for x in ET.LXML_VERSION),
+        'settings' : {
+            'seed'              : seed,
+            'num_wares'         : num_wares,
+            'num_components'    : num_components,
+            'connections_per_component' : connections_per_component,
+            'num_pages'         : num_pages,
+            'lines_per_page'    : lines_per_page,
+            'edits_per_patch'   : edits_per_patch,
+            'num_patches'       : num_patches,
+            },
+        'cases'    : [],
+        }
+
+    print('{:<11} {:<11} {:>7} {:>8} {:>8} {:>8} {:>6} {:>8} {:>9}'.format(
+        'shape', 'mix', 'nodes', 'make s', 'apply s', 'verify s',
+        'ops', 'bytes', 'peak kB'))
+    for shape, maker in tree_makers.items():
+        original = XML_Diff.Fill_Node_IDs(maker(rand))
+        num_nodes = sum(1 for _ in original.iter())
+
+        for mix_name, edit_mix in edit_mixes.items():
+            cases = [Edit_Tree(original, edit_mix, rand) for _ in range(num_patches)]
+            edit_counts = {}
+            for _, counts in cases:
+                for kind, count in counts.items():
+                    edit_counts[kind] = edit_counts.get(kind, 0) + count
+
+            case_result = {
+                'shape' : shape,
+                'mix'   : mix_name,
+                'nodes' : num_nodes,
+                'edits' : edit_counts,
+                }
+            case_result.update(Run_Case(original, cases))
+            case_result.update(Run_Case(original, cases, memory = True))
+            results['cases'].append(case_result)
+
+            print('{:<11} {:<11} {:>7} {:>8.3f} {:>8.3f} {:>8.3f} {:>6} {:>8} {:>9}{}'.format(
+                shape, mix_name, num_nodes,
+                case_result['make_patch_s'],
+                case_result['apply_patch_s'],
+                case_result['verify_patch_s'],
+                case_result['patch_ops'],
+                case_result['patch_bytes'],
+                max(case_result[x] for x in case_result if x.endswith('_peak_kb')),
+                '' if case_result['verified'] else '  (verify FAILED)'))
+
+    with open(output_path, 'w') as file:
+        json.dump(results, file, indent = 2)
+    print('Results written to {}'.format(output_path))
+
+    if baseline_path != None:
+        with open(baseline_path, 'r') as file:
+            Compare(results, json.load(file))
+
+    if not all(x['verified'] for x in results['cases']):
+        raise AssertionError('Some patches failed verification')
+    return results
+
+
+if __name__ == '__main__':
+    Run(*sys.argv[1:3])